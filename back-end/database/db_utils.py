@@ -1,21 +1,212 @@
 import sqlite3
 import os
+import threading
+from contextlib import contextmanager
 from typing import List, Dict, Any
 
+# **SQLite 数据访问层：每个线程每个库一个连接、WAL 模式、启动时按 user_version 执行迁移**
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "recruitment.db")
+JOBS_DB_PATH = os.path.join(BASE_DIR, "jobs.db")
+RESUMES_DB_PATH = os.path.join(BASE_DIR, "resumes.db")
+MATCHES_DB_PATH = os.path.join(BASE_DIR, "matches.db")
+
+# ✅ WAL：读不阻塞写；NORMAL 在 WAL 下只在检查点时 fsync；64 MB 页缓存；256 MB 内存映射
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def _has_integer_primary_key(conn, table: str, column: str) -> bool:
+    """column 是否是 INTEGER PRIMARY KEY（rowid 别名，本身就是索引）"""
+    for _, name, col_type, _, _, pk in conn.execute(f"PRAGMA table_info({table})"):
+        if name == column:
+            return pk == 1 and col_type.upper() == "INTEGER"
+    return False
+
+
+def _index_jobs_id(conn):
+    """职位表来自外部导入，id 不一定是主键：按 ID 列表补全详情需要 id 上的索引"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs'").fetchone()
+    if exists and not _has_integer_primary_key(conn, "jobs", "id"):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_id ON jobs(id)")
+
+
+# **预计算的匹配结果：表名 -> (所属方 ID 列, 对方 ID 列)；全量刷新先写 <表名>_new 再整体替换**
+MATCH_TABLES = {
+    "job_top_candidates": ("job_id", "resume_id"),
+    "resume_top_jobs": ("resume_id", "job_id"),
+}
+
+
+def create_match_table(conn, table: str, suffix: str = ""):
+    owner, other = MATCH_TABLES[table]
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table}{suffix} (
+            {owner} INTEGER NOT NULL,
+            {other} INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY ({owner}, {other})
+        ) WITHOUT ROWID
+    """)
+
+
+def index_match_table(conn, table: str):
+    """对方 ID 上的索引：某份简历或某个职位变化时找到包含它的行"""
+    _, other = MATCH_TABLES[table]
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{other} ON {table}({other})")
+
+
+def _create_match_tables(conn):
+    for table in MATCH_TABLES:
+        create_match_table(conn, table)
+        index_match_table(conn, table)
+    # 刷新时使用的模型、时间和数量
+    conn.execute("CREATE TABLE IF NOT EXISTS materialized_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+# **迁移：每个库一个列表，第 N 项把 user_version 从 N-1 升到 N；只能追加，不能修改已发布的项**
+MIGRATIONS = {
+    RESUMES_DB_PATH: [
+        """
+        CREATE TABLE IF NOT EXISTS resumes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            email TEXT,
+            phone TEXT,
+            education TEXT,
+            skills TEXT
+        )
+        """,
+        # 同一候选人按邮箱合并
+        "CREATE INDEX IF NOT EXISTS idx_resumes_email ON resumes(email)",
+        # 解析字段哈希：内容完全相同的简历视为同一候选人（旧行在下次更新时补上）
+        "ALTER TABLE resumes ADD COLUMN fields_hash TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_resumes_fields_hash ON resumes(fields_hash)",
+        # 原始文件哈希 -> 解析结果：同一份文件再次上传时不再解析
+        """
+        CREATE TABLE IF NOT EXISTS resume_uploads (
+            content_hash TEXT PRIMARY KEY,
+            resume_id INTEGER NOT NULL,
+            parsed TEXT NOT NULL
+        )
+        """,
+        # 持久化向量：float16 存储，按 (模型, ID) 区分，text_hash 判断源文本是否变化
+        """
+        CREATE TABLE IF NOT EXISTS resume_embeddings (
+            model TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model, id)
+        ) WITHOUT ROWID
+        """,
+    ],
+    JOBS_DB_PATH: [
+        _index_jobs_id,
+        """
+        CREATE TABLE IF NOT EXISTS job_embeddings (
+            model TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            text_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model, id)
+        ) WITHOUT ROWID
+        """,
+    ],
+    MATCHES_DB_PATH: [
+        _create_match_tables,
+    ],
+}
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated = set()
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """新建一个设置好 PRAGMA 的连接（自动提交模式，事务用 transaction() 显式开启）"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def migrate(db_path: str):
+    """按 user_version 执行尚未执行的迁移（每个进程每个库只检查一次）"""
+    if db_path in _migrated:
+        return
+    with _migrate_lock:
+        if db_path in _migrated:
+            return
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = connect(db_path)
+        try:
+            steps = MIGRATIONS.get(db_path, [])
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, step in enumerate(steps[version:], start=version + 1):
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                    conn.execute(f"PRAGMA user_version = {number}")
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                print(f"✅ {os.path.basename(db_path)} 已迁移到版本 {number}")
+        finally:
+            conn.close()
+        _migrated.add(db_path)
+
+
+def init_databases():
+    """启动时执行全部迁移"""
+    for db_path in MIGRATIONS:
+        migrate(db_path)
+
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """当前线程对 db_path 的连接（第一次使用时创建并确保已迁移）"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        migrate(db_path)
+        conn = connections[db_path] = connect(db_path)
+    return conn
+
+
+@contextmanager
+def transaction(db_path: str):
+    """在当前线程的连接上开启写事务（BEGIN IMMEDIATE），正常退出提交，异常回滚"""
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
 
 def get_db_connection():
     """获取数据库连接"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_connection(DB_PATH)
     conn.row_factory = sqlite3.Row  # 让查询结果可以通过列名访问
     return conn
 
 def save_job_requirement(job_data: Dict[str, Any]) -> int:
     """保存职位需求"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
+    with transaction(DB_PATH) as cursor:
         cursor.execute("""
         INSERT INTO job_requirements (
             title, required_skills, experience, education, location, description
@@ -28,33 +219,21 @@ def save_job_requirement(job_data: Dict[str, Any]) -> int:
             job_data["location"],
             job_data["description"]
         ))
-        conn.commit()
         return cursor.lastrowid
-    finally:
-        conn.close()
 
 def get_all_candidates() -> List[Dict[str, Any]]:
     """获取所有候选人"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-        SELECT id, name, email, phone, education, skills
-        FROM candidates
-        """)
-        return [dict(row) for row in cursor.fetchall()]
-    finally:
-        conn.close()
+    cursor = get_db_connection().cursor()
+    cursor.execute("""
+    SELECT id, name, email, phone, education, skills
+    FROM candidates
+    """)
+    return [dict(row) for row in cursor.fetchall()]
 
 def save_candidate_vector(candidate_id: int, vector_data: bytes):
     """保存候选人简历的向量表示"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
+    with transaction(DB_PATH) as cursor:
         cursor.execute("""
         INSERT INTO resume_vectors (candidate_id, vector_data)
         VALUES (?, ?)
         """, (candidate_id, vector_data))
-        conn.commit()
-    finally:
-        conn.close() 
\ No newline at end of file
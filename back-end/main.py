@@ -2,8 +2,23 @@ from fastapi import FastAPI, File, UploadFile, Response
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import sqlite3
-from service.resume_parser import parse_resume, save_parsed_resume
-from service.matching import match_jobs_with_faiss, match_candidates_with_faiss
+from service.resume_parser import (
+    delete_resume, extract_resume_fields_timed, hash_content, lookup_parsed_upload, save_to_db, save_parsed_resume,
+)
+from service.job_store import delete_job, save_job
+from service.matching import (
+    match_jobs_with_faiss, match_jobs_page, match_candidates_page, match_jobs_batch, match_candidates_batch,
+    top_candidates_for_job, top_jobs_for_resume, close_indexes, load_indexes,
+)
+from service.materialize import refresh_status, schedule_refresh, start_periodic_refresh
+from service.metrics import get_metrics, observe
+from service.config import MAX_BATCH_QUERIES, MAX_PAGE_SIZE, MAX_UPLOAD_BYTES
+from service.executors import run_in_process, run_in_thread, shutdown_executors, warm_process_pool
+from service.model_registry import warmup, readiness
+from service.bulk_ingest import spool_archive, start_ingest_job, get_job
+from database.db_utils import init_databases
+import asyncio
+import time
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
@@ -36,12 +51,63 @@ async def preflight(full_path: str):
         "Access-Control-Allow-Headers": "*"
     })
 
+# ✅ **启动预热：执行数据库迁移、加载模型并各跑一次推理、加载索引、启动解析子进程；完成前 /ready/ 返回 503**
+_startup = {"ready": False, "error": None, "indexes_ms": None, "parse_pool_ms": None}
+
+async def _warm_up():
+    try:
+        await run_in_thread(init_databases)
+        await run_in_thread(warmup)
+        started = time.perf_counter()
+        await run_in_thread(load_indexes)
+        _startup["indexes_ms"] = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        await run_in_thread(warm_process_pool)
+        _startup["parse_pool_ms"] = (time.perf_counter() - started) * 1000
+        start_periodic_refresh()
+        _startup["ready"] = True
+        print("✅ 服务已就绪")
+    except Exception as e:
+        _startup["error"] = str(e)
+        print(f"❌ 启动预热失败：{str(e)}")
+
+@app.on_event("startup")
+async def startup():
+    # ✅ 保留任务引用：事件循环只持有弱引用，没有引用的任务可能在完成前被回收
+    app.state.warm_up_task = asyncio.create_task(_warm_up())
+
+@app.get("/ready/")
+def ready(response: Response):
+    """就绪检查：预热完成前返回 503，并报告每个模型的加载耗时"""
+    status = readiness()
+    status.update(_startup)
+    status["ready"] = _startup["ready"]
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
+# ✅ **关闭时释放线程池 / 进程池，并保存简历索引快照**
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_executors()
+    close_indexes()
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to AI Recruitment Backend!"}
 
+@app.get("/metrics/")
+def read_metrics():
+    """查看各阶段耗时统计"""
+    return {"metrics": get_metrics()}
+
 class SkillsInput(BaseModel):
     skills: List[str]
+    # 属性预过滤：location / job_type / category / industry -> 可接受的值（同一属性内任一值即可）
+    filters: Optional[Dict[str, List[str]]] = None
+    # 分页：每页条数；翻页时带上一次返回的 next_cursor
+    top_k: int = 5
+    cursor: Optional[str] = None
 
 class JobRequirement(BaseModel):
     title: str
@@ -50,6 +116,35 @@ class JobRequirement(BaseModel):
     education: str
     location: str
     description: str
+    # 属性预过滤：degree（phd / master / bachelor / associate）/ skill -> 可接受的值
+    filters: Optional[Dict[str, List[str]]] = None
+    top_k: int = 5
+    cursor: Optional[str] = None
+
+# 批量匹配：每条查询独立返回结果，过滤条件对整批生效
+class MatchJobsBatchInput(BaseModel):
+    queries: List[List[str]]  # 每条是一份简历的技能列表
+    top_k: int = 5
+    filters: Optional[Dict[str, List[str]]] = None
+
+class CandidateQuery(BaseModel):
+    requiredSkills: List[str]
+    education: str = ""
+
+class MatchCandidatesBatchInput(BaseModel):
+    queries: List[CandidateQuery]
+    top_k: int = 5
+    filters: Optional[Dict[str, List[str]]] = None
+
+# 职位数据：PUT /jobs/{job_id} 按 ID 新建或整体替换
+class JobPosting(BaseModel):
+    title: str
+    company: str = ""
+    location: str = ""
+    description: str = ""
+    job_type: str = ""
+    categories: str = ""
+    industry: str = ""
 
 # 简历数据模型
 class Education(BaseModel):
@@ -86,17 +181,36 @@ async def upload_resume(file: UploadFile = File(...)):
     """接收文件上传并解析简历"""
     try:
         print(f"接收到文件上传请求：{file.filename}")
-        content = await file.read()
-        # 解析简历
-        print("开始解析简历...")
-        parsed_resume = parse_resume(content, file.filename)
+        # 只读一次上传缓冲区，最多多读 1 字节用于判断是否超出大小限制
+        started = time.perf_counter()
+        content = await file.read(MAX_UPLOAD_BYTES + 1)
+        observe("upload.read_ms", (time.perf_counter() - started) * 1000)
+        if len(content) > MAX_UPLOAD_BYTES:
+            message = f"File is larger than the {MAX_UPLOAD_BYTES} byte limit"
+            return {"status": "error", "message": f"处理简历失败：{message}", "error": message}
+
+        # 同一份文件已经上传过：复用保存的解析结果，不再解析 PDF / 跑 spaCy
+        content_hash = hash_content(content)
+        parsed_resume = await run_in_thread(lookup_parsed_upload, content_hash)
+        observe("upload.parse_cache_hit", 1 if parsed_resume is not None else 0)
+
+        if parsed_resume is None:
+            # 解析简历（进程池），保存到数据库（线程池）
+            print("开始解析简历...")
+            parsed_resume, timings = await run_in_process(extract_resume_fields_timed, content, file.filename)
+            for stage, elapsed_ms in timings.items():
+                observe(f"upload.{stage}_ms", elapsed_ms)
 
-        if isinstance(parsed_resume, dict) and "error" in parsed_resume:
-            print(f"❌ 简历解析失败：{parsed_resume['error']}")
-            return parsed_resume
+            if isinstance(parsed_resume, dict) and "error" in parsed_resume:
+                print(f"❌ 简历解析失败：{parsed_resume['error']}")
+                return parsed_resume
+        else:
+            print("相同文件已解析过，复用解析结果")
+
+        await run_in_thread(save_to_db, parsed_resume, content_hash)
 
         print("简历解析成功，开始匹配职位...")
-        matched_jobs = match_jobs_with_faiss(parsed_resume["skills"], top_k=5)
+        matched_jobs = await run_in_thread(match_jobs_with_faiss, parsed_resume["skills"], top_k=5)
         print(f"职位匹配完成，找到 {len(matched_jobs)} 个匹配的职位")
 
         return {
@@ -113,28 +227,163 @@ async def upload_resume(file: UploadFile = File(...)):
             "error": str(e)
         }
 
+@app.post("/upload_batch/")
+async def upload_batch(file: UploadFile = File(...)):
+    """批量导入简历：上传 zip 包，后台解析入库并写入索引，返回任务ID"""
+    try:
+        print(f"接收到批量导入请求：{file.filename}")
+        # zip 包超过 MAX_BATCH_UPLOAD_BYTES 时不落盘，直接返回错误
+        archive_path = await run_in_thread(spool_archive, file.file)
+        job_id = start_ingest_job(archive_path)
+        return {"status": "accepted", "job_id": job_id}
+    except Exception as e:
+        print(f"❌ 批量导入请求失败：{str(e)}")
+        return {"status": "error", "message": f"批量导入失败：{str(e)}", "error": str(e)}
+
+@app.get("/upload_batch/{job_id}")
+def upload_batch_status(job_id: str, response: Response):
+    """查询批量导入进度：已处理 / 成功 / 失败数量，以及每个失败文件的原因"""
+    job = get_job(job_id)
+    if job is None:
+        response.status_code = 404
+        return {"status": "error", "message": "任务不存在"}
+    return job
+
+def _page_size(top_k: int) -> int:
+    if not 1 <= top_k <= MAX_PAGE_SIZE:
+        raise ValueError(f"❌ top_k 必须在 1 到 {MAX_PAGE_SIZE} 之间")
+    return top_k
+
 @app.post("/match_jobs/")
 async def match_jobs(skills_input: SkillsInput):
-    """只进行职位匹配的接口"""
+    """只进行职位匹配的接口（返回 next_cursor，带上它再次请求得到下一页）"""
     try:
-        matched_jobs = match_jobs_with_faiss(skills_input.skills, top_k=5)
-        return {"matched_jobs": matched_jobs}
+        matched_jobs, next_cursor = await run_in_thread(
+            match_jobs_page, skills_input.skills, _page_size(skills_input.top_k),
+            filters=skills_input.filters, cursor=skills_input.cursor,
+        )
+        return {"matched_jobs": matched_jobs, "next_cursor": next_cursor}
     except Exception as e:
         return {"error": str(e)}
 
 @app.post("/match_candidates/")
 async def match_candidates(job_requirement: JobRequirement):
-    """根据职位要求匹配候选人"""
+    """根据职位要求匹配候选人（返回 next_cursor，带上它再次请求得到下一页）"""
     try:
-        matched_candidates = match_candidates_with_faiss(
+        matched_candidates, next_cursor = await run_in_thread(
+            match_candidates_page,
             job_requirement.requiredSkills,
             job_requirement.education,
-            top_k=5
+            _page_size(job_requirement.top_k),
+            filters=job_requirement.filters,
+            cursor=job_requirement.cursor
         )
-        return {"matched_candidates": matched_candidates}
+        return {"matched_candidates": matched_candidates, "next_cursor": next_cursor}
     except Exception as e:
         return {"error": str(e)}
 
+def _batch_size(queries) -> int:
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"❌ 每批最多 {MAX_BATCH_QUERIES} 条查询")
+    return len(queries)
+
+@app.post("/match_jobs_batch/")
+async def match_jobs_batch_endpoint(batch: MatchJobsBatchInput):
+    """批量职位匹配：一次编码、一次 FAISS 搜索、一次补全详情，按输入顺序返回每条查询的结果"""
+    try:
+        _batch_size(batch.queries)
+        started = time.perf_counter()
+        results = await run_in_thread(match_jobs_batch, batch.queries, _page_size(batch.top_k), batch.filters)
+        observe("match_jobs_batch.total_ms", (time.perf_counter() - started) * 1000)
+        return {"results": [{"index": i, "matched_jobs": jobs} for i, jobs in enumerate(results)]}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.post("/match_candidates_batch/")
+async def match_candidates_batch_endpoint(batch: MatchCandidatesBatchInput):
+    """批量候选人匹配：一次编码、一次 FAISS 搜索、一次补全详情，按输入顺序返回每条查询的结果"""
+    try:
+        _batch_size(batch.queries)
+        started = time.perf_counter()
+        results = await run_in_thread(
+            match_candidates_batch,
+            [(query.requiredSkills, query.education) for query in batch.queries],
+            _page_size(batch.top_k),
+            batch.filters,
+        )
+        observe("match_candidates_batch.total_ms", (time.perf_counter() - started) * 1000)
+        return {"results": [{"index": i, "matched_candidates": candidates} for i, candidates in enumerate(results)]}
+    except Exception as e:
+        return {"error": str(e)}
+
+# ✅ **预计算匹配：看板按职位 / 简历直接读榜单，不再实时搜索**
+@app.get("/jobs/{job_id}/top_candidates")
+async def job_top_candidates(job_id: int, top_k: int = 5):
+    try:
+        started = time.perf_counter()
+        candidates = await run_in_thread(top_candidates_for_job, job_id, _page_size(top_k))
+        observe("materialized.read_ms", (time.perf_counter() - started) * 1000)
+        return {"matched_candidates": candidates}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/resumes/{resume_id}/top_jobs")
+async def resume_top_jobs(resume_id: int, top_k: int = 5):
+    try:
+        started = time.perf_counter()
+        jobs = await run_in_thread(top_jobs_for_resume, resume_id, _page_size(top_k))
+        observe("materialized.read_ms", (time.perf_counter() - started) * 1000)
+        return {"matched_jobs": jobs}
+    except Exception as e:
+        return {"error": str(e)}
+
+# ✅ **职位 / 简历的修改和删除：数据库和FAISS索引一起更新**
+@app.put("/jobs/{job_id}")
+async def put_job(job_id: int, job: JobPosting):
+    """新建或替换职位，并重新计算它的向量"""
+    try:
+        created = await run_in_thread(save_job, job_id, {
+            "job_title": job.title,
+            "company_name": job.company,
+            "location": job.location,
+            "job_description": job.description,
+            "job_type": job.job_type,
+            "categories": job.categories,
+            "industry": job.industry,
+        })
+        return {"status": "success", "job_id": job_id, "created": created}
+    except Exception as e:
+        print(f"❌ 保存职位失败: {str(e)}")
+        return {"status": "error", "message": f"保存职位失败: {str(e)}", "error": str(e)}
+
+@app.delete("/jobs/{job_id}")
+async def remove_job(job_id: int, response: Response):
+    try:
+        if not await run_in_thread(delete_job, job_id):
+            response.status_code = 404
+            return {"status": "error", "message": "职位不存在"}
+        return {"status": "success", "job_id": job_id}
+    except Exception as e:
+        print(f"❌ 删除职位失败: {str(e)}")
+        return {"status": "error", "message": f"删除职位失败: {str(e)}", "error": str(e)}
+
+@app.delete("/resumes/{resume_id}")
+async def remove_resume(resume_id: int, response: Response):
+    try:
+        if not await run_in_thread(delete_resume, resume_id):
+            response.status_code = 404
+            return {"status": "error", "message": "简历不存在"}
+        return {"status": "success", "resume_id": resume_id}
+    except Exception as e:
+        print(f"❌ 删除简历失败: {str(e)}")
+        return {"status": "error", "message": f"删除简历失败: {str(e)}", "error": str(e)}
+
+@app.post("/materialize/refresh/")
+async def materialize_refresh():
+    """在后台排队一次全量刷新，立即返回上一次刷新的状态"""
+    schedule_refresh()
+    return {"status": "scheduled", "last_refresh": await run_in_thread(refresh_status)}
+
 @app.post("/save_resume/")
 async def save_resume(resume: ParsedResume):
     """接收前端解析的简历数据并保存到数据库"""
@@ -154,11 +403,11 @@ async def save_resume(resume: ParsedResume):
         }
         
         # 保存到数据库
-        resume_id = save_parsed_resume(parsed_data)
+        resume_id = await run_in_thread(save_parsed_resume, parsed_data)
         
         # 匹配职位
         skill_names = [skill.name for skill in resume.skills]
-        matched_jobs = match_jobs_with_faiss(skill_names, top_k=5)
+        matched_jobs = await run_in_thread(match_jobs_with_faiss, skill_names, top_k=5)
         
         return {
             "status": "success", 
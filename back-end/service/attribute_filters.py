@@ -0,0 +1,260 @@
+import re
+import threading
+
+import faiss
+import numpy as np
+
+from database.db_utils import get_connection
+
+# **属性预过滤：每个属性值的 ID 集合预先算好常驻内存，查询时合并成位图交给 FAISS 的 IDSelector**
+# 常见的值存成位图（按数据库 ID 置位），少见的值存成有序 ID 数组，哪种更小用哪种
+_DENSE_RATIO = 64  # 出现次数 * 64 >= 最大 ID 时位图（每个 ID 1 bit）比 int64 数组（64 bit）更省内存
+_SEPARATORS = re.compile(r"[,|;/]")
+
+# 学历等级：从简历的教育信息中识别
+DEGREE_PATTERNS = (
+    ("phd", re.compile(r"\b(ph\.?\s?d|doctorate|doctor of)\b", re.IGNORECASE)),
+    ("master", re.compile(r"\b(master'?s?|m\.?sc|mba|m\.?eng|m\.s\.|m\.a\.)\b", re.IGNORECASE)),
+    ("bachelor", re.compile(r"\b(bachelor'?s?|b\.?sc|b\.?eng|b\.?tech|b\.s\.|b\.a\.)\b", re.IGNORECASE)),
+    ("associate", re.compile(r"\bassociate'?s? (degree|of)\b", re.IGNORECASE)),
+)
+
+
+def normalize_value(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def split_values(value):
+    """完整值 + 按逗号等分隔的各部分，例如 'New York, NY' 可以用 'new york' 或 'ny' 过滤"""
+    full = normalize_value(value)
+    if not full:
+        return []
+    parts = [normalize_value(part) for part in _SEPARATORS.split(full)]
+    return list(dict.fromkeys([full] + [part for part in parts if part]))
+
+
+def degree_levels(education) -> list:
+    return [level for level, pattern in DEGREE_PATTERNS if pattern.search(education or "")]
+
+
+def _set_bits(bitmap, ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype(np.uint8))
+
+
+def bitmap_ids(bitmap):
+    """位图中置位的全部 ID"""
+    return np.flatnonzero(np.unpackbits(bitmap, bitorder="little")).astype(np.int64)
+
+
+class AttributeIndex:
+    """
+    一类数据（职位或简历）的属性值 -> ID 集合。从数据库全量扫描构建；
+    之后单条写入的变化记在 overrides 里，查询时覆盖，积累到 override_limit 条后在后台重新扫描。
+    """
+
+    def __init__(self, name: str, db_path: str, sql: str, extract, attributes, override_limit: int):
+        self.name = name
+        self.db_path = db_path
+        self.sql = sql  # 必须是 SELECT id, ... 形式
+        self.extract = extract  # row -> {属性: [规范化的值]}
+        self.attributes = tuple(attributes)
+        self.override_limit = override_limit
+
+        self._containers = None  # {(属性, 值): 位图 或 有序 ID 数组}
+        self._size = 0  # 最大 ID + 1
+        self._overrides = {}  # id -> (序号, {属性: set(值)} 或 None 表示已删除)
+        self._seq = 0
+        self._generation = 0  # invalidate() 之后进行中的扫描结果作废
+        self._rebuilding = False  # 后台压缩重建已排队
+        self._scanning = False  # 正在全量扫描：期间的单条变化要记下来，扫描可能没读到
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # 同一时间只有一个全量扫描
+
+    def _scan(self):
+        postings = {}
+        max_id = -1
+        for row in get_connection(self.db_path).execute(self.sql):
+            item_id = int(row[0])
+            max_id = max(max_id, item_id)
+            for attribute, values in self.extract(row).items():
+                for value in values:
+                    postings.setdefault((attribute, value), []).append(item_id)
+
+        size = max_id + 1
+        containers = {}
+        for key, ids in postings.items():
+            ids = np.unique(np.asarray(ids, dtype=np.int64))
+            if len(ids) * _DENSE_RATIO >= size:
+                bitmap = np.zeros((size + 7) // 8, dtype=np.uint8)
+                _set_bits(bitmap, ids)
+                containers[key] = bitmap
+            else:
+                containers[key] = ids
+        return containers, size
+
+    def rebuild(self):
+        """全量扫描数据库重建；扫描开始前记录的单条变化已经在库里，换上新结果后丢弃"""
+        with self._build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            start_seq, generation = self._seq, self._generation
+            self._scanning = True
+        try:
+            containers, size = self._scan()
+        except Exception:
+            with self._lock:
+                self._scanning = self._rebuilding = False
+            raise
+        with self._lock:
+            self._scanning = self._rebuilding = False
+            if generation != self._generation:
+                return
+            self._containers, self._size = containers, size
+            self._overrides = {item_id: entry for item_id, entry in self._overrides.items() if entry[0] > start_seq}
+        print(f"✅ 已构建{self.name}属性过滤位图：{len(containers)} 个属性值，最大 ID {size - 1}")
+
+    def _ensure_built(self):
+        """还没有扫描结果时构建一次；并发的查询等同一次扫描，不会各自全量扫描"""
+        with self._build_lock:
+            if self._containers is None:
+                self._rebuild()
+
+    def invalidate(self):
+        """丢弃当前结果，下一次查询时重新扫描"""
+        with self._lock:
+            self._containers = None
+            self._overrides = {}
+            self._generation += 1
+
+    def refresh_ids(self, ids):
+        """数据库中这些行写入或修改之后调用：重新读取它们的属性"""
+        ids = [int(i) for i in ids]
+        if not ids or not self._tracking():
+            return
+        rows = {}
+        connection = get_connection(self.db_path)
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            # self.sql 形如 SELECT ... FROM t，追加条件只读这些 ID
+            for row in connection.execute(f"{self.sql} WHERE id IN ({','.join('?' * len(chunk))})", chunk):
+                rows[int(row[0])] = row
+        with self._lock:
+            for item_id in ids:
+                self._seq += 1
+                row = rows.get(item_id)
+                values = ({attribute: set(found) for attribute, found in self.extract(row).items()}
+                          if row is not None else None)
+                self._overrides[item_id] = (self._seq, values)
+        self._maybe_compact()
+
+    def remove_ids(self, ids):
+        if not self._tracking():
+            return
+        with self._lock:
+            for item_id in ids:
+                self._seq += 1
+                self._overrides[int(item_id)] = (self._seq, None)
+        self._maybe_compact()
+
+    def _tracking(self) -> bool:
+        """已有扫描结果或正在扫描时才需要记录单条变化"""
+        return self._containers is not None or self._scanning
+
+    def _maybe_compact(self):
+        with self._lock:
+            if self._rebuilding or len(self._overrides) < self.override_limit:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self.rebuild, name=f"filters-{self.name}", daemon=True).start()
+
+    def select(self, filters):
+        """
+        filters: {属性: [值...]}，同一属性内多个值取并集，不同属性取交集。
+        返回 (位图, 命中数)；没有过滤条件返回 None，未知属性抛出 ValueError
+        """
+        filters = {attribute: [normalize_value(value) for value in values if normalize_value(value)]
+                   for attribute, values in (filters or {}).items() if values}
+        if not filters:
+            return None
+        unknown = set(filters) - set(self.attributes)
+        if unknown:
+            raise ValueError(f"❌ 不支持的过滤属性：{', '.join(sorted(unknown))}，可选：{', '.join(self.attributes)}")
+
+        while True:
+            with self._lock:
+                containers, size, overrides = self._containers, self._size, dict(self._overrides)
+            if containers is not None:
+                break
+            self._ensure_built()
+        if overrides:
+            size = max(size, max(overrides) + 1)
+        n_bytes = (size + 7) // 8
+
+        result = None
+        for attribute, values in filters.items():
+            matched = np.zeros(n_bytes, dtype=np.uint8)
+            for value in values:
+                container = containers.get((attribute, value))
+                if container is None:
+                    continue
+                if container.dtype == np.uint8:
+                    matched[:len(container)] |= container
+                else:
+                    _set_bits(matched, container)
+            result = matched if result is None else np.bitwise_and(result, matched, out=result)
+
+        # 上次全量扫描之后写入、修改或删除的行按最新属性重新判断
+        for item_id, (_, values) in overrides.items():
+            keep = values is not None and all(
+                any(value in values.get(attribute, ()) for value in wanted) for attribute, wanted in filters.items()
+            )
+            mask = np.uint8(1 << (item_id & 7))
+            if keep:
+                result[item_id >> 3] |= mask
+            else:
+                result[item_id >> 3] &= ~mask
+
+        return result, int(np.unpackbits(result).sum())
+
+
+def search_parameters(index, bitmap):
+    """位图 -> 带 IDSelector 的搜索参数（保留索引当前的 nprobe / efSearch）"""
+    selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    inner = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif isinstance(inner, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    params.bitmap = bitmap  # 位图和选择器必须在搜索期间保持存活
+    params.selector = selector
+    return params
+
+
+def exact_scan(index, reranker, query, ids, k: int):
+    """
+    过滤后只剩少量 ID 时直接逐个取出向量精确计算内积（近似索引在高选择性过滤下容易漏召回）。
+    query 可以是多条查询（nq x d），一次矩阵乘法算出全部分数
+    """
+    query = np.asarray(query, dtype=np.float32).reshape(-1, index.d)
+    found_ids, vectors = [], []
+    exact = reranker.lookup(ids) if reranker.available else [None] * len(ids)
+    for item_id, vector in zip(ids.tolist(), exact):
+        if vector is None:
+            try:
+                vector = index.reconstruct(item_id)
+            except RuntimeError:
+                continue  # 库里有但索引里没有的 ID
+        found_ids.append(item_id)
+        vectors.append(vector)
+    if not found_ids:
+        return np.zeros((len(query), 0), dtype=np.float32), np.zeros((len(query), 0), dtype=np.int64)
+
+    scores = query @ np.asarray(vectors, dtype=np.float32).T
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.asarray(found_ids, dtype=np.int64)[order]
@@ -0,0 +1,267 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import faiss
+import numpy as np
+
+from .index_manager import build_id_index, configure_search, extract_vectors, load_id_index
+from .model_registry import index_namespace
+
+# **性能评测命令：python -m service.benchmark index --source jobs / encoder / parser**
+# 设置 ENCODER_BACKEND=hashing 时不加载任何模型，评测几毫秒内就能开始
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
+INDEX_FILES = {
+    "jobs": ("job_embeddings.faiss", "job_ids.npy"),
+    "resumes": ("resume_embeddings.faiss", "resume_ids.npy"),
+}
+
+
+def _percentile(values, q):
+    return float(np.percentile(np.asarray(values), q)) if values else 0.0
+
+
+def _load_vectors(args):
+    """从现有索引取出向量；--synthetic 时生成归一化的随机向量"""
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.arange(args.synthetic, dtype=np.int64), vectors
+
+    index_dir = os.path.join(BASE_DIR, "indexes", args.namespace or index_namespace())
+    index_path, ids_path = (os.path.join(index_dir, name) for name in INDEX_FILES[args.source])
+    if not os.path.exists(index_path):
+        raise SystemExit(f"❌ 找不到索引文件 {index_path}，请先构建索引或使用 --synthetic")
+    return extract_vectors(load_id_index(index_path, ids_path))
+
+
+def _sample_queries(vectors, n_queries):
+    """从语料中抽样并加少量噪声作为查询，避免查询与某条向量完全相同"""
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)].copy()
+    queries += rng.standard_normal(queries.shape).astype(np.float32) * 0.01
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def _index_configs(args):
+    """展开要评测的 (名称, 索引类型, 存储格式, nprobe, efSearch) 组合"""
+    configs = []
+    for storage in args.storage:
+        for index_type in args.types:
+            if index_type == "ivf":
+                configs += [(f"ivf nprobe={n}", "ivf", storage, n, None) for n in args.nprobe]
+            elif index_type == "hnsw":
+                configs += [(f"hnsw efSearch={ef}", "hnsw", storage, None, ef) for ef in args.ef_search]
+            else:
+                configs.append((index_type, index_type, storage, None, None))
+    return configs
+
+
+def _rerank_recall(index, vectors, ids, queries, ground_truth, k, factor):
+    """多取 k * factor 个候选、用原始向量精确重排后的 recall@k"""
+    order = np.argsort(ids)
+    sorted_ids = ids[order]
+    _, candidates = index.search(queries, min(k * factor, len(ids)))
+
+    hits = 0
+    for query, found, truth in zip(queries, candidates, ground_truth):
+        found = found[found >= 0]
+        rows = order[np.searchsorted(sorted_ids, found)]
+        best = found[np.argsort(-(vectors[rows] @ query), kind="stable")[:k]]
+        hits += len(set(best) & set(truth))
+    return hits / (k * len(queries))
+
+
+def evaluate_index(index, queries, ground_truth, k):
+    """返回 (recall@k, 单条查询延迟列表 ms)"""
+    _, found = index.search(queries, k)
+    recall = np.mean([
+        len(set(found[i]) & set(ground_truth[i])) / k for i in range(len(queries))
+    ])
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return float(recall), latencies
+
+
+def run_index_benchmark(args):
+    ids, vectors = _load_vectors(args)
+    k = min(args.k, len(ids))
+    queries = _sample_queries(vectors, args.queries)
+    print(f"语料 {len(ids)} 条，维度 {vectors.shape[1]}，查询 {len(queries)} 条，k={k}")
+
+    exact = build_id_index(vectors, ids, "flat")
+    _, ground_truth = exact.search(queries, k)
+
+    print(f"{'索引':<20}{'存储':>6}{'内存(MB)':>10}{'构建(s)':>9}{'recall@k':>10}"
+          f"{'重排recall':>11}{'p50(ms)':>9}{'p99(ms)':>9}")
+    built = {}
+    for name, index_type, storage, nprobe, ef_search in _index_configs(args):
+        if (index_type, storage) not in built:
+            started = time.perf_counter()
+            index = build_id_index(vectors, ids, index_type, storage)
+            built[(index_type, storage)] = (index, time.perf_counter() - started)
+        index, build_seconds = built[(index_type, storage)]
+
+        if nprobe is not None or ef_search is not None:
+            configure_search(index, nprobe=nprobe or 1, ef_search=ef_search or 16)
+        memory_mb = len(faiss.serialize_index(index)) / 1024 / 1024
+        recall, latencies = evaluate_index(index, queries, ground_truth, k)
+        rerank_recall = _rerank_recall(index, vectors, ids, queries, ground_truth, k, args.rerank_factor) \
+            if storage != "fp32" and args.rerank_factor > 0 else recall
+        print(f"{name:<20}{storage:>6}{memory_mb:>10.1f}{build_seconds:>9.2f}{recall:>10.3f}"
+              f"{rerank_recall:>11.3f}{_percentile(latencies, 50):>9.3f}{_percentile(latencies, 99):>9.3f}")
+
+
+def _load_texts(n_texts):
+    """从职位库取职位标题 + 描述作为编码语料；没有数据库时生成合成文本"""
+    db_path = os.path.join(BASE_DIR, "jobs.db")
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT job_title, job_description FROM jobs LIMIT ?", (n_texts,)
+            ).fetchall()
+        finally:
+            conn.close()
+        texts = [f"{title or ''} {description or ''}".strip() for title, description in rows]
+        if texts:
+            return texts
+    words = ["python", "sql", "java", "cloud", "data", "machine", "learning", "react", "docker", "team"]
+    rng = np.random.default_rng(2)
+    return [" ".join(rng.choice(words, rng.integers(3, 120))) for _ in range(n_texts)]
+
+
+def _throughput(model, texts, batch_size):
+    model.encode(texts[:batch_size], batch_size=batch_size)  # 预热
+    started = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size)
+    return np.asarray(embeddings, dtype=np.float32), len(texts) / (time.perf_counter() - started)
+
+
+def run_encoder_benchmark(args):
+    """比较 PyTorch 与 ONNX Runtime（fp32 / int8）的编码吞吐，以及与 PyTorch 输出的余弦相似度"""
+    from sentence_transformers import SentenceTransformer
+
+    from .config import ONNX_MODEL_DIR, ONNX_THREADS, SENTENCE_MODEL_NAME
+    from .onnx_encoder import load_onnx_encoder
+
+    texts = _load_texts(args.texts)
+    print(f"模型 {SENTENCE_MODEL_NAME}，文本 {len(texts)} 条，batch_size={args.batch_size}")
+
+    reference, torch_rate = _throughput(SentenceTransformer(SENTENCE_MODEL_NAME, device="cpu"), texts,
+                                        args.batch_size)
+    reference /= np.linalg.norm(reference, axis=1, keepdims=True)
+
+    print(f"{'后端':<14}{'条/秒':>10}{'加速':>8}{'最小cos':>10}{'平均cos':>10}")
+    print(f"{'torch':<14}{torch_rate:>10.1f}{1.0:>8.2f}{1.0:>10.4f}{1.0:>10.4f}")
+    for quantize in (False, True):
+        encoder = load_onnx_encoder(SENTENCE_MODEL_NAME, ONNX_MODEL_DIR, quantize=quantize, threads=ONNX_THREADS)
+        embeddings, rate = _throughput(encoder, texts, args.batch_size)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        cosine = np.sum(embeddings * reference, axis=1)
+        name = "onnx-int8" if quantize else "onnx-fp32"
+        print(f"{name:<14}{rate:>10.1f}{rate / torch_rate:>8.2f}{cosine.min():>10.4f}{cosine.mean():>10.4f}")
+        if cosine.min() < args.min_cosine:
+            print(f"⚠️ {name} 与 PyTorch 输出的最小余弦相似度低于 {args.min_cosine}")
+
+
+def _sample_resume_texts(n_docs):
+    """合成简历开头（姓名 + 联系方式 + 摘要），用于评测姓名提取"""
+    rng = np.random.default_rng(3)
+    first = ["John", "Maria", "Wei", "Aisha", "Carlos", "Emily", "Raj", "Olga", "Kenji", "Fatima"]
+    last = ["Smith", "Garcia", "Zhang", "Khan", "Silva", "Johnson", "Patel", "Ivanova", "Tanaka", "Ali"]
+    words = ["python", "sql", "data", "engineer", "team", "cloud", "projects", "developed", "led", "systems"]
+    return [
+        f"{rng.choice(first)} {rng.choice(last)}\n{rng.choice(first).lower()}@example.com | Toronto, ON\n"
+        f"Summary: " + " ".join(rng.choice(words, 120))
+        for _ in range(n_docs)
+    ]
+
+
+def _ner_rate(run, texts):
+    started = time.perf_counter()
+    names = run(texts)
+    elapsed = time.perf_counter() - started
+    return names, elapsed * 1000 / len(texts)
+
+
+def run_parser_benchmark(args):
+    """比较完整 spaCy 流水线与只保留 NER 的流水线（逐条 / nlp.pipe 批处理）的单条耗时"""
+    from .config import SPACY_EXCLUDE, SPACY_MODEL_NAME
+    from .model_registry import load_spacy_pipeline
+
+    texts = [text[:1000] for text in _sample_resume_texts(args.docs)]
+    full = load_spacy_pipeline(SPACY_MODEL_NAME, exclude="")
+    trimmed = load_spacy_pipeline(SPACY_MODEL_NAME, exclude=SPACY_EXCLUDE)
+    print(f"模型 {SPACY_MODEL_NAME}，文档 {len(texts)} 条")
+    print(f"完整流水线：{', '.join(full.pipe_names)}")
+    print(f"精简流水线：{', '.join(trimmed.pipe_names)}")
+
+    def persons(docs):
+        return [next((ent.text for ent in doc.ents if ent.label_ == "PERSON"), None) for doc in docs]
+
+    runs = [
+        ("完整 nlp(text)", lambda items: persons([full(text) for text in items])),
+        ("精简 nlp(text)", lambda items: persons([trimmed(text) for text in items])),
+        ("精简 nlp.pipe", lambda items: persons(trimmed.pipe(items, batch_size=args.batch_size))),
+    ]
+    if args.n_process > 1:
+        runs.append((f"精简 pipe x{args.n_process}", lambda items: persons(
+            trimmed.pipe(items, batch_size=args.batch_size, n_process=args.n_process))))
+
+    print(f"{'方式':<18}{'ms/条':>10}{'加速':>8}{'姓名一致率':>12}")
+    reference, baseline_ms = None, None
+    for name, run in runs:
+        run(texts[:args.batch_size])  # 预热
+        names, ms_per_doc = _ner_rate(run, texts)
+        if reference is None:
+            reference, baseline_ms = names, ms_per_doc
+        agreement = sum(a == b for a, b in zip(names, reference)) / len(texts)
+        print(f"{name:<18}{ms_per_doc:>10.3f}{baseline_ms / ms_per_doc:>8.2f}{agreement:>12.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检索性能评测")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="比较不同索引类型 / 存储格式的内存、recall@k 与查询延迟")
+    index_parser.add_argument("--source", choices=sorted(INDEX_FILES), default="jobs",
+                              help="从哪个现有索引取向量")
+    index_parser.add_argument("--namespace", default="",
+                              help="索引命名空间（模型-维度，如 all-MiniLM-L6-v2-384），默认为当前编码器")
+    index_parser.add_argument("--synthetic", type=int, default=0, help="改用 N 条随机向量评测")
+    index_parser.add_argument("--dim", type=int, default=768, help="随机向量维度")
+    index_parser.add_argument("--queries", type=int, default=200)
+    index_parser.add_argument("--k", type=int, default=10)
+    index_parser.add_argument("--types", nargs="+", choices=["flat", "ivf", "hnsw"],
+                              default=["flat", "ivf", "hnsw"])
+    index_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    index_parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 128, 256])
+    index_parser.add_argument("--storage", nargs="+", choices=["fp32", "fp16", "sq8", "pq"], default=["fp32"])
+    index_parser.add_argument("--rerank-factor", type=int, default=4, help="精确重排时多取的候选倍数")
+
+    encoder_parser = subparsers.add_parser("encoder", help="比较 PyTorch 与 ONNX Runtime 编码的吞吐和向量一致性")
+    encoder_parser.add_argument("--texts", type=int, default=512, help="编码的文本条数")
+    encoder_parser.add_argument("--batch-size", type=int, default=32)
+    encoder_parser.add_argument("--min-cosine", type=float, default=0.99,
+                                help="与 PyTorch 输出的最小余弦相似度低于该值时给出警告")
+
+    parser_parser = subparsers.add_parser("parser", help="比较完整与精简 spaCy 流水线的姓名识别耗时")
+    parser_parser.add_argument("--docs", type=int, default=500, help="评测的文档条数")
+    parser_parser.add_argument("--batch-size", type=int, default=64)
+    parser_parser.add_argument("--n-process", type=int, default=1, help="nlp.pipe 的进程数（大于 1 时额外评测）")
+
+    args = parser.parse_args()
+    if args.command == "index":
+        run_index_benchmark(args)
+    elif args.command == "encoder":
+        run_encoder_benchmark(args)
+    elif args.command == "parser":
+        run_parser_benchmark(args)
@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+
+from .config import BULK_CHUNK_SIZE, BULK_PARSE_TASK_SIZE, INGEST_JOB_TTL, MAX_BATCH_UPLOAD_BYTES, MAX_UPLOAD_BYTES
+from .executors import get_bulk_process_pool, shutdown_executors
+from .metrics import observe
+from .resume_parser import extract_resume_fields_batch, hash_content, lookup_parsed_uploads, save_resumes_batch
+
+# **批量导入简历：目录或 zip 包 -> 进程池解析 -> executemany 大事务入库 -> 批量编码 -> 一次提交到索引**
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+
+def iter_resume_files(path: str):
+    """
+    遍历目录或 zip 包中的文件，产出 (文件名, 内容 或 None, 错误 或 None)。
+    内容按需读取，任何时候内存里只有当前一块文件
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                error = _check_file(info.filename, info.file_size)
+                yield info.filename, None if error else archive.read(info), error
+        return
+
+    if not os.path.isdir(path):
+        raise ValueError(f"❌ {path} 既不是目录也不是 zip 包")
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            relative = os.path.relpath(file_path, path)
+            error = _check_file(name, os.path.getsize(file_path))
+            if error:
+                yield relative, None, error
+                continue
+            with open(file_path, "rb") as f:
+                yield relative, f.read(), None
+
+
+def _check_file(filename: str, size: int):
+    if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        return "Only .txt and .pdf files are supported"
+    if size > MAX_UPLOAD_BYTES:
+        return f"File is larger than the {MAX_UPLOAD_BYTES} byte limit"
+    return None
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_chunk(files):
+    """把一块文件分成若干解析任务提交到批量导入的进程池，按原顺序返回解析结果"""
+    pool = get_bulk_process_pool()
+    futures = [
+        pool.submit(extract_resume_fields_batch,
+                    [(name.lower(), content) for name, content in files[start:start + BULK_PARSE_TASK_SIZE]])
+        for start in range(0, len(files), BULK_PARSE_TASK_SIZE)
+    ]
+    return [parsed for future in futures for parsed in future.result()]
+
+
+def ingest_resumes(path: str, chunk_size: int = BULK_CHUNK_SIZE, progress=None):
+    """
+    导入目录或 zip 包中的全部简历。progress(report) 在每块处理完后调用。
+    返回报告：文件总数、成功数、复用已有解析结果的文件数、失败数、每个失败文件的原因和各阶段耗时
+    """
+    # ✅ 延迟导入：只解析时不需要加载向量模型和索引
+    from .matching import resume_in_index, upsert_resumes_in_index
+
+    report = {"files": 0, "saved": 0, "reused": 0, "failed": 0, "errors": [], "timings_ms": {}, "elapsed_s": 0.0}
+
+    def add_timing(stage, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        report["timings_ms"][stage] = report["timings_ms"].get(stage, 0.0) + elapsed_ms
+        observe(f"bulk_ingest.{stage}_ms", elapsed_ms)
+
+    started_all = time.perf_counter()
+    for chunk in _chunks(iter_resume_files(path), chunk_size):
+        report["files"] += len(chunk)
+        files = []
+        for name, content, error in chunk:
+            if error:
+                report["errors"].append({"file": name, "error": error})
+            else:
+                files.append((name, content))
+
+        # ✅ 已经导入过的文件（原始字节哈希相同）直接复用保存的解析结果
+        hashes = [hash_content(content) for _, content in files]
+        known = lookup_parsed_uploads(hashes)
+        to_parse = [(name, content) for (name, content), content_hash in zip(files, hashes)
+                    if content_hash not in known]
+        report["reused"] += len(files) - len(to_parse)
+
+        started = time.perf_counter()
+        parsed_iter = iter(_parse_chunk(to_parse))
+        add_timing("parse", started)
+
+        good, good_hashes = [], []
+        for (name, _), content_hash in zip(files, hashes):
+            result = known[content_hash][1] if content_hash in known else next(parsed_iter)
+            if "error" in result:
+                report["errors"].append({"file": name, "error": result["error"]})
+            else:
+                good.append(result)
+                good_hashes.append(content_hash)
+        del files, chunk, to_parse
+
+        if good:
+            started = time.perf_counter()
+            resume_ids, changed, finals = save_resumes_batch(good, good_hashes)
+            add_timing("save", started)
+
+            # 同一候选人只写一次索引（用合并后最终保存的字段）；文本没变且索引里已有向量的不再编码
+            latest = {resume_id: data for resume_id, data in zip(resume_ids, finals)
+                      if resume_id in changed or not resume_in_index(resume_id)}
+            started = time.perf_counter()
+            upsert_resumes_in_index(
+                list(latest),
+                ["; ".join(data["education"]) for data in latest.values()],
+                ["; ".join(data["skills"]) for data in latest.values()],
+            )
+            add_timing("index", started)
+            report["saved"] += len(good)
+
+        report["failed"] = len(report["errors"])
+        report["elapsed_s"] = time.perf_counter() - started_all
+        if progress is not None:
+            progress(report)
+    return report
+
+
+def print_progress(report):
+    rate = report["files"] / report["elapsed_s"] if report["elapsed_s"] else 0.0
+    print(f"已处理 {report['files']} 个文件：成功 {report['saved']}（复用 {report['reused']}），失败 {report['failed']}，"
+          f"{rate:.1f} 个/秒")
+
+
+# **后台导入任务：上传的 zip 包先落盘，任务在线程中执行，进度通过 get_job 查询；结束超过 INGEST_JOB_TTL 秒的任务清掉**
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def spool_archive(source, max_bytes: int = MAX_BATCH_UPLOAD_BYTES) -> str:
+    """把上传的 zip 包流式复制到临时文件（后台任务在请求结束后还要读取），超过 max_bytes 时删除并报错"""
+    fd, path = tempfile.mkstemp(prefix="resume_batch_", suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # 最多多读 1 字节用于判断是否超出大小限制
+            shutil.copyfileobj(_Limited(source, max_bytes + 1), f, 1024 * 1024)
+            size = f.tell()
+        if size > max_bytes:
+            raise ValueError(f"Archive is larger than the {max_bytes} byte limit")
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+class _Limited:
+    """只读出前 limit 字节的文件对象包装"""
+
+    def __init__(self, source, limit: int):
+        self._source = source
+        self._remaining = limit
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        size = self._remaining if size < 0 else min(size, self._remaining)
+        data = self._source.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+def _prune_jobs():
+    """删除结束超过 INGEST_JOB_TTL 秒的任务（调用方持有 _jobs_lock）；运行中的任务一直保留"""
+    cutoff = time.time() - INGEST_JOB_TTL
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]:
+        del _jobs[job_id]
+
+
+def start_ingest_job(archive_path: str, remove_after: bool = True) -> str:
+    """启动后台导入任务，返回任务ID"""
+    job_id = uuid.uuid4().hex
+    job = {"id": job_id, "status": "running", "report": None, "error": None, "finished_at": None}
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job_id] = job
+
+    def progress(report):
+        job["report"] = dict(report, errors=list(report["errors"]))
+
+    def run():
+        try:
+            job["report"] = ingest_resumes(archive_path, progress=progress)
+            job["status"] = "done"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+            print(f"❌ 批量导入失败: {str(e)}")
+        finally:
+            job["finished_at"] = time.time()
+            if remove_after and os.path.exists(archive_path):
+                os.remove(archive_path)
+
+    threading.Thread(target=run, name=f"ingest-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def get_job(job_id: str):
+    """查询导入任务状态和进度报告；任务不存在或已过期返回 None"""
+    with _jobs_lock:
+        _prune_jobs()
+        return _jobs.get(job_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量导入简历（目录或 zip 包）")
+    parser.add_argument("path", help="简历目录或 zip 包路径")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="每块处理的文件数")
+    parser.add_argument("--report", help="把导入报告（含每个失败文件的原因）写入该 JSON 文件")
+    args = parser.parse_args()
+
+    result = ingest_resumes(args.path, args.chunk_size, progress=print_progress)
+    print(f"✅ 导入完成：{result['files']} 个文件，成功 {result['saved']}，失败 {result['failed']}，"
+          f"耗时 {result['elapsed_s']:.1f} s")
+    for error in result["errors"][:20]:
+        print(f"  ❌ {error['file']}: {error['error']}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"导入报告已写入 {args.report}")
+
+    # 服务在运行时它持有简历索引，本进程的索引写入已交给它，这里不会落盘；服务没在运行时本进程持有索引，落盘快照
+    from .matching import close_indexes
+    close_indexes()
+    shutdown_executors()
@@ -0,0 +1,133 @@
+import os
+
+# **后端运行参数：全部可通过环境变量覆盖**
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+# ✅ 常驻 FAISS 索引：两次检查磁盘文件是否更新之间的最小间隔（秒）
+INDEX_RELOAD_CHECK_INTERVAL = _env_float("INDEX_RELOAD_CHECK_INTERVAL", 2.0)
+
+# ✅ 查询缓存：技能集合 -> 向量，以及 (查询, top_k, 索引版本) -> 完整匹配结果
+EMBEDDING_CACHE_SIZE = _env_int("EMBEDDING_CACHE_SIZE", 4096)
+EMBEDDING_CACHE_TTL = _env_float("EMBEDDING_CACHE_TTL", 3600.0)
+RESULT_CACHE_SIZE = _env_int("RESULT_CACHE_SIZE", 1024)
+RESULT_CACHE_TTL = _env_float("RESULT_CACHE_TTL", 300.0)
+
+# ✅ 编码微批处理：时间窗内到达的请求合并为一次 model.encode
+ENCODER_MAX_BATCH_SIZE = _env_int("ENCODER_MAX_BATCH_SIZE", 32)
+ENCODER_MAX_WAIT_MS = _env_float("ENCODER_MAX_WAIT_MS", 5.0)
+
+# ✅ 执行器：阻塞 I/O 线程池大小；简历解析进程池大小（0 表示在线程池中解析）
+BLOCKING_THREAD_POOL_SIZE = _env_int("BLOCKING_THREAD_POOL_SIZE", min(32, (os.cpu_count() or 1) + 4))
+PARSE_PROCESS_POOL_SIZE = _env_int("PARSE_PROCESS_POOL_SIZE", max(1, (os.cpu_count() or 2) // 2))
+
+# ✅ 职位 / 简历索引写入：组提交的批大小 / 等待窗口；累计多少条或多少秒后落盘快照
+INDEX_COMMIT_BATCH_SIZE = _env_int("INDEX_COMMIT_BATCH_SIZE", 256)
+INDEX_COMMIT_MAX_WAIT_MS = _env_float("INDEX_COMMIT_MAX_WAIT_MS", 10.0)
+INDEX_SNAPSHOT_EVERY = _env_int("INDEX_SNAPSHOT_EVERY", 1000)
+INDEX_SNAPSHOT_INTERVAL = _env_float("INDEX_SNAPSHOT_INTERVAL", 300.0)
+
+# ✅ 索引类型：flat（精确）/ ivf（倒排）/ hnsw（图）。简历索引需要原地替换和删除，只支持 flat / ivf
+JOB_INDEX_TYPE = _env_str("JOB_INDEX_TYPE", "flat")
+RESUME_INDEX_TYPE = _env_str("RESUME_INDEX_TYPE", "flat")
+IVF_NLIST = _env_int("IVF_NLIST", 0)  # 0 表示按数据量自动选择（约 4 * sqrt(N)）
+IVF_NPROBE = _env_int("IVF_NPROBE", 16)
+HNSW_M = _env_int("HNSW_M", 32)
+HNSW_EF_CONSTRUCTION = _env_int("HNSW_EF_CONSTRUCTION", 200)
+HNSW_EF_SEARCH = _env_int("HNSW_EF_SEARCH", 128)
+
+# ✅ 向量存储格式：fp32（原始）/ fp16 / sq8（8 位标量量化）/ pq（乘积量化，每个子空间 1 字节）
+JOB_INDEX_STORAGE = _env_str("JOB_INDEX_STORAGE", "fp32")
+RESUME_INDEX_STORAGE = _env_str("RESUME_INDEX_STORAGE", "fp32")
+PQ_M = _env_int("PQ_M", 96)
+# 压缩存储时先取 k * RERANK_FACTOR 个候选，再用原始向量精确重排；0 表示不重排
+RERANK_FACTOR = _env_int("RERANK_FACTOR", 4)
+
+# ✅ 全量构建索引：每块读取的行数、并行编码进程数、编码批大小、检查点目录
+BUILD_CHUNK_SIZE = _env_int("BUILD_CHUNK_SIZE", 2048)
+BUILD_WORKERS = _env_int("BUILD_WORKERS", os.cpu_count() or 1)
+BUILD_ENCODE_BATCH_SIZE = _env_int("BUILD_ENCODE_BATCH_SIZE", 64)
+BUILD_CHECKPOINT_DIR = _env_str(
+    "BUILD_CHECKPOINT_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database", "build_checkpoints")),
+)
+
+# ✅ 模型：句向量模型与 spaCy 模型名称（按需加载，每个进程只加载一次）
+SENTENCE_MODEL_NAME = _env_str("SENTENCE_MODEL_NAME", "all-mpnet-base-v2")
+SPACY_MODEL_NAME = _env_str("SPACY_MODEL_NAME", "en_core_web_sm")
+# 姓名提取只用到 NER：加载 spaCy 时排除的组件（逗号分隔），以及 nlp.pipe 的批大小 / 进程数
+SPACY_EXCLUDE = _env_str("SPACY_EXCLUDE", "tagger,parser,attribute_ruler,lemmatizer,senter")
+SPACY_BATCH_SIZE = _env_int("SPACY_BATCH_SIZE", 64)
+SPACY_N_PROCESS = _env_int("SPACY_N_PROCESS", 1)
+
+# ✅ 句向量推理后端：torch（SentenceTransformer）/ onnx（导出为 ONNX 用 ONNX Runtime 推理）/
+# hashing（确定性哈希编码，不需要模型，用于测试和评测）
+ENCODER_BACKEND = _env_str("ENCODER_BACKEND", "torch")
+# 向量维度：模型截断到前 N 维（0 表示原生维度）；哈希编码器的输出维度（0 表示 384）
+ENCODER_DIM = _env_int("ENCODER_DIM", 0)
+ONNX_QUANTIZE = _env_int("ONNX_QUANTIZE", 1)  # 1 表示使用动态 int8 量化后的模型
+ONNX_THREADS = _env_int("ONNX_THREADS", 0)  # ONNX Runtime 算子内线程数，0 表示由运行时决定
+ONNX_MODEL_DIR = _env_str(
+    "ONNX_MODEL_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database", "onnx_models")),
+)
+
+# ✅ 简历上传限制：文件大小（字节）和 PDF 页数
+MAX_UPLOAD_BYTES = _env_int("MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+MAX_PDF_PAGES = _env_int("MAX_PDF_PAGES", 20)
+
+# ✅ 技能词典文件（每行 `标准名 | 同义词...`），启动时编译成自动机
+SKILL_TAXONOMY_PATH = _env_str(
+    "SKILL_TAXONOMY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "skills_taxonomy.txt")
+)
+
+# ✅ 批量导入简历：每块处理的文件数（一个事务 + 一次索引提交），每个解析任务的文件数
+BULK_CHUNK_SIZE = _env_int("BULK_CHUNK_SIZE", 1000)
+BULK_PARSE_TASK_SIZE = _env_int("BULK_PARSE_TASK_SIZE", 32)
+# ✅ 批量导入用独立的解析进程池（与 /upload/ 的交互式解析池分开），导入大批文件时在线上传不用排队
+BULK_PARSE_WORKERS = _env_int("BULK_PARSE_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+# ✅ /upload_batch/ 的 zip 包大小上限（字节）；导入任务结束后状态保留多少秒，过期后查询返回 404
+MAX_BATCH_UPLOAD_BYTES = _env_int("MAX_BATCH_UPLOAD_BYTES", 512 * 1024 * 1024)
+INGEST_JOB_TTL = _env_float("INGEST_JOB_TTL", 24 * 3600.0)
+
+# ✅ 重复简历（同一邮箱或解析字段完全相同）的处理策略：replace（新简历覆盖）/ merge（合并教育和技能）
+DUPLICATE_POLICY = _env_str("DUPLICATE_POLICY", "replace")
+
+# ✅ 重复职位：标题 + 公司规范化后相同且向量相似度不低于该阈值的职位在建索引时归为一组，查询时每组只返回一个
+JOB_DUPLICATE_SIMILARITY = _env_float("JOB_DUPLICATE_SIMILARITY", 0.95)
+# ✅ 查询先取 top_k * SEARCH_OVERFETCH 个候选，去重后不够再加倍继续搜索，最多取 SEARCH_MAX_K 个
+SEARCH_OVERFETCH = _env_int("SEARCH_OVERFETCH", 2)
+SEARCH_MAX_K = _env_int("SEARCH_MAX_K", 4096)
+
+# ✅ 属性过滤：命中的 ID 不超过该数量时不走近似索引，直接对这些 ID 精确计算；
+# 单条写入的属性变化积累到 FILTER_OVERRIDE_LIMIT 条后在后台重新扫描数据库
+FILTER_EXACT_SCAN_MAX = _env_int("FILTER_EXACT_SCAN_MAX", 4096)
+FILTER_OVERRIDE_LIMIT = _env_int("FILTER_OVERRIDE_LIMIT", 10000)
+
+# ✅ 分页：游标对应的会话（查询向量 + 排名）保留 CURSOR_TTL 秒，每次翻页重新计时；每页最多 MAX_PAGE_SIZE 条
+CURSOR_TTL = _env_float("CURSOR_TTL", 600.0)
+CURSOR_CACHE_SIZE = _env_int("CURSOR_CACHE_SIZE", 1024)
+MAX_PAGE_SIZE = _env_int("MAX_PAGE_SIZE", 100)
+
+# ✅ 批量匹配接口每次最多的查询数
+MAX_BATCH_QUERIES = _env_int("MAX_BATCH_QUERIES", 1000)
+
+# ✅ 预计算匹配：每个职位 / 每份简历保存前 MATERIALIZE_TOP_N 个结果；分块矩阵乘法的块大小；
+# 后台全量刷新间隔（秒，0 表示只在手动触发时刷新）
+MATERIALIZE_TOP_N = _env_int("MATERIALIZE_TOP_N", 50)
+MATERIALIZE_BLOCK_SIZE = _env_int("MATERIALIZE_BLOCK_SIZE", 4096)
+MATERIALIZE_INTERVAL = _env_float("MATERIALIZE_INTERVAL", 0.0)
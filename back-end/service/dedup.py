@@ -0,0 +1,216 @@
+import os
+import re
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# **重复职位折叠：建索引时把转发、重复抓取的职位分组，查询时按 ID 去重，补全详情之前就完成**
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_key(title, company) -> str:
+    """标题 + 公司的规范形式：小写，标点和空白统一成一个空格"""
+    return "|".join(_NON_WORD.sub(" ", (value or "").lower()).strip() for value in (title, company))
+
+
+def group_duplicates(ids, keys, vectors, threshold: float):
+    """
+    ids 按升序排列且与 vectors 对齐，keys 是 [(id, 规范化键)]。
+    同一个键下余弦相似度不低于 threshold 的职位归为一组，组号是组内最小的 ID。
+    只返回不止一个成员的组：(成员ID数组, 组号数组)
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    buckets = defaultdict(list)
+    for item_id, key in keys:
+        row = np.searchsorted(ids, item_id)
+        if row < len(ids) and ids[row] == item_id:
+            buckets[key].append(row)
+
+    members, groups = [], []
+    for rows in buckets.values():
+        if len(rows) < 2:
+            continue
+        rows.sort()
+        # 贪心聚类：按 ID 顺序，和已有代表足够相似就加入该组，否则自己成为新代表
+        representatives = []
+        for row in rows:
+            vector = vectors[row]
+            if representatives:
+                similarities = np.stack([vectors[rep] for rep in representatives]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= threshold:
+                    members.append(ids[row])
+                    groups.append(ids[representatives[best]])
+                    continue
+            representatives.append(row)
+            members.append(ids[row])
+            groups.append(ids[row])
+
+    members = np.asarray(members, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    # 只有一个成员的“组”不需要记录
+    sizes = defaultdict(int)
+    for group in groups.tolist():
+        sizes[group] += 1
+    keep = np.asarray([sizes[group] > 1 for group in groups.tolist()], dtype=bool)
+    return members[keep], groups[keep]
+
+
+def groups_path(index_path: str) -> str:
+    base, _ = os.path.splitext(index_path)
+    return base + ".groups.npz"
+
+
+def write_groups(index_path: str, members, groups):
+    path = groups_path(index_path)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, members=np.asarray(members, dtype=np.int64), groups=np.asarray(groups, dtype=np.int64))
+    os.replace(path + ".tmp", path)
+
+
+class DuplicateGroups:
+    """ID -> 组号（不在任何组里的 ID 自成一组）；分组文件随索引重建更新"""
+
+    def __init__(self, index_path: str):
+        self.path = groups_path(index_path)
+        self._groups = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def reload_if_changed(self):
+        try:
+            stamp = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp is None:
+                self._groups = {}
+            else:
+                with np.load(self.path) as data:
+                    self._groups = dict(zip(data["members"].tolist(), data["groups"].tolist()))
+            self._stamp = stamp
+
+    def group_of(self, item_id: int) -> int:
+        return self._groups.get(item_id, item_id)
+
+    def __len__(self):
+        return len(self._groups)
+
+
+class RankedResults:
+    """
+    迭代加深的去重排名：先搜 want * overfetch 个候选，按组号去重后记下 (ID, 分数)；
+    需要更多结果时把 k 加倍重新搜索，只追加新出现的 ID；单次加深最多到 max(max_k, want * overfetch)。
+    状态保留下来，翻页时从上次的位置继续。
+    make_search() 返回 (search(k), 可搜索数量)，search(k) 返回 FAISS 的 (scores, ids)；没有可搜索的 ID 时为 (None, 0)
+    """
+
+    def __init__(self, make_search, overfetch: int, max_k: int, group_of=None):
+        self._make_search = make_search
+        self._overfetch = overfetch
+        self._max_k = max_k
+        self._group_of = group_of
+        self.ranked = []
+        self.exhausted = False
+        self._k = 0
+        self._seen_ids = set()
+        self._seen_groups = set()
+        self._lock = threading.Lock()
+
+    def _deepen(self, want: int) -> bool:
+        """加深一次；k 已达到本次上限（max_k 与 want * overfetch 的较大者）时返回 False"""
+        search, ntotal = self._make_search()
+        if search is None or self._k >= ntotal:
+            self.exhausted = True
+            return False
+        limit = min(ntotal, max(self._max_k, want * self._overfetch))
+        if self._k >= limit:
+            return False
+        k = min(max(want * self._overfetch, self._k * 2), limit)
+        scores, ids = search(k)
+        self._k = k
+        for item_id, score in zip(ids[0], scores[0]):
+            item_id = int(item_id)
+            if item_id < 0 or item_id in self._seen_ids:
+                continue
+            self._seen_ids.add(item_id)
+            group = self._group_of(item_id) if self._group_of else item_id
+            if group in self._seen_groups:
+                continue
+            self._seen_groups.add(group)
+            self.ranked.append((item_id, float(score)))
+        if k >= ntotal:
+            self.exhausted = True
+        return True
+
+    def page(self, position: int, count: int, hydrate):
+        """
+        从排名第 position 位开始取 count 个结果，只补全需要的 ID，数据库中已删除的跳过。
+        hydrate(ids) 按顺序返回详情（不存在为 None）。返回 ([(id, score, 详情)], 下一页起点, 是否还有更多)
+        """
+        results = []
+        with self._lock:
+            while len(results) < count:
+                need = count - len(results)
+                while len(self.ranked) < position + need and not self.exhausted:
+                    if not self._deepen(position + need):
+                        break
+                batch = self.ranked[position:position + need]
+                if not batch:
+                    break
+                position += len(batch)
+                for (item_id, score), detail in zip(batch, hydrate([item_id for item_id, _ in batch])):
+                    if detail:
+                        results.append((item_id, score, detail))
+            more = not (self.exhausted and position >= len(self.ranked))
+        return results, position, more
+
+
+def collect_batch(search, hydrate, nq: int, top_k: int, ntotal: int, overfetch: int, max_k: int, group_of=None):
+    """
+    RankedResults 的批量版：所有查询一起搜索（nq > 1），每轮各查询需要的 ID 合并成一次补全；
+    去重后仍不足 top_k 的查询下一轮把 k 加倍、只对这些行再搜一次。
+    search(k, rows) 返回这些查询行的 (scores, ids)。返回与查询顺序一致的 [[(id, score, 详情)]]
+    """
+    results = [[] for _ in range(nq)]
+    seen_ids = [set() for _ in range(nq)]
+    seen_groups = [set() for _ in range(nq)]
+    limit = min(ntotal, max(max_k, top_k * overfetch))
+    k = min(top_k * overfetch, limit)
+    rows = list(range(nq))
+    while rows and k > 0:
+        scores, ids = search(k, rows)
+        picked = {}
+        for position, row in enumerate(rows):
+            need = top_k - len(results[row])
+            picks = picked[row] = []
+            for item_id, score in zip(ids[position], scores[position]):
+                if len(picks) >= need:
+                    break
+                item_id = int(item_id)
+                if item_id < 0 or item_id in seen_ids[row]:
+                    continue
+                seen_ids[row].add(item_id)
+                group = group_of(item_id) if group_of else item_id
+                if group in seen_groups[row]:
+                    continue
+                seen_groups[row].add(group)
+                picks.append((item_id, float(score)))
+
+        # 所有查询本轮要补全的 ID 一次查询取回
+        unique_ids = list(dict.fromkeys(item_id for picks in picked.values() for item_id, _ in picks))
+        details = dict(zip(unique_ids, hydrate(unique_ids))) if unique_ids else {}
+        for row, picks in picked.items():
+            results[row].extend((item_id, score, details[item_id]) for item_id, score in picks if details[item_id])
+
+        if k >= limit:
+            break
+        rows = [row for row in rows if len(results[row]) < top_k]
+        k = min(k * 2, limit)
+
+    for row_results in results:
+        row_results.sort(key=lambda result: -result[1])
+    return results
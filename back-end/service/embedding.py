@@ -1,25 +1,10 @@
-import os
-import sys
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-# **手动添加 `database/` 目录到 Python 路径**
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database")))
-
-from database import get_jobs
-
-# **FAISS 和数据库路径**
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
-FAISS_INDEX_PATH = os.path.join(BASE_DIR, "job_embeddings.faiss")
-JOB_IDS_PATH = os.path.join(BASE_DIR, "job_ids.npy")
-
-# 确保所有代码使用相同的模型
-model = SentenceTransformer("all-mpnet-base-v2")  # ✅ 确保 `matching.py` 也用这个
-
-# **打印嵌入向量维度**
-test_embedding = model.encode(["test"], convert_to_numpy=True)
-print("🔍 嵌入向量维度:", test_embedding.shape[1])  # ✅ 打印 FAISS 需要的维度
+# 在 back-end 目录下运行：python -m service.embedding
+from database.database import get_jobs
+from .index_manager import build_id_index
+from .matching import replace_job_index
+from .model_registry import get_sentence_model
 
 def normalize(vecs):
     """归一化向量，使其适用于 Cosine Similarity"""
@@ -38,17 +23,15 @@ def build_faiss_index():
     job_ids = [job[0] for job in jobs]
 
     # 计算职位描述的嵌入向量
-    job_embeddings = model.encode(job_descriptions, convert_to_numpy=True)
+    # ✅ 与 matching.py 共用模型注册表中的同一个模型
+    job_embeddings = get_sentence_model().encode(job_descriptions, convert_to_numpy=True)
     job_embeddings = normalize(job_embeddings)  # ✅ 只归一化一次
 
-    # **创建 FAISS 余弦相似度索引**
-    dimension = job_embeddings.shape[1]
-    index = faiss.IndexFlatIP(dimension)  # ✅ 确保维度匹配
-    index.add(job_embeddings)
+    # **创建以职位ID为键的 FAISS 余弦相似度索引（不再需要单独的 job_ids.npy）**
+    index = build_id_index(job_embeddings, job_ids)
 
-    # 存储索引和职位 ID
-    faiss.write_index(index, FAISS_INDEX_PATH)
-    np.save(JOB_IDS_PATH, job_ids)
+    # ✅ 交给常驻职位索引换上：索引目录（编码器命名空间）此时才确定，快照先写临时文件、fsync 后再替换
+    replace_job_index(index)
     print(f"✅ {len(jobs)} 条职位数据已存入 FAISS（Cosine Similarity）！")
 
 if __name__ == "__main__":
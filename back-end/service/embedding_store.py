@@ -0,0 +1,70 @@
+import hashlib
+
+import numpy as np
+
+from database.db_utils import get_connection, transaction
+
+# **持久化向量库：每行数据的向量以 float16 存在同一个库的 <表>_embeddings 表里，
+# 记录模型标识和源文本哈希；重建索引时文本和模型都没变的行直接取出，不再编码**
+JOB_EMBEDDINGS_TABLE = "job_embeddings"
+RESUME_EMBEDDINGS_TABLE = "resume_embeddings"
+
+# SQLite 默认最多 999 个绑定参数
+MAX_SQL_VARIABLES = 900
+
+
+def text_hash(text: str) -> str:
+    """源文本哈希（编码前、截断前的完整文本）"""
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def load_vectors(db_path: str, table: str, model_id: str, ids):
+    """返回 {id: (文本哈希, float32 向量)}；没有存储的 id 不出现在结果里"""
+    ids = [int(i) for i in ids]
+    found = {}
+    cursor = get_connection(db_path).cursor()
+    for start in range(0, len(ids), MAX_SQL_VARIABLES):
+        chunk = ids[start:start + MAX_SQL_VARIABLES]
+        cursor.execute(
+            f"SELECT id, text_hash, vector FROM {table} WHERE model = ? AND id IN ({','.join('?' * len(chunk))})",
+            [model_id] + chunk,
+        )
+        for item_id, hashed, blob in cursor.fetchall():
+            found[item_id] = (hashed, np.frombuffer(blob, dtype=np.float16).astype(np.float32))
+    return found
+
+
+def save_vectors(db_path: str, table: str, model_id: str, ids, hashes, vectors):
+    """保存（或覆盖）一批向量，一个事务内 executemany"""
+    vectors = np.asarray(vectors, dtype=np.float16).reshape(len(ids), -1)
+    with transaction(db_path) as cursor:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {table} (model, id, text_hash, vector) VALUES (?, ?, ?, ?)",
+            [(model_id, int(item_id), hashed, vector.tobytes())
+             for item_id, hashed, vector in zip(ids, hashes, vectors)],
+        )
+
+
+def delete_vectors(db_path: str, table: str, ids):
+    """删除这些 id 在所有模型下的向量"""
+    ids = [int(i) for i in ids]
+    with transaction(db_path) as cursor:
+        for start in range(0, len(ids), MAX_SQL_VARIABLES):
+            chunk = ids[start:start + MAX_SQL_VARIABLES]
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+
+
+def iter_vectors(db_path: str, table: str, model_id: str, block_size: int):
+    """按 ID 顺序分块读出某个模型的全部向量，产出 (ids, float32 矩阵)"""
+    cursor = get_connection(db_path).cursor()
+    last_id = -1
+    while True:
+        cursor.execute(f"SELECT id, vector FROM {table} WHERE model = ? AND id > ? ORDER BY id LIMIT ?",
+                       (model_id, last_id, block_size))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+        vectors = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float16).reshape(len(rows), -1)
+        yield ids, vectors.astype(np.float32)
+        last_id = int(ids[-1])
@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import observe
+
+
+class BatchingEncoder:
+    """把并发到达的单条 encode 请求合并成一次批量 encode（动态微批处理）"""
+
+    def __init__(self, encode_batch, max_batch_size: int, max_wait_ms: float):
+        # encode_batch(texts: List[str]) -> np.ndarray (len(texts) x d)
+        self.encode_batch = encode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def encode(self, text: str):
+        """编码单条文本，返回一维向量；阻塞直到所在批次完成"""
+        if self.max_batch_size <= 1:
+            return self.encode_batch([text])[0]
+
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        self._ensure_worker()
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self):
+        """阻塞等待第一条请求，然后在 max_wait 时间窗内继续收集，直到凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                observe("encoder.queue_wait_ms", (started - enqueued) * 1000)
+            observe("encoder.batch_size", len(batch))
+
+            try:
+                vectors = self.encode_batch([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            observe("encoder.batch_encode_ms", (time.perf_counter() - started) * 1000)
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
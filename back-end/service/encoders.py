@@ -0,0 +1,129 @@
+import hashlib
+import re
+
+import numpy as np
+
+from .config import ONNX_MODEL_DIR, ONNX_QUANTIZE, ONNX_THREADS
+
+# **句向量编码器接口：索引构建、在线查询只依赖 encode / dimension / max_seq_length**
+ENCODER_BACKENDS = ("torch", "onnx", "hashing")
+
+# 常用模型的原生维度：用于在不加载模型的情况下确定索引目录
+KNOWN_DIMENSIONS = {
+    "all-mpnet-base-v2": 768,
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "paraphrase-MiniLM-L3-v2": 384,
+    "multi-qa-MiniLM-L6-cos-v1": 384,
+}
+HASHING_DEFAULT_DIMENSION = 384
+
+
+class SentenceEncoder:
+    """编码器基类：encode 返回 L2 归一化的 float32 向量（n x d），单个字符串返回 (d,)"""
+
+    name = "base"
+    dimension = 0
+    max_seq_length = 512
+    supports_multi_process = False
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        raise NotImplementedError
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TransformerEncoder(SentenceEncoder):
+    """包装 SentenceTransformer 或 ONNX 编码器；可截断到前 truncate_dim 维并重新归一化"""
+
+    def __init__(self, model, name: str, truncate_dim: int = 0):
+        native = model.get_sentence_embedding_dimension()
+        if truncate_dim and truncate_dim > native:
+            raise ValueError(f"❌ 截断维度 {truncate_dim} 大于模型 {name} 的原生维度 {native}")
+        self.model = model
+        self.name = name
+        self.dimension = truncate_dim or native
+        self.max_seq_length = model.max_seq_length
+        self.supports_multi_process = hasattr(model, "start_multi_process_pool")
+
+    def _truncate(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.shape[-1] == self.dimension:
+            return embeddings
+        if embeddings.ndim == 1:
+            return _normalize(embeddings[None, :self.dimension])[0]
+        return _normalize(embeddings[:, :self.dimension])
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        return self._truncate(self.model.encode(sentences, batch_size=batch_size, convert_to_numpy=True))
+
+    def start_multi_process_pool(self, target_devices):
+        return self.model.start_multi_process_pool(target_devices=target_devices)
+
+    def encode_multi_process(self, sentences, pool, batch_size: int = 32):
+        return self._truncate(self.model.encode_multi_process(sentences, pool, batch_size=batch_size))
+
+    def stop_multi_process_pool(self, pool):
+        self.model.stop_multi_process_pool(pool)
+
+
+class HashingEncoder(SentenceEncoder):
+    """确定性的哈希编码器：词和相邻词对哈希到固定维度（带符号），无需下载模型，用于测试和评测"""
+
+    name = "hashing"
+    _token_re = re.compile(r"[a-z0-9+#.]+")
+
+    def __init__(self, dimension: int = HASHING_DEFAULT_DIMENSION):
+        self.dimension = dimension
+
+    def _features(self, text: str):
+        tokens = self._token_re.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def _encode_one(self, text: str, out):
+        for feature in self._features(text):
+            # ✅ 用 blake2b 而不是 hash()：不同进程、不同运行之间结果一致
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            out[digest % self.dimension] += 1.0 if (digest >> 63) & 1 else -1.0
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            self._encode_one(text or "", embeddings[row])
+        embeddings = _normalize(embeddings).astype(np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def create_encoder(backend: str, model_name: str, dimension: int = 0) -> SentenceEncoder:
+    """按后端创建编码器；dimension 对模型是截断维度（0 表示原生维度），对哈希编码器是输出维度"""
+    if backend == "hashing":
+        return HashingEncoder(dimension or HASHING_DEFAULT_DIMENSION)
+    if backend == "onnx":
+        from .onnx_encoder import load_onnx_encoder
+        model = load_onnx_encoder(model_name, ONNX_MODEL_DIR, quantize=bool(ONNX_QUANTIZE), threads=ONNX_THREADS)
+        return TransformerEncoder(model, model_name, dimension)
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return TransformerEncoder(SentenceTransformer(model_name), model_name, dimension)
+    raise ValueError(f"❌ 不支持的编码后端：{backend}，可选：{', '.join(ENCODER_BACKENDS)}")
+
+
+def expected_dimension(backend: str, model_name: str, dimension: int = 0):
+    """不加载模型推断输出维度；未知模型返回 None"""
+    if backend == "hashing":
+        return dimension or HASHING_DEFAULT_DIMENSION
+    return dimension or KNOWN_DIMENSIONS.get(model_name)
+
+
+def encoder_namespace(backend: str, model_name: str, dimension: int) -> str:
+    """索引命名空间：模型 + 维度。torch 和 onnx 后端输出一致，共用同一套索引"""
+    name = "hashing" if backend == "hashing" else re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+    return f"{name}-{dimension}"
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .config import BLOCKING_THREAD_POOL_SIZE, BULK_PARSE_WORKERS, PARSE_PROCESS_POOL_SIZE
+from .model_registry import warmup_parser
+
+# **事件循环只负责 await：阻塞 I/O（FAISS、SQLite）放线程池，CPU 密集的解析放进程池**
+_lock = threading.Lock()
+_thread_pool = None
+_process_pool = None
+_bulk_process_pool = None
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=BLOCKING_THREAD_POOL_SIZE,
+                                              thread_name_prefix="blocking")
+        return _thread_pool
+
+
+def get_process_pool():
+    """解析进程池；PARSE_PROCESS_POOL_SIZE=0 时退回线程池"""
+    global _process_pool
+    if PARSE_PROCESS_POOL_SIZE <= 0:
+        return get_thread_pool()
+    with _lock:
+        if _process_pool is None:
+            # ✅ 用 spawn 启动子进程，避免 fork 继承 PyTorch/FAISS 的线程状态导致死锁
+            # 每个子进程启动时先加载 spaCy 并跑一次解析，第一份简历不用等模型加载
+            _process_pool = ProcessPoolExecutor(max_workers=PARSE_PROCESS_POOL_SIZE,
+                                                mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=warmup_parser)
+        return _process_pool
+
+
+def get_bulk_process_pool():
+    """批量导入的解析进程池：与交互式解析池分开，批量导入占满它也不影响 /upload/"""
+    global _bulk_process_pool
+    with _lock:
+        if _bulk_process_pool is None:
+            _bulk_process_pool = ProcessPoolExecutor(max_workers=BULK_PARSE_WORKERS,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=warmup_parser)
+        return _bulk_process_pool
+
+
+async def run_in_thread(fn, *args, **kwargs):
+    """在线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_in_process(fn, *args, **kwargs):
+    """在进程池中执行 CPU 密集函数（fn 和参数必须可以被 pickle）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), functools.partial(fn, *args, **kwargs))
+
+
+def warm_process_pool():
+    """启动全部解析子进程（进程池按需创建子进程，这里提交一批空任务让它们都启动并完成预热）"""
+    pool = get_process_pool()
+    size = PARSE_PROCESS_POOL_SIZE if PARSE_PROCESS_POOL_SIZE > 0 else 1
+    for future in [pool.submit(_noop) for _ in range(size)]:
+        future.result()
+
+
+def _noop():
+    return None
+
+
+def shutdown_executors():
+    """应用关闭时释放线程池和进程池"""
+    global _thread_pool, _process_pool, _bulk_process_pool
+    with _lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False)
+            _process_pool = None
+        if _bulk_process_pool is not None:
+            _bulk_process_pool.shutdown(wait=False)
+            _bulk_process_pool = None
+        if _thread_pool is not None:
+            _thread_pool.shutdown(wait=False)
+            _thread_pool = None
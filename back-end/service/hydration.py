@@ -0,0 +1,79 @@
+import time
+from typing import Dict, List, Optional
+
+from database.db_utils import JOBS_DB_PATH, RESUMES_DB_PATH, get_connection
+from .metrics import observe
+
+# **FAISS 命中结果的批量补全：一次 `WHERE id IN (...)` 查询取回所有详情**
+# 每个线程对每个库复用同一个连接（WAL 模式下读不会被写入阻塞）
+
+# SQLite 默认最多 999 个绑定参数，超过就分批查询
+MAX_SQL_VARIABLES = 900
+
+
+def _fetch_rows_by_ids(db_path: str, sql: str, ids: List[int]) -> Dict[int, tuple]:
+    """执行 `sql`（其中 {placeholders} 会被替换为 ?,?,...），返回 id -> 行"""
+    unique_ids = list(dict.fromkeys(int(i) for i in ids))
+    rows = {}
+    if not unique_ids:
+        return rows
+
+    cursor = get_connection(db_path).cursor()
+    for start in range(0, len(unique_ids), MAX_SQL_VARIABLES):
+        chunk = unique_ids[start:start + MAX_SQL_VARIABLES]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(sql.format(placeholders=placeholders), chunk)
+        for row in cursor.fetchall():
+            rows[row[0]] = row
+    return rows
+
+
+def hydrate_jobs(job_ids: List[int]) -> List[Optional[dict]]:
+    """按 FAISS 排名顺序返回职位详情，数据库中不存在的 ID 对应 None"""
+    started = time.perf_counter()
+    rows = _fetch_rows_by_ids(JOBS_DB_PATH, """
+        SELECT id, job_title, company_name, location, job_description
+        FROM jobs
+        WHERE id IN ({placeholders})
+    """, job_ids)
+
+    jobs = []
+    for job_id in job_ids:
+        row = rows.get(int(job_id))
+        jobs.append({
+            "title": row[1],
+            "company": row[2],
+            "location": row[3],
+            "description": row[4],
+        } if row else None)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    observe("hydration.jobs_ms", elapsed_ms)
+    print(f"职位详情补全：{len(job_ids)} 个ID，耗时 {elapsed_ms:.1f} ms")
+    return jobs
+
+
+def hydrate_resumes(resume_ids: List[int]) -> List[Optional[dict]]:
+    """按 FAISS 排名顺序返回简历详情，数据库中不存在的 ID 对应 None"""
+    started = time.perf_counter()
+    rows = _fetch_rows_by_ids(RESUMES_DB_PATH, """
+        SELECT id, name, email, phone, education, skills
+        FROM resumes
+        WHERE id IN ({placeholders})
+    """, resume_ids)
+
+    resumes = []
+    for resume_id in resume_ids:
+        row = rows.get(int(resume_id))
+        resumes.append({
+            "name": row[1],
+            "email": row[2],
+            "phone": row[3],
+            "education": row[4],
+            "skills": row[5],
+        } if row else None)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    observe("hydration.resumes_ms", elapsed_ms)
+    print(f"简历详情补全：{len(resume_ids)} 个ID，耗时 {elapsed_ms:.1f} ms")
+    return resumes
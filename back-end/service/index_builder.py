@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from database.db_utils import connect
+
+from .embedding_store import load_vectors, save_vectors, text_hash
+
+# **流式、可断点续建、多进程的索引构建：分块读取 -> 按长度排序 -> 并行编码 -> 写检查点**
+# 传入 store_table 时只编码文本或模型变化的行，其余直接取持久化的向量
+
+
+def truncate_to_token_limit(text: str, max_tokens: int) -> str:
+    """在分词前按词截断：每个词至少对应一个 token，超出 max_tokens 的词模型也看不到"""
+    words = (text or "").split()
+    return " ".join(words[:max_tokens]) if len(words) > max_tokens else " ".join(words)
+
+
+def _write_json_atomic(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _load_state(checkpoint_dir: str, signature: dict):
+    """读取检查点状态；构建参数不一致（换了模型或 SQL）时从头开始"""
+    state_path = os.path.join(checkpoint_dir, "state.json")
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("signature") == signature:
+            return state
+        print("⚠️ 检查点与当前构建参数不一致，重新开始构建")
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return {"signature": signature, "last_id": None, "chunks": 0, "rows": 0, "reused": 0}
+
+
+def _encode_chunk(model, texts, pool, batch_size: int):
+    """先按文本长度排序（同一批的 padding 更少），编码后再还原成原顺序"""
+    order = np.argsort([len(text) for text in texts], kind="stable")
+    sorted_texts = [texts[i] for i in order]
+    if pool is not None:
+        sorted_vectors = model.encode_multi_process(sorted_texts, pool, batch_size=batch_size)
+    else:
+        sorted_vectors = model.encode(sorted_texts, convert_to_numpy=True, batch_size=batch_size)
+
+    vectors = np.empty_like(sorted_vectors, dtype=np.float32)
+    vectors[order] = sorted_vectors
+    return vectors
+
+
+def _assemble_chunk(model, model_name: str, db_path: str, store_table: str, ids, texts, pool, batch_size: int):
+    """取出模型和文本哈希都匹配的已存向量，只编码其余的行并写回向量表。返回 (vectors, 复用条数)"""
+    hashes = [text_hash(text) for text in texts]
+    stored = load_vectors(db_path, store_table, model_name, ids)
+    reuse = {}
+    for row, (item_id, hashed) in enumerate(zip(ids.tolist(), hashes)):
+        found = stored.get(item_id)
+        if found is not None and found[0] == hashed:
+            reuse[row] = found[1]
+    todo = [row for row in range(len(ids)) if row not in reuse]
+
+    encoded = None
+    if todo:
+        encoded = _encode_chunk(model, [truncate_to_token_limit(texts[row], model.max_seq_length) for row in todo],
+                                pool, batch_size)
+        save_vectors(db_path, store_table, model_name, ids[todo], [hashes[row] for row in todo], encoded)
+
+    dimension = encoded.shape[1] if encoded is not None else len(next(iter(reuse.values())))
+    vectors = np.empty((len(ids), dimension), dtype=np.float32)
+    for row, vector in reuse.items():
+        vectors[row] = vector
+    if todo:
+        vectors[todo] = encoded
+    return vectors, len(reuse)
+
+
+def stream_embeddings(model, model_name: str, db_path: str, sql: str, text_of, checkpoint_dir: str,
+                      chunk_size: int, workers: int, batch_size: int, resume: bool = True,
+                      store_table: str = None):
+    """
+    分块读取 `sql`（必须是 `SELECT id, ... WHERE id > ? ORDER BY id` 形式）并编码，
+    每块写一个检查点；中断后再次运行会从上次完成的 ID 之后继续。返回 (ids, vectors)。
+    store_table 是同一个库里的向量表：模型和文本哈希都匹配的行不再编码，新编码的向量写回该表。
+    """
+    signature = {"model": model_name, "sql": " ".join(sql.split()), "max_seq_length": model.max_seq_length}
+    if not resume:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    state = _load_state(checkpoint_dir, signature)
+    if state["chunks"]:
+        print(f"从检查点继续：已完成 {state['rows']} 条（{state['chunks']} 块）")
+
+    # ONNX / 哈希编码器没有多进程编码池（ONNX Runtime 自己多线程）
+    multi_process = workers > 1 and model.supports_multi_process
+    pool = model.start_multi_process_pool(target_devices=["cpu"] * workers) if multi_process else None
+    conn = connect(db_path)  # 长时间的流式读取单独用一个连接
+    started = time.perf_counter()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, (state["last_id"] if state["last_id"] is not None else -1,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+
+            ids = np.asarray([row[0] for row in rows], dtype=np.int64)
+            texts = [text_of(row) for row in rows]
+            del rows
+            if store_table:
+                vectors, reused = _assemble_chunk(model, model_name, db_path, store_table, ids, texts,
+                                                  pool, batch_size)
+                state["reused"] = state.get("reused", 0) + reused
+            else:
+                vectors = _encode_chunk(model, [truncate_to_token_limit(text, model.max_seq_length)
+                                                for text in texts], pool, batch_size)
+            del texts
+
+            # ✅ 先写数据块再更新状态：状态里记录的块一定是完整的
+            chunk_path = os.path.join(checkpoint_dir, f"chunk_{state['chunks']:06d}.npz")
+            with open(chunk_path + ".tmp", "wb") as f:
+                np.savez(f, ids=ids, vectors=vectors)
+            os.replace(chunk_path + ".tmp", chunk_path)
+
+            state["chunks"] += 1
+            state["rows"] += len(ids)
+            state["last_id"] = int(ids[-1])
+            _write_json_atomic(os.path.join(checkpoint_dir, "state.json"), state)
+
+            elapsed = time.perf_counter() - started
+            print(f"已处理 {state['rows']} 条（{state['chunks']} 块，复用已存向量 {state.get('reused', 0)} 条），"
+                  f"本次运行 {elapsed:.1f} s")
+    finally:
+        conn.close()
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+    if not state["chunks"]:
+        return np.zeros(0, dtype=np.int64), None
+
+    all_ids, all_vectors = [], []
+    for chunk_no in range(state["chunks"]):
+        with np.load(os.path.join(checkpoint_dir, f"chunk_{chunk_no:06d}.npz")) as chunk:
+            all_ids.append(chunk["ids"])
+            all_vectors.append(chunk["vectors"])
+    return np.concatenate(all_ids), np.vstack(all_vectors)
+
+
+def clear_checkpoints(checkpoint_dir: str):
+    """索引成功写入后删除检查点"""
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
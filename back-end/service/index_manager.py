@@ -0,0 +1,224 @@
+import math
+import os
+import shutil
+import struct
+from collections import namedtuple
+
+import faiss
+import numpy as np
+
+from .config import (
+    HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, HNSW_M, IVF_NLIST, IVF_NPROBE, PQ_M,
+)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+STORAGE_TYPES = ("fp32", "fp16", "sq8", "pq")
+
+# ✅ 一次加载得到的不可变快照：查询拿到引用后，即使后台换了新索引也不受影响
+IndexSnapshot = namedtuple("IndexSnapshot", ["index", "version"])
+
+
+def file_stamp(path: str):
+    """用 (mtime, size) 作为磁盘文件的版本戳，文件缺失返回 None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def new_id_index(dimension: int):
+    """创建以数据库 ID 为键的精确内积索引（支持 upsert / delete / reconstruct）"""
+    return faiss.index_factory(dimension, "IDMap2,Flat", faiss.METRIC_INNER_PRODUCT)
+
+
+def _is_id_index(index) -> bool:
+    return isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) or faiss.try_extract_index_ivf(index) is not None
+
+
+def _is_hnsw(index) -> bool:
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return isinstance(index, faiss.IndexHNSW)
+
+
+def _auto_nlist(n: int) -> int:
+    """倒排列表数：约 4 * sqrt(N)，并保证每个聚类中心至少有 39 个训练样本"""
+    nlist = IVF_NLIST or int(4 * math.sqrt(max(n, 1)))
+    return max(1, min(nlist, n // 39 or 1))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """PQ 子空间数必须整除维度：取不超过 PQ_M 的最大约数"""
+    m = min(PQ_M, dimension)
+    while dimension % m:
+        m -= 1
+    return m
+
+
+def _storage_codec(storage: str, dimension: int) -> str:
+    """向量存储格式 -> faiss 工厂字符串中的编码部分"""
+    if storage == "fp32":
+        return "Flat"
+    if storage == "fp16":
+        return "SQfp16"
+    if storage == "sq8":
+        return "SQ8"
+    if storage == "pq":
+        return f"PQ{_pq_subquantizers(dimension)}"
+    raise ValueError(f"❌ 不支持的向量存储格式：{storage}，可选：{', '.join(STORAGE_TYPES)}")
+
+
+def build_id_index(vectors, ids, index_type: str = "flat", storage: str = "fp32",
+                   nlist: int = None, hnsw_m: int = HNSW_M):
+    """按索引类型和向量存储格式构建以数据库 ID 为键的内积索引并加入全部向量"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = np.asarray(ids, dtype=np.int64)
+    dimension = vectors.shape[1]
+    codec = _storage_codec(storage, dimension)
+
+    if index_type == "flat":
+        index = faiss.index_factory(dimension, f"IDMap2,{codec}", faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "ivf":
+        # ✅ IVF 自带 ID，不需要 IDMap；哈希直接映射用于 remove / reconstruct
+        nlist = nlist or _auto_nlist(len(vectors))
+        index = faiss.index_factory(dimension, f"IVF{nlist},{codec}", faiss.METRIC_INNER_PRODUCT)
+    elif index_type == "hnsw":
+        index = faiss.index_factory(dimension, f"IDMap2,HNSW{hnsw_m},{codec}", faiss.METRIC_INNER_PRODUCT)
+        faiss.downcast_index(index.index).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        raise ValueError(f"❌ 不支持的索引类型：{index_type}，可选：{', '.join(INDEX_TYPES)}")
+
+    # IVF 聚类中心、SQ8 取值范围、PQ 码本都需要训练
+    if not index.is_trained:
+        train_size = min(len(vectors), max((nlist or 0) * 256, 65536))
+        sample = vectors[np.random.default_rng(0).choice(len(vectors), train_size, replace=False)]
+        index.train(sample)
+    if index_type == "ivf":
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    if len(vectors):
+        index.add_with_ids(vectors, ids)
+    configure_search(index)
+    return index
+
+
+def configure_search(index, nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH):
+    """设置近似索引的查询参数（IVF 的 nprobe、HNSW 的 efSearch），精确索引不受影响"""
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe)
+    elif _is_hnsw(index):
+        params.set_index_parameter(index, "efSearch", ef_search)
+    return index
+
+
+def load_id_index(index_path: str, legacy_ids_path: str = None):
+    """读取索引文件；旧格式（行号 + ids.npy）会在内存中转换成 ID 索引"""
+    index = faiss.read_index(index_path)
+    if _is_id_index(index):
+        return configure_search(index)
+
+    if not legacy_ids_path or not os.path.exists(legacy_ids_path):
+        raise ValueError(f"❌ {index_path} 是旧格式索引，但缺少对应的 ID 文件")
+    ids = np.load(legacy_ids_path).astype(np.int64)
+    if len(ids) != index.ntotal:
+        raise ValueError(f"❌ {index_path} 与 {legacy_ids_path} 的向量数量不一致")
+
+    id_index = new_id_index(index.d)
+    if index.ntotal:
+        id_index.add_with_ids(index.reconstruct_n(0, index.ntotal), ids)
+    print(f"已将旧格式索引 {os.path.basename(index_path)} 转换为 ID 索引")
+    return id_index
+
+
+def extract_vectors(index):
+    """取出 ID 索引中的全部 (ids, 向量)，用于评测或重建成其他类型的索引"""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+        vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        return ids, vectors
+
+    ivf = faiss.extract_index_ivf(index)
+    invlists = ivf.invlists
+    ids = np.concatenate([
+        faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+        for list_no in range(ivf.nlist)
+    ]).astype(np.int64)
+    vectors = np.vstack([index.reconstruct(int(i)) for i in ids]) if len(ids) else np.zeros((0, index.d), "float32")
+    return ids, vectors
+
+
+def index_file_dimension(index_path: str) -> int:
+    """只读文件头得到索引维度（四字节类型标记之后是 int32 的 d），不用把整个索引读进内存"""
+    with open(index_path, "rb") as f:
+        header = f.read(8)
+    return struct.unpack("<i", header[4:8])[0]
+
+
+def adopt_legacy_index(legacy_dir: str, index_dir: str, index_file: str, extra_files=(), dimension: int = None):
+    """
+    旧版本把索引直接放在 database/ 下：命名空间目录里还没有该索引、且旧索引维度与当前编码器一致时，
+    把旧文件接入命名空间目录（硬链接，失败时复制；追加写的日志直接移动）
+    """
+    legacy_path = os.path.join(legacy_dir, index_file)
+    target_path = os.path.join(index_dir, index_file)
+    if os.path.exists(target_path) or not os.path.exists(legacy_path):
+        return False
+    legacy_dimension = index_file_dimension(legacy_path)
+    if dimension is not None and legacy_dimension != dimension:
+        print(f"⚠️ 旧索引 {index_file} 的维度是 {legacy_dimension}，当前编码器是 {dimension}，不再使用，请重新构建")
+        return False
+
+    os.makedirs(index_dir, exist_ok=True)
+    for name in (index_file,) + tuple(extra_files):
+        source = os.path.join(legacy_dir, name)
+        target = os.path.join(index_dir, name)
+        if not os.path.exists(source) or os.path.exists(target):
+            continue
+        if name.endswith(".wal"):
+            os.replace(source, target)
+            continue
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+    print(f"已将旧索引 {index_file} 迁移到 {index_dir}")
+    return True
+
+
+def fsync_dir(path: str):
+    """目录项（新建、改名、删除）落盘"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_index_file(index, index_path: str):
+    """
+    先写临时文件再 os.replace，避免常驻索引读到写了一半的文件；
+    临时文件和目录都 fsync 之后才返回，调用方随后截断日志时快照已经落盘
+    """
+    tmp_path = index_path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    fd = os.open(tmp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, index_path)
+    fsync_dir(os.path.dirname(os.path.abspath(index_path)))
+
+
+def apply_changes(index, upsert_ids, vectors, delete_ids=()):
+    """在 ID 索引上执行 upsert / delete：先删掉这些 ID 的旧向量，再加入新向量"""
+    if _is_hnsw(index):
+        raise ValueError("❌ HNSW 索引不支持删除或替换向量，请重新构建索引，或改用 flat / ivf")
+    removed = np.asarray(list(upsert_ids) + list(delete_ids), dtype=np.int64)
+    if len(removed) and index.ntotal:
+        index.remove_ids(removed)
+    if len(upsert_ids):
+        index.add_with_ids(np.asarray(vectors, dtype=np.float32), np.asarray(upsert_ids, dtype=np.int64))
+
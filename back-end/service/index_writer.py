@@ -0,0 +1,662 @@
+import fcntl
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import numpy as np
+
+from .config import INDEX_RELOAD_CHECK_INTERVAL
+from .index_manager import (
+    IndexSnapshot, apply_changes, file_stamp, fsync_dir, load_id_index, new_id_index, write_index_file,
+)
+from .metrics import observe
+
+# **追加写日志（WAL）记录格式：操作码(1B) + ID(int64) + 维度(uint32) + float32 向量**
+# upsert 记录带向量；delete 记录维度为 0
+_RECORD_HEADER = struct.Struct("<cqI")
+_OP_UPSERT = b"U"
+_OP_DELETE = b"D"
+
+
+def _check_records(records, dimension):
+    """
+    写日志之前检查 upsert 的向量：维度与索引一致（索引为空时与第一条 upsert 一致）、没有 NaN / Inf。
+    返回错误信息，全部合法返回 None
+    """
+    for op, item_id, vector in records:
+        if op != _OP_UPSERT:
+            continue
+        if dimension is None:
+            dimension = vector.shape[0]
+        if vector.ndim != 1 or vector.shape[0] != dimension:
+            return f"❌ ID {item_id} 的向量维度是 {vector.shape[-1]}，索引维度是 {dimension}"
+        if not np.isfinite(vector).all():
+            return f"❌ ID {item_id} 的向量包含 NaN 或 Inf"
+    return None
+
+
+def _encode_records(records) -> bytes:
+    return b"".join(
+        _RECORD_HEADER.pack(op, item_id, 0 if vector is None else vector.shape[0]) +
+        (b"" if vector is None else vector.tobytes())
+        for op, item_id, vector in records
+    )
+
+
+def _decode_records(data: bytes):
+    """解析日志内容，返回 (记录列表, 完整记录的字节数)；崩溃时写了一半的尾部记录不算"""
+    offset = 0
+    records = []
+    while offset + _RECORD_HEADER.size <= len(data):
+        op, item_id, dim = _RECORD_HEADER.unpack_from(data, offset)
+        end = offset + _RECORD_HEADER.size + dim * 4
+        if op not in (_OP_UPSERT, _OP_DELETE) or end > len(data):
+            break
+        vector = np.frombuffer(data, dtype=np.float32, count=dim,
+                               offset=offset + _RECORD_HEADER.size) if dim else None
+        records.append((op, item_id, vector))
+        offset = end
+    return records, offset
+
+
+def _apply_records(index, records):
+    """把一批 (op, id, vector) 应用到索引（同一个 ID 只以最后一次操作为准），返回索引（原来为空时新建）"""
+    final = {}
+    for op, item_id, vector in records:
+        final[item_id] = (op, vector)
+    upsert_ids = [item_id for item_id, (op, _) in final.items() if op == _OP_UPSERT]
+    delete_ids = [item_id for item_id, (op, _) in final.items() if op == _OP_DELETE]
+
+    if index is None:
+        if not upsert_ids:
+            return None
+        index = new_id_index(final[upsert_ids[0]][1].shape[0])
+    vectors = np.vstack([final[item_id][1] for item_id in upsert_ids]) if upsert_ids else None
+    apply_changes(index, upsert_ids, vectors, delete_ids)
+    return index
+
+
+def _try_lock(path: str):
+    """非阻塞地取得 path 上的排他 flock，返回持有锁的文件对象；已被别的进程（或本进程另一个文件对象）持有返回 None"""
+    f = open(path, "a+b")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def _unlock(f):
+    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    f.close()
+
+
+class ReadWriteLock:
+    """读写锁：查询可以并发读，写入时独占（写者优先，避免写入饿死）"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class MutableIndex:
+    """
+    由单个写线程拥有的内存 ID 索引：修改先追加写日志，再分组提交到索引，定期落盘快照。
+    同一份索引只能有一个写入进程（<日志>.lock 上的排他 flock）。其他进程（重建索引、批量导入的命令行、
+    多 worker 部署的其余进程）只读快照 + 日志，写入交给持有锁的进程：
+    重建结果写成 <索引>.rebuilt，单条写入写进 <日志>.inbox/，持有锁的进程在下一次提交前接收
+    """
+
+    def __init__(self, name: str, index_path: str, legacy_ids_path: str, log_path: str,
+                 commit_batch_size: int, commit_max_wait_ms: float,
+                 snapshot_every: int, snapshot_interval: float,
+                 check_interval: float = INDEX_RELOAD_CHECK_INTERVAL):
+        self.name = name
+        self.index_path = index_path
+        self.legacy_ids_path = legacy_ids_path
+        self.log_path = log_path
+        self.commit_batch_size = commit_batch_size
+        self.commit_max_wait = commit_max_wait_ms / 1000.0
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.check_interval = check_interval
+
+        # 跨进程协调用的文件
+        self.lock_path = log_path + ".lock"  # 写入进程一直持有
+        self.rebuild_lock_path = index_path + ".rebuild.lock"  # 全量重建期间持有，期间日志不能截断
+        self.rebuilt_path = index_path + ".rebuilt"  # 别的进程重建好、等待写入进程接收的索引
+        self.inbox_dir = log_path + ".inbox"  # 别的进程交来的写入（日志格式，一个请求一个文件）
+
+        self._index = None
+        self._version = 0
+        self._listeners = []
+        self._change_listeners = []
+
+        self._rw_lock = ReadWriteLock()
+        # 日志锁：保证“写日志 + 应用到索引”与“写快照 + 截断日志”互斥
+        self._log_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started = False
+        self._owner = None  # True：本进程是写入进程；False：只读，写入交给写入进程
+        self._owner_lock = None
+        self._index_stamp = None  # 加载的快照文件 (mtime, size)
+        self._log_offset = 0  # 已重放到的日志位置：只读进程之后只读新追加的部分
+        self._last_check = 0.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._log_file = None
+        self._unsnapshotted = 0
+        self._last_snapshot = time.monotonic()
+
+    # ------------------------------------------------------------------ 读取
+
+    def get(self):
+        """返回当前状态 IndexSnapshot；索引为空时返回 None。使用期间需持有 reading()"""
+        self._ensure_started()
+        if not self._owner:
+            self._reload_if_changed()
+        if self._index is None:
+            return None
+        return IndexSnapshot(index=self._index, version=self._version)
+
+    def reading(self):
+        """查询期间持有读锁，保证写线程不会同时修改索引"""
+        return self._rw_lock.read()
+
+    def add_listener(self, callback, reloads_only: bool = False):
+        """
+        注册回调：索引每次变化后调用 callback(snapshot)。
+        reloads_only 为 True 时只在整体换上新索引（加载快照、换上重建结果）后调用，单条写入不调用
+        """
+        self._listeners.append((callback, reloads_only))
+
+    def add_change_listener(self, callback, every_process: bool = False):
+        """
+        注册回调：写入进程每提交一批修改（包括别的进程交来的）后调用 callback(upsert_ids, vectors, delete_ids)，
+        在调用方的写入返回之前执行。只读进程默认不调用；every_process 为 True 时只读进程重放日志
+        或本进程交出写入时也调用（维护本进程内存状态用，例如过滤位图）
+        """
+        self._change_listeners.append((callback, every_process))
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def owner(self) -> bool:
+        """本进程是否是写入进程"""
+        self._ensure_started()
+        return self._owner
+
+    # ------------------------------------------------------------------ 写入
+
+    def upsert(self, item_id: int, vector):
+        """
+        插入或替换 item_id 的向量：写入日志并 fsync、应用到内存索引后返回 True；
+        本进程只读时交给写入进程，返回 False
+        """
+        return self._submit(_OP_UPSERT, item_id, np.asarray(vector, dtype=np.float32).reshape(-1))
+
+    def delete(self, item_id: int):
+        """删除 item_id 的向量"""
+        return self._submit(_OP_DELETE, item_id, None)
+
+    def upsert_many(self, item_ids, vectors):
+        """批量 upsert：整批作为一条请求提交，一次写日志 + fsync、一次应用到索引"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(item_ids), -1)
+        records = [(_OP_UPSERT, int(item_id), vector) for item_id, vector in zip(item_ids, vectors)]
+        return self._submit_records(records)
+
+    @contextmanager
+    def rebuilding(self):
+        """
+        全量重建期间持有重建锁（从读数据库之前到 replace 之后）：写入进程不截断日志，
+        换上重建结果时重放日志，补上重建期间的写入
+        """
+        lock = _try_lock(self.rebuild_lock_path)
+        if lock is None:
+            raise ValueError(f"❌ 另一个进程正在重建{self.name}索引")
+        try:
+            yield
+        finally:
+            _unlock(lock)
+
+    def replace(self, index):
+        """
+        用全量重建的索引替换当前索引（build_resume_index 在 rebuilding() 内调用）：重放日志后落盘快照、清空日志。
+        本进程不是写入进程时写成 .rebuilt 交给写入进程，返回 False
+        """
+        with self._start_lock:
+            if self._owner is None:
+                self._owner = self._acquire_owner()
+            if not self._owner:
+                write_index_file(index, self.rebuilt_path)
+                print(f"⚠️ {self.name}索引正由另一个进程写入，重建结果已交给该进程，下一次提交前换上")
+                return False
+            self._started = True
+            self._open_log()
+        with self._log_lock:
+            # 之前交来、还没接收的重建结果比这次旧，直接丢弃
+            self._swap_in(index, self.rebuilt_path if os.path.exists(self.rebuilt_path) else None)
+        self._ensure_worker()
+        self._notify(reloaded=True)
+        return True
+
+    def close(self):
+        """落盘一次快照（应用关闭时调用）"""
+        if not self._started or not self._owner:
+            return
+        self._snapshot()
+
+    # ------------------------------------------------------------------ 内部实现
+
+    def _submit(self, op, item_id, vector):
+        return self._submit_records([(op, int(item_id), vector)])
+
+    def _submit_records(self, records):
+        """提交一组 (op, id, vector) 记录，等它们写入日志并应用到索引后返回 True；只读进程交给写入进程，返回 False"""
+        if not records:
+            return None
+        self._ensure_started()
+        if not self._owner:
+            self._reload_if_changed(promote_only=True)
+        if not self._owner:
+            self._hand_off(records)
+            # 交出去的写入先在本进程生效（写入进程提交后日志里会再出现一次，重放是幂等的）
+            with self._rw_lock.write():
+                self._index = _apply_records(self._index, records)
+                self._version += 1
+            self._notify_changes(records, replayed=True)
+            self._notify()
+            return False
+        future = Future()
+        self._queue.put((records, future, time.perf_counter()))
+        future.result()
+        return True
+
+    def _acquire_owner(self) -> bool:
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        self._owner_lock = _try_lock(self.lock_path)
+        if self._owner_lock is None:
+            print(f"⚠️ {self.name}索引正由另一个进程写入，本进程只读，写入交给该进程")
+            return False
+        return True
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            if self._owner is None:
+                self._owner = self._acquire_owner()
+            self._load()
+            if self._owner:
+                self._open_log()
+            self._started = True
+        if self._owner:
+            self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name=f"{self.name}-index-writer", daemon=True)
+            self._worker.start()
+
+    def _open_log(self):
+        if self._log_file is None:
+            self._log_file = open(self.log_path, "ab")
+
+    def _read_log(self):
+        """读出日志中的完整记录，返回 (记录, 完整记录的字节数, 文件字节数)"""
+        if not os.path.exists(self.log_path):
+            return [], 0, 0
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        records, valid_bytes = _decode_records(data)
+        return records, valid_bytes, len(data)
+
+    def _load(self):
+        """加载快照，再重放快照之后写入日志的记录；只读进程不动日志（不完整的尾部由写入进程截断）"""
+        started = time.perf_counter()
+        index_stamp = file_stamp(self.index_path)
+        index = load_id_index(self.index_path, self.legacy_ids_path) if os.path.exists(self.index_path) else None
+
+        records, valid_bytes, total_bytes = self._read_log()
+        # 旧版本没有在写日志前检查，跳过维度不对或含 NaN 的记录，不让它们阻止启动
+        dimension = index.d if index is not None else None
+        valid_records = [record for record in records if _check_records([record], dimension) is None]
+        if len(valid_records) < len(records):
+            print(f"⚠️ {self.name}索引日志中有 {len(records) - len(valid_records)} 条无效记录，已跳过")
+
+        # ✅ upsert / delete 都是幂等的：快照已包含的记录再重放一次也不会出错
+        index = _apply_records(index, valid_records)
+        replayed = len(valid_records)
+
+        # 截掉崩溃时写了一半的尾部记录
+        if self._owner and valid_bytes < total_bytes:
+            print(f"⚠️ {self.name}索引日志尾部有不完整记录，已截断 {total_bytes - valid_bytes} 字节")
+            with open(self.log_path, "r+b") as f:
+                f.truncate(valid_bytes)
+
+        with self._rw_lock.write():
+            self._index = index
+            self._version += 1
+        # 读日志期间写入进程换了快照（先写快照再截断日志）时，下一次检查发现快照变化会重新加载
+        self._index_stamp = index_stamp
+        self._log_offset = valid_bytes
+        self._last_check = time.monotonic()
+        self._unsnapshotted = replayed
+        total = index.ntotal if index is not None else 0
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        mode = "" if self._owner else "（只读）"
+        print(f"✅ 已加载{self.name}索引{mode}：{total} 条向量（日志重放 {replayed} 条），耗时 {elapsed_ms:.1f} ms")
+
+    def _reload_if_changed(self, promote_only: bool = False):
+        """
+        只读进程：写入进程退出后接手写入（重新加载并截断不完整的尾部）；否则快照变化时重新加载，
+        只有日志变长时只重放新追加的记录。promote_only 时只检查是否能接手写入（每次写入前调用）。
+        两次检查至少间隔 check_interval 秒
+        """
+        if not promote_only and time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._start_lock:
+            if self._owner:
+                return
+            self._owner_lock = _try_lock(self.lock_path)
+            if self._owner_lock is not None:
+                self._owner = True
+                print(f"✅ {self.name}索引的写入进程已退出，本进程接手写入")
+                self._load()
+                self._open_log()
+                reloaded = True
+            elif promote_only:
+                return
+            else:
+                self._last_check = time.monotonic()
+                reloaded = self._catch_up()
+                if reloaded is None:
+                    return
+        if self._owner:
+            self._ensure_worker()
+        self._notify(reloaded)
+
+    def _catch_up(self):
+        """
+        只读进程跟上写入进程（调用方持有 _start_lock）。索引没有变化返回 None，
+        否则返回是否整体重新加载了快照（只重放新日志时返回 False）
+        """
+        try:
+            with open(self.log_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                f.seek(min(self._log_offset, size))
+                data = f.read()
+        except FileNotFoundError:
+            size, data = 0, b""
+        # 写入进程先写快照再截断日志：读完日志再看快照，日志被截断过快照一定已经变了
+        if size < self._log_offset or file_stamp(self.index_path) != self._index_stamp:
+            self._load()
+            return True
+        records, valid_bytes = _decode_records(data)
+        if not records:
+            return None
+        dimension = self._index.d if self._index is not None else None
+        records = [record for record in records if _check_records([record], dimension) is None]
+        with self._rw_lock.write():
+            self._index = _apply_records(self._index, records)
+            self._version += 1
+        self._log_offset += valid_bytes
+        self._notify_changes(records, replayed=True)
+        return False
+
+    def _apply(self, records):
+        self._index = _apply_records(self._index, records)
+
+    def _swap_in(self, index, consumed=None):
+        """
+        换上重建的索引（调用方持有日志锁）：先重放日志——重建期间日志不会被截断，里面包含重建开始之后的全部写入——
+        再落盘快照、删除 consumed（已接收的 .rebuilt）、截断日志
+        """
+        records, _, _ = self._read_log()
+        index = _apply_records(index, [record for record in records
+                                       if _check_records([record], index.d) is None])
+        with self._rw_lock.write():
+            self._index = index
+            self._version += 1
+        self._write_snapshot(consumed)
+
+    def _snapshot(self, adopt_only: bool = False):
+        """
+        有别的进程重建好的索引时先接收它（加载 .rebuilt 并重放日志）；否则 adopt_only 为 False 时落盘快照、截断日志。
+        有进程正在重建时什么都不做：重建结果要靠日志补上重建期间的写入，日志不能截断
+        """
+        adopted = False
+        with self._log_lock:
+            rebuild_lock = _try_lock(self.rebuild_lock_path)
+            if rebuild_lock is None:
+                if not adopt_only:
+                    self._last_snapshot = time.monotonic()
+                return
+            try:
+                if os.path.exists(self.rebuilt_path):
+                    self._swap_in(load_id_index(self.rebuilt_path), self.rebuilt_path)
+                    adopted = True
+                    print(f"✅ 已换上另一个进程重建的{self.name}索引")
+                elif not adopt_only and self._unsnapshotted:
+                    self._write_snapshot()
+            finally:
+                _unlock(rebuild_lock)
+        if adopted:
+            self._notify(reloaded=True)
+
+    def _hand_off(self, records):
+        """只读进程的写入：写成日志格式的文件放进收件箱，写入进程按文件名（时间）顺序提交"""
+        error = _check_records(records, self._index.d if self._index is not None else None)
+        if error:
+            raise ValueError(error)
+        os.makedirs(self.inbox_dir, exist_ok=True)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex}.wal"
+        tmp_path = os.path.join(self.inbox_dir, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(_encode_records(records))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.inbox_dir, name))
+        fsync_dir(self.inbox_dir)
+
+    def _receive(self):
+        """收件箱中别的进程交来的写入：返回 (批次条目, 文件路径)，提交成功后再删除文件"""
+        try:
+            names = sorted(name for name in os.listdir(self.inbox_dir) if name.endswith(".wal"))
+        except FileNotFoundError:
+            return [], []
+        entries, paths = [], []
+        for name in names:
+            path = os.path.join(self.inbox_dir, name)
+            with open(path, "rb") as f:
+                records, _ = _decode_records(f.read())
+            entries.append((records, None, time.perf_counter()))
+            paths.append(path)
+        return entries, paths
+
+    def _collect_batch(self):
+        """等待第一条写入请求，然后在提交窗口内继续收集，组成一次组提交；每 check_interval 秒醒来检查收件箱"""
+        timeout = self.check_interval
+        if self._unsnapshotted:
+            timeout = min(timeout, max(0.0, self.snapshot_interval - (time.monotonic() - self._last_snapshot)))
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.commit_max_wait
+        while size < self.commit_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+            size += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                # ✅ 先换上别的进程重建的索引，再提交写入
+                if os.path.exists(self.rebuilt_path):
+                    self._snapshot(adopt_only=True)
+                received, paths = self._receive()
+            except Exception as e:
+                print(f"❌ {self.name}索引接收其他进程的写入失败: {str(e)}")
+                received, paths = [], []
+            if batch or received:
+                if self._commit(received + batch):
+                    for path in paths:
+                        os.remove(path)
+            if self._unsnapshotted and (self._unsnapshotted >= self.snapshot_every or
+                                        time.monotonic() - self._last_snapshot >= self.snapshot_interval):
+                try:
+                    self._snapshot()
+                except Exception as e:
+                    print(f"❌ {self.name}索引快照失败: {str(e)}")
+
+    def _commit(self, batch) -> bool:
+        """
+        batch: [(records, future, 提交时间)]，future 为 None 的是收件箱中的写入。
+        返回日志是否写入成功（不合法的条目单独失败，不影响返回值）
+        """
+        started = time.perf_counter()
+        # ✅ 先检查再写日志：不合法的请求单独失败，不会留在日志里让下次启动重放失败
+        dimension = self._index.d if self._index is not None else None
+        accepted = []
+        for entry in batch:
+            error = _check_records(entry[0], dimension)
+            if error:
+                if entry[1] is not None:
+                    entry[1].set_exception(ValueError(error))
+                else:
+                    print(f"❌ {self.name}索引收到无效的写入，已丢弃：{error}")
+                continue
+            accepted.append(entry)
+            if dimension is None:
+                dimension = next((vector.shape[0] for op, _, vector in entry[0] if op == _OP_UPSERT), None)
+        batch = accepted
+        records = [record for entry_records, _, _ in batch for record in entry_records]
+        if not records:
+            return True
+        try:
+            # ✅ 整批记录一次写入、一次 fsync
+            payload = _encode_records(records)
+            with self._log_lock:
+                offset = os.fstat(self._log_file.fileno()).st_size
+                try:
+                    self._log_file.write(payload)
+                    self._log_file.flush()
+                    os.fsync(self._log_file.fileno())
+
+                    with self._rw_lock.write():
+                        self._apply(records)
+                        self._version += 1
+                        self._unsnapshotted += len(records)
+                except Exception:
+                    # 写入或应用失败：日志退回到这批之前的长度
+                    self._log_file.truncate(offset)
+                    self._log_file.flush()
+                    os.fsync(self._log_file.fileno())
+                    raise
+        except Exception as e:
+            for _, future, _ in batch:
+                if future is not None:
+                    future.set_exception(e)
+            print(f"❌ {self.name}索引提交失败: {str(e)}")
+            return False
+
+        observe(f"index_writer.{self.name}.commit_size", len(records))
+        observe(f"index_writer.{self.name}.commit_ms", (time.perf_counter() - started) * 1000)
+        self._notify_changes(records)
+        for _, future, _ in batch:
+            if future is not None:
+                future.set_result(None)
+        self._notify()
+        return True
+
+    def _notify_changes(self, records, replayed: bool = False):
+        """replayed：只读进程重放的日志或交出去的写入，只调用 every_process 的回调"""
+        final = {}
+        for op, item_id, vector in records:
+            final[item_id] = (op, vector)
+        upsert_ids = [item_id for item_id, (op, _) in final.items() if op == _OP_UPSERT]
+        delete_ids = [item_id for item_id, (op, _) in final.items() if op == _OP_DELETE]
+        vectors = np.vstack([final[item_id][1] for item_id in upsert_ids]) if upsert_ids else None
+        for callback, every_process in self._change_listeners:
+            if replayed and not every_process:
+                continue
+            try:
+                callback(upsert_ids, vectors, delete_ids)
+            except Exception as e:
+                print(f"❌ {self.name}索引写入回调失败: {str(e)}")
+
+    def _notify(self, reloaded: bool = False):
+        snapshot = IndexSnapshot(index=self._index, version=self._version)
+        for callback, reloads_only in self._listeners:
+            if reloaded or not reloads_only:
+                callback(snapshot)
+
+    def _write_snapshot(self, consumed=None):
+        """
+        把当前索引写成 .faiss 快照（临时文件和目录 fsync 之后才替换完成），删除已接收的 consumed，
+        最后截断日志（调用方需持有日志锁）
+        """
+        started = time.perf_counter()
+        if self._index is not None:
+            write_index_file(self._index, self.index_path)
+        if consumed:
+            os.remove(consumed)
+            fsync_dir(os.path.dirname(os.path.abspath(consumed)))
+        self._log_file.truncate(0)
+        self._log_file.flush()
+        os.fsync(self._log_file.fileno())
+        self._unsnapshotted = 0
+        self._last_snapshot = time.monotonic()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        total = self._index.ntotal if self._index is not None else 0
+        print(f"✅ {self.name}索引快照已保存：{total} 条向量，耗时 {elapsed_ms:.1f} ms")
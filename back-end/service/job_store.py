@@ -0,0 +1,37 @@
+from database.db_utils import JOBS_DB_PATH, transaction
+from .matching import delete_job_from_index, upsert_job_in_index
+
+# **职位的在线修改：先写 jobs.db，再更新FAISS索引（过滤位图、榜单、重排向量由索引的提交回调更新）**
+# 职位表来自外部导入，id 不一定是主键，所以先 UPDATE，没有这一行再按给定 ID 插入
+
+JOB_COLUMNS = ("job_title", "company_name", "location", "job_description", "job_type", "categories", "industry")
+
+
+def save_job(job_id: int, job_data) -> bool:
+    """
+    按 ID 插入或替换职位（job_data 的键是 JOB_COLUMNS 中的列名，缺少的列存空字符串），
+    返回是否新建了这一行
+    """
+    values = tuple(job_data.get(column) or "" for column in JOB_COLUMNS)
+    with transaction(JOBS_DB_PATH) as cursor:
+        cursor.execute(f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in JOB_COLUMNS)} WHERE id = ?",
+                       values + (job_id,))
+        created = cursor.rowcount == 0
+        if created:
+            cursor.execute(f"INSERT INTO jobs (id, {', '.join(JOB_COLUMNS)}) "
+                           f"VALUES (?, {', '.join('?' * len(JOB_COLUMNS))})", (job_id,) + values)
+    print(f"✅ 职位 ID {job_id} 已{'新建' if created else '更新'}")
+
+    upsert_job_in_index(job_id, values[0], values[3])
+    return created
+
+
+def delete_job(job_id: int) -> bool:
+    """删除职位及其向量，职位不存在返回 False"""
+    with transaction(JOBS_DB_PATH) as cursor:
+        cursor.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        deleted = cursor.rowcount > 0
+    if not deleted:
+        return False
+    delete_job_from_index(job_id)
+    return True
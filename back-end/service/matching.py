@@ -1,314 +1,701 @@
 import os
-import faiss
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-import sqlite3
-from typing import List
 import argparse
 
+from database.db_utils import get_connection
+
+from .config import (
+    EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL, ENCODER_MAX_BATCH_SIZE, ENCODER_MAX_WAIT_MS,
+    INDEX_COMMIT_BATCH_SIZE, INDEX_COMMIT_MAX_WAIT_MS, INDEX_SNAPSHOT_EVERY, INDEX_SNAPSHOT_INTERVAL,
+    JOB_INDEX_STORAGE, JOB_INDEX_TYPE, RERANK_FACTOR, RESULT_CACHE_SIZE, RESULT_CACHE_TTL,
+    RESUME_INDEX_STORAGE, RESUME_INDEX_TYPE,
+    BUILD_CHECKPOINT_DIR, BUILD_CHUNK_SIZE, BUILD_ENCODE_BATCH_SIZE, BUILD_WORKERS,
+    JOB_DUPLICATE_SIMILARITY, SEARCH_MAX_K, SEARCH_OVERFETCH, FILTER_EXACT_SCAN_MAX, FILTER_OVERRIDE_LIMIT,
+    CURSOR_CACHE_SIZE, CURSOR_TTL,
+)
+from .attribute_filters import (
+    AttributeIndex, bitmap_ids, degree_levels, exact_scan, normalize_value, search_parameters, split_values,
+)
+from .dedup import DuplicateGroups, RankedResults, collect_batch, group_duplicates, normalize_key, write_groups
+from .embedding_store import JOB_EMBEDDINGS_TABLE, RESUME_EMBEDDINGS_TABLE, delete_vectors, save_vectors, text_hash
+from .encoder_service import BatchingEncoder
+from .hydration import hydrate_jobs, hydrate_resumes
+from .index_builder import clear_checkpoints, stream_embeddings
+from .index_manager import adopt_legacy_index, build_id_index
+from .index_writer import MutableIndex
+from .materialize import (
+    on_jobs_changed, on_jobs_deleted, on_resumes_changed, on_resumes_deleted, read_top,
+)
+from .model_registry import get_sentence_model, index_namespace, sentence_dimension, sentence_model_id
+from .pagination import CursorStore, MatchSession
+from .query_cache import SingleFlight, TTLCache, cached_call, normalize_terms
+from .reranker import ExactReranker, remove_rerank_vectors, write_rerank_vectors
+
 # **确保 FAISS 和数据库路径正确**
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
-print(f"数据库目录: {BASE_DIR}")
-
-JOB_FAISS_INDEX_PATH = os.path.join(BASE_DIR, "job_embeddings.faiss")
-JOB_IDS_PATH = os.path.join(BASE_DIR, "job_ids.npy")
-RESUME_FAISS_INDEX_PATH = os.path.join(BASE_DIR, "resume_embeddings.faiss")
-RESUME_IDS_PATH = os.path.join(BASE_DIR, "resume_ids.npy")
 RESUMES_DB_PATH = os.path.join(BASE_DIR, "resumes.db")
 JOBS_DB_PATH = os.path.join(BASE_DIR, "jobs.db")
 
-print(f"简历数据库路径: {RESUMES_DB_PATH}")
-print(f"简历FAISS索引路径: {RESUME_FAISS_INDEX_PATH}")
+# **索引按编码器分目录存放（模型 + 维度），换模型不会读到维度不匹配的旧索引**
+# 命名空间可能要加载模型才能确定，旧索引迁移要读文件：都放到第一次使用（或启动预热）时，import 不做重活
+_index_lock = threading.Lock()
+INDEX_NAMESPACE = None
+INDEX_DIR = None
+JOB_FAISS_INDEX_PATH = None
+JOB_IDS_PATH = None  # 旧格式索引的行号 -> ID，仅用于迁移
+JOB_INDEX_LOG_PATH = None
+RESUME_FAISS_INDEX_PATH = None
+RESUME_IDS_PATH = None  # 同上
+RESUME_INDEX_LOG_PATH = None
+job_index = None
+resume_index = None
+job_reranker = None
+resume_reranker = None
+job_groups = None
+
+# **在线请求统一经过微批编码器：并发的单条查询合并成一次 encode（模型在第一次编码时才加载）**
+encoder = BatchingEncoder(
+    lambda texts: get_sentence_model().encode(texts, convert_to_numpy=True, batch_size=ENCODER_MAX_BATCH_SIZE),
+    max_batch_size=ENCODER_MAX_BATCH_SIZE,
+    max_wait_ms=ENCODER_MAX_WAIT_MS,
+)
 
-# **加载 Sentence-BERT 模型**
-print("正在加载 Sentence-BERT 模型...")
-model = SentenceTransformer("all-mpnet-base-v2")
-print("模型加载完成")
+# **属性过滤位图（第一次带过滤条件的查询时从数据库构建）：职位按地点、类型、行业、类别，简历按学历、技能**
+job_attributes = AttributeIndex(
+    "职位", JOBS_DB_PATH, "SELECT id, location, job_type, categories, industry FROM jobs",
+    lambda row: {"location": split_values(row[1]), "job_type": split_values(row[2]),
+                 "category": split_values(row[3]), "industry": split_values(row[4])},
+    ("location", "job_type", "category", "industry"), FILTER_OVERRIDE_LIMIT,
+)
+resume_attributes = AttributeIndex(
+    "简历", RESUMES_DB_PATH, "SELECT id, education, skills FROM resumes",
+    lambda row: {"degree": degree_levels(row[1]),
+                 "skill": [normalize_value(skill) for skill in (row[2] or "").split("; ") if skill.strip()]},
+    ("degree", "skill"), FILTER_OVERRIDE_LIMIT,
+)
 
-def match_jobs_with_faiss(resume_text, top_k=5):
-    """使用 FAISS 进行职位匹配（从jobs.db中匹配职位）"""
-    if not os.path.exists(JOB_FAISS_INDEX_PATH) or not os.path.exists(JOB_IDS_PATH):
-        raise ValueError("❌ 职位FAISS索引未找到，请先运行 `embedding.py` 生成索引")
+# **两级查询缓存：规范化技能集合 -> 向量；(查询, top_k, 索引版本) -> 匹配结果**
+embedding_cache = TTLCache("embedding", EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL)
+result_cache = TTLCache("result", RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+_embedding_flight = SingleFlight()
+_result_flight = SingleFlight()
 
-    # 加载 FAISS 索引
-    index = faiss.read_index(JOB_FAISS_INDEX_PATH)
-    job_ids = np.load(JOB_IDS_PATH)
+# **分页游标：服务端保存查询向量（在搜索函数里）和去重后的排名，翻页不再编码**
+cursors = CursorStore(CURSOR_CACHE_SIZE, CURSOR_TTL)
 
-    # 计算简历嵌入
-    resume_text = " ".join(resume_text) if isinstance(resume_text, list) else resume_text
-    resume_embedding = model.encode(resume_text, convert_to_numpy=True)
-    resume_embedding = resume_embedding.reshape(1, -1)
 
-    # 查询 FAISS，获取更多结果以防去重后数量不足
-    k = min(top_k * 2, len(job_ids))  # 获取2倍的结果，以便去重后仍有足够的数据
-    similarities, indices = index.search(resume_embedding, k)
+def _ensure_indexes():
+    """第一次使用时确定索引命名空间、迁移旧索引，并创建常驻索引、重排向量和重复分组"""
+    global INDEX_NAMESPACE, INDEX_DIR, JOB_FAISS_INDEX_PATH, JOB_IDS_PATH, JOB_INDEX_LOG_PATH, RESUME_FAISS_INDEX_PATH, \
+        RESUME_IDS_PATH, RESUME_INDEX_LOG_PATH, job_index, resume_index, job_reranker, resume_reranker, job_groups
+    if resume_index is not None:
+        return
+    with _index_lock:
+        if resume_index is not None:
+            return
+        namespace = index_namespace()
+        index_dir = os.path.join(BASE_DIR, "indexes", namespace)
+        os.makedirs(index_dir, exist_ok=True)
+        for index_file, extra_files in (
+            ("job_embeddings.faiss", ("job_ids.npy", "job_embeddings.wal", "job_embeddings.rerank_ids.npy",
+                                      "job_embeddings.rerank_vectors.npy", "job_embeddings.groups.npz")),
+            ("resume_embeddings.faiss", ("resume_ids.npy", "resume_embeddings.wal",
+                                         "resume_embeddings.rerank_ids.npy", "resume_embeddings.rerank_vectors.npy")),
+        ):
+            adopt_legacy_index(BASE_DIR, index_dir, index_file, extra_files, sentence_dimension())
 
-    # 解析 FAISS 结果
-    matched_jobs = []
-    seen_titles = set()  # 用于记录已经见过的职位标题
+        INDEX_NAMESPACE = namespace
+        INDEX_DIR = index_dir
+        JOB_FAISS_INDEX_PATH = os.path.join(index_dir, "job_embeddings.faiss")
+        JOB_IDS_PATH = os.path.join(index_dir, "job_ids.npy")
+        JOB_INDEX_LOG_PATH = os.path.join(index_dir, "job_embeddings.wal")
+        RESUME_FAISS_INDEX_PATH = os.path.join(index_dir, "resume_embeddings.faiss")
+        RESUME_IDS_PATH = os.path.join(index_dir, "resume_ids.npy")
+        RESUME_INDEX_LOG_PATH = os.path.join(index_dir, "resume_embeddings.wal")
 
-    for i, sim in zip(indices[0], similarities[0]):
-        job_id = int(job_ids[i])
-        job = get_job_details(job_id)
+        # **常驻内存的 FAISS 索引（以数据库 ID 为键），都由一个进程的写线程独占：写日志 + 组提交，定期保存快照**
+        jobs = _open_index("职位", JOB_FAISS_INDEX_PATH, JOB_IDS_PATH, JOB_INDEX_LOG_PATH)
+        resumes = _open_index("简历", RESUME_FAISS_INDEX_PATH, RESUME_IDS_PATH, RESUME_INDEX_LOG_PATH)
 
-        if job:
-            # 创建标题的规范形式（去除空格、转小写）用于比较
-            normalized_title = job["title"].lower().strip()
-            
-            # 如果这个标题还没见过，添加到结果中
-            if normalized_title not in seen_titles:
-                seen_titles.add(normalized_title)
-                matched_jobs.append({
-                    "id": job_id,
-                    "title": job["title"],
-                    "company": job["company"],
-                    "location": job["location"],
-                    "description": job["description"],
-                    "similarity": float(sim)
-                })
-                
-                # 如果已经收集到足够的不重复职位，就停止
-                if len(matched_jobs) >= top_k:
-                    break
-
-    return matched_jobs
+        # **压缩存储（fp16 / sq8 / pq）时用磁盘上的原始向量精确重排候选**
+        job_reranker = ExactReranker(JOB_FAISS_INDEX_PATH)
+        resume_reranker = ExactReranker(RESUME_FAISS_INDEX_PATH)
+        job_reranker.reload_if_changed()
+        resume_reranker.reload_if_changed()
+        jobs.add_listener(lambda snapshot: job_reranker.reload_if_changed(), reloads_only=True)
+        # **重复职位分组（建索引时生成）：查询时每组只保留分数最高的一个**
+        job_groups = DuplicateGroups(JOB_FAISS_INDEX_PATH)
+        job_groups.reload_if_changed()
+        jobs.add_listener(lambda snapshot: job_groups.reload_if_changed(), reloads_only=True)
+        resumes.add_listener(lambda snapshot: resume_reranker.reload_if_changed(), reloads_only=True)
+
+        # 整体换上新索引（重建、只读进程重新加载快照）时职位库可能整体变化，下一次带过滤条件的查询时重新扫描；
+        # 单条 upsert / delete 在每个进程里更新变化的 ID（只读进程在重放日志时）
+        jobs.add_listener(lambda snapshot: job_attributes.invalidate(), reloads_only=True)
+        jobs.add_change_listener(_refresh_attributes(job_attributes), every_process=True)
+        jobs.add_change_listener(_on_jobs_committed)
+        resumes.add_change_listener(_refresh_attributes(resume_attributes), every_process=True)
+        resumes.add_change_listener(_on_resumes_committed)
+        # 结果缓存的 key 带索引版本，索引变化后旧条目不会再命中，由 TTL / LRU 淘汰，不整体清空
+
+        job_index = jobs
+        resume_index = resumes
+
+
+def _open_index(name, index_path, ids_path, log_path):
+    return MutableIndex(
+        name, index_path, ids_path, log_path,
+        commit_batch_size=INDEX_COMMIT_BATCH_SIZE,
+        commit_max_wait_ms=INDEX_COMMIT_MAX_WAIT_MS,
+        snapshot_every=INDEX_SNAPSHOT_EVERY,
+        snapshot_interval=INDEX_SNAPSHOT_INTERVAL,
+    )
+
+def _refresh_attributes(attributes):
+    """索引变化的 ID 重新从数据库读属性（每个进程各自维护过滤位图）"""
+    def refresh(upsert_ids, vectors, delete_ids):
+        if upsert_ids:
+            attributes.refresh_ids(upsert_ids)
+        if delete_ids:
+            attributes.remove_ids(delete_ids)
+    return refresh
+
+def _on_resumes_committed(upsert_ids, vectors, delete_ids):
+    """简历索引每提交一批（包括其他进程交来的写入）后更新预计算榜单和重排向量，只在写入进程执行"""
+    if upsert_ids:
+        on_resumes_changed(upsert_ids, vectors)
+        if resume_reranker.available:
+            resume_reranker.update_many(upsert_ids, vectors)
+    if delete_ids:
+        on_resumes_deleted(delete_ids)
+
+def _on_jobs_committed(upsert_ids, vectors, delete_ids):
+    """职位索引每提交一批后更新预计算榜单和重排向量，只在写入进程执行"""
+    if upsert_ids:
+        on_jobs_changed(upsert_ids, vectors)
+        if job_reranker.available:
+            job_reranker.update_many(upsert_ids, vectors)
+    if delete_ids:
+        on_jobs_deleted(delete_ids)
+
+
+def _query_key(terms, extra: str = ""):
+    """查询向量的缓存 key 和实际编码的文本"""
+    key = (normalize_terms(terms), " ".join((extra or "").lower().split()))
+    return key, " ".join(key[0] + ((key[1],) if key[1] else ()))
+
+def encode_query(terms, extra: str = ""):
+    """计算查询向量（1 x d），相同技能集合只编码一次"""
+    key, text = _query_key(terms, extra)
+
+    def compute():
+        embedding = encoder.encode(text).reshape(1, -1)
+        embedding.setflags(write=False)  # 缓存中的向量是共享的，禁止修改
+        return embedding
+
+    return cached_call(embedding_cache, _embedding_flight, key, compute)
+
+def encode_queries(queries):
+    """批量计算查询向量（nq x d）：缓存命中的直接使用，其余合并成一次 encode 调用"""
+    keyed = [_query_key(terms, extra) for terms, extra in queries]
+    cached = [embedding_cache.get(key) for key, _ in keyed]
+    missing = {key: text for (key, text), embedding in zip(keyed, cached) if embedding is None}
+    if missing:
+        encoded = get_sentence_model().encode(list(missing.values()), batch_size=BUILD_ENCODE_BATCH_SIZE,
+                                              convert_to_numpy=True)
+        for key, embedding in zip(missing, encoded):
+            embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+            embedding.setflags(write=False)
+            embedding_cache.set(key, embedding)
+            missing[key] = embedding
+    return np.vstack([embedding if embedding is not None else missing[key]
+                      for (key, _), embedding in zip(keyed, cached)]).astype(np.float32)
+
+def search_index(index, reranker, query, k, params=None):
+    """
+    搜索前 k 个结果（query 可以是 nq x d 的多条查询，一次 search 走 FAISS 的批量路径）；
+    有重排向量时先多取 RERANK_FACTOR 倍候选，再按原始向量逐条精确重排，不足 k 个的位置 ID 为 -1
+    """
+    if query.shape[1] != index.d:
+        raise ValueError(f"❌ 查询向量维度 {query.shape[1]} 与索引维度 {index.d} 不一致，"
+                         f"请用当前编码器（{INDEX_NAMESPACE}）重新构建索引")
+    if RERANK_FACTOR > 0 and reranker.available:
+        fetch = min(k * RERANK_FACTOR, index.ntotal)
+        approx_scores, approx_ids = index.search(query, fetch, params=params)
+        scores = np.full((len(query), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(query), k), -1, dtype=np.int64)
+        for row in range(len(query)):
+            row_scores, row_ids = reranker.rerank(query[row], approx_ids[row], approx_scores[row], k)
+            scores[row, :len(row_ids)] = row_scores
+            ids[row, :len(row_ids)] = row_ids
+        return scores, ids
+    return index.search(query, k, params=params)
+
+def filtered_search(index, reranker, attributes, filters, query):
+    """
+    返回 (search(k, rows=None), 可搜索的数量)。有过滤条件时：命中很少直接精确扫描这些 ID，
+    否则把位图作为 IDSelector 传给 FAISS；没有任何 ID 满足条件时返回 (None, 0)。
+    query 有多行时 rows 指定只搜索其中哪些行
+    """
+    def rows_of(rows):
+        return query if rows is None else query[rows]
+
+    selection = attributes.select(filters)
+    if selection is None:
+        return (lambda k, rows=None: search_index(index, reranker, rows_of(rows), k)), index.ntotal
+
+    bitmap, count = selection
+    if count == 0:
+        return None, 0
+    if count <= FILTER_EXACT_SCAN_MAX:
+        ids = bitmap_ids(bitmap)
+        print(f"过滤后剩 {count} 个ID，改用精确扫描")
+        return (lambda k, rows=None: exact_scan(index, reranker, rows_of(rows), ids, k)), min(count, index.ntotal)
+    params = search_parameters(index, bitmap)
+    return (lambda k, rows=None: search_index(index, reranker, rows_of(rows), k, params)), min(count, index.ntotal)
+
+def _filters_key(filters):
+    return tuple(sorted((attribute, tuple(sorted(normalize_value(value) for value in values)))
+                        for attribute, values in (filters or {}).items() if values))
+
+def match_jobs_with_faiss(resume_text, top_k=5, filters=None):
+    """使用 FAISS 进行职位匹配（从jobs.db中匹配职位）；filters 按地点、类型、行业、类别预过滤"""
+    return match_jobs_page(resume_text, top_k, filters)[0]
+
+def _cached_first_page(key, compute):
+    """
+    不带游标的第一页走结果缓存（相同查询 + top_k + 索引版本）：缓存 (结果, 下一页游标)。
+    游标对应的会话已过期时重新计算，不把用不了的游标返回给客户端
+    """
+    page = cached_call(result_cache, _result_flight, key, compute)
+    if page[1] is not None and not cursors.alive(page[1]):
+        page = compute()
+        result_cache.set(key, page)
+    return page
+
+def _job_session(resume_text, filters):
+    """相同查询共用一个分页会话：查询向量只在新建会话时编码一次"""
+    snapshot = job_index.get()
+    if snapshot is None:
+        raise ValueError(f"❌ 职位FAISS索引未找到（{INDEX_NAMESPACE}），请先运行 `python -m service.matching` 生成索引")
+
+    def create():
+        # 计算简历嵌入
+        resume_embedding = encode_query(resume_text)
+
+        def make_search():
+            # 向深处搜索时用当前的常驻索引
+            index = job_index.get().index
+            run_search, searchable = filtered_search(index, job_reranker, job_attributes, filters, resume_embedding)
+            if run_search is None:
+                return None, 0
+
+            def search(k):
+                # 搜索期间持有读锁，写线程不会同时修改索引
+                with job_index.reading():
+                    return run_search(k)
+
+            return search, searchable
+
+        # 先按重复组对 ID 去重，只补全需要返回的职位；不够时继续向深处搜索
+        return MatchSession("jobs", RankedResults(make_search, SEARCH_OVERFETCH, SEARCH_MAX_K,
+                                                  group_of=job_groups.group_of))
+
+    key = ("jobs", normalize_terms(resume_text), _filters_key(filters), snapshot.version)
+    return cursors.open(key, create)
+
+def match_jobs_page(resume_text, top_k=5, filters=None, cursor=None):
+    """
+    分页匹配职位，返回 (职位列表, 下一页游标)；没有更多结果时游标为 None。
+    带游标时从服务端保存的排名继续（resume_text / filters 被忽略），不再编码查询
+    """
+    _ensure_indexes()
+    if cursor:
+        session, position = cursors.resume(cursor, "jobs")
+        return _jobs_page(session, position, top_k)
+
+    snapshot = job_index.get()
+    if snapshot is None:
+        raise ValueError(f"❌ 职位FAISS索引未找到（{INDEX_NAMESPACE}），请先运行 `python -m service.matching` 生成索引")
+    # 相同技能集合 + top_k + 索引版本 直接返回缓存的第一页
+    key = ("jobs", normalize_terms(resume_text), _filters_key(filters), top_k, snapshot.version)
+    return _cached_first_page(key, lambda: _jobs_page(_job_session(resume_text, filters), 0, top_k))
+
+def _jobs_page(session, position, top_k):
+    hits, position, more = session.results.page(position, top_k, hydrate_jobs)
+    matched_jobs = [_job_result(job_id, sim, job) for job_id, sim, job in hits]
+    return matched_jobs, cursors.cursor(session, position) if more else None
+
+def _job_result(job_id, sim, job):
+    return {
+        "id": job_id,
+        "title": job["title"],
+        "company": job["company"],
+        "location": job["location"],
+        "description": job["description"],
+        "similarity": sim
+    }
+
+def match_jobs_batch(skill_lists, top_k=5, filters=None):
+    """
+    批量匹配职位（每条输入是一份简历的技能）：全部查询一次编码、一次 nq>1 的 FAISS 搜索、一次补全详情。
+    返回与输入顺序一致的职位列表；filters 对所有查询生效
+    """
+    _ensure_indexes()
+    snapshot = job_index.get()
+    if snapshot is None:
+        raise ValueError(f"❌ 职位FAISS索引未找到（{INDEX_NAMESPACE}），请先运行 `python -m service.matching` 生成索引")
+    if not skill_lists:
+        return []
+
+    embeddings = encode_queries([(skills, "") for skills in skill_lists])
+    run_search, searchable = filtered_search(snapshot.index, job_reranker, job_attributes, filters, embeddings)
+    if run_search is None:
+        return [[] for _ in skill_lists]
+
+    def search(k, rows):
+        # 搜索期间持有读锁，写线程不会同时修改索引
+        with job_index.reading():
+            return run_search(k, rows)
+    hits = collect_batch(search, hydrate_jobs, len(skill_lists), top_k, searchable, SEARCH_OVERFETCH, SEARCH_MAX_K,
+                         group_of=job_groups.group_of)
+    return [[_job_result(job_id, sim, job) for job_id, sim, job in row] for row in hits]
 
 def get_job_details(job_id: int):
     """从jobs.db获取职位详情"""
-    conn = sqlite3.connect(JOBS_DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-        SELECT job_title, company_name, location, job_description
-        FROM jobs
-        WHERE id = ?
-        """, (job_id,))
-        row = cursor.fetchone()
-        if row:
-            return {
-                "title": row[0],
-                "company": row[1],
-                "location": row[2],
-                "description": row[3],
-            }
-        return None
-    finally:
-        conn.close()
-
-def match_candidates_with_faiss(required_skills: list, education: str, top_k: int = 5):
-    """使用FAISS匹配候选人（从resumes.db中匹配候选人）"""
+    return hydrate_jobs([job_id])[0]
+
+def match_candidates_with_faiss(required_skills: list, education: str, top_k: int = 5, filters=None):
+    """使用FAISS匹配候选人（从resumes.db中匹配候选人）；filters 按学历、技能预过滤"""
+    _ensure_indexes()
     try:
         print(f"开始匹配候选人，技能要求：{required_skills}，教育要求：{education}")
         
-        # 将职位要求转换为向量
-        job_text = f"{' '.join(required_skills)} {education}"
-        print(f"职位要求文本：{job_text}")
-        
-        job_embedding = model.encode(job_text, convert_to_numpy=True)
-        job_embedding = job_embedding.reshape(1, -1)
-        
-        # 加载FAISS索引
-        if not os.path.exists(RESUME_FAISS_INDEX_PATH) or not os.path.exists(RESUME_IDS_PATH):
+        # 使用常驻FAISS索引
+        snapshot = resume_index.get()
+        if snapshot is None:
             print("❌ 简历FAISS索引未找到，请先运行embedding.py生成索引")
             return []
-            
-        index = faiss.read_index(RESUME_FAISS_INDEX_PATH)
-        resume_ids = np.load(RESUME_IDS_PATH)
-        print(f"已加载FAISS索引，包含 {len(resume_ids)} 份简历")
-        
-        # 执行相似度搜索
-        k = min(top_k * 5, len(resume_ids))
-        similarities, indices = index.search(job_embedding, k)
-        print(f"FAISS搜索完成，获取到 {k} 个结果")
-        
-        # 获取匹配的候选人详细信息
-        matched_candidates = []
-        seen_candidates = set()
-        
-        # 处理搜索结果
-        for i, sim in zip(indices[0], similarities[0]):
-            print(f"处理候选人 {i}，相似度：{sim}")
-            resume_id = int(resume_ids[i])
-            
-            # 如果这个候选人还没见过
-            if resume_id not in seen_candidates:
-                candidate = get_resume_details(resume_id)
-                if candidate:
-                    seen_candidates.add(resume_id)
-                    matched_candidates.append({
-                        "id": resume_id,
-                        "name": candidate["name"],
-                        "education": candidate["education"],
-                        "skills": candidate["skills"].split("; "),
-                        "similarity": float(sim)
-                    })
-                    print(f"✅ 添加候选人：{candidate['name']}，技能：{candidate['skills']}")
-                    
-                    if len(matched_candidates) >= top_k:
-                        break
-        
-        print(f"匹配完成，找到 {len(matched_candidates)} 个候选人")
-        return matched_candidates
+
+        return match_candidates_page(required_skills, education, top_k, filters)[0]
         
     except Exception as e:
         print(f"❌ 候选人匹配失败: {str(e)}")
         return []
 
+def _candidate_session(required_skills, education, filters):
+    snapshot = resume_index.get()
+    if snapshot is None:
+        raise ValueError("❌ 简历FAISS索引未找到，请先运行 `python -m service.matching` 生成索引")
+
+    def create():
+        # 将职位要求转换为向量
+        job_embedding = encode_query(required_skills, education)
+
+        def make_search():
+            index = resume_index.get().index
+            print(f"使用FAISS索引 v{resume_index.version}，包含 {index.ntotal} 份简历")
+            run_search, searchable = filtered_search(index, resume_reranker, resume_attributes, filters, job_embedding)
+            if run_search is None:
+                print("没有满足过滤条件的简历")
+                return None, 0
+
+            def search(k):
+                # 搜索期间持有读锁，写线程不会同时往索引里加向量
+                with resume_index.reading():
+                    similarities, resume_ids = run_search(k)
+                print(f"FAISS搜索完成，获取到 {k} 个结果")
+                return similarities, resume_ids
+
+            return search, searchable
+
+        # 索引以简历ID为键，每个候选人只有一个向量；库里已删除的简历跳过
+        return MatchSession("candidates", RankedResults(make_search, SEARCH_OVERFETCH, SEARCH_MAX_K))
+
+    key = ("candidates", normalize_terms(required_skills), " ".join(education.lower().split()),
+           _filters_key(filters), snapshot.version)
+    return cursors.open(key, create)
+
+def match_candidates_page(required_skills: list, education: str, top_k: int = 5, filters=None, cursor=None):
+    """分页匹配候选人，返回 (候选人列表, 下一页游标)；带游标时不再编码查询"""
+    _ensure_indexes()
+    if cursor:
+        session, position = cursors.resume(cursor, "candidates")
+        return _candidates_page(session, position, top_k)
+
+    snapshot = resume_index.get()
+    if snapshot is None:
+        raise ValueError("❌ 简历FAISS索引未找到，请先运行 `python -m service.matching` 生成索引")
+    key = ("candidates", normalize_terms(required_skills), " ".join(education.lower().split()),
+           _filters_key(filters), top_k, snapshot.version)
+    return _cached_first_page(
+        key, lambda: _candidates_page(_candidate_session(required_skills, education, filters), 0, top_k)
+    )
+
+def _candidates_page(session, position, top_k):
+    hits, position, more = session.results.page(position, top_k, hydrate_resumes)
+
+    matched_candidates = []
+    for resume_id, sim, candidate in hits:
+        matched_candidates.append(_candidate_result(resume_id, sim, candidate))
+        print(f"✅ 添加候选人：{candidate['name']}，相似度：{sim}")
+    
+    print(f"匹配完成，找到 {len(matched_candidates)} 个候选人")
+    return matched_candidates, cursors.cursor(session, position) if more else None
+
+def _candidate_result(resume_id, sim, candidate):
+    return {
+        "id": resume_id,
+        "name": candidate["name"],
+        "education": candidate["education"],
+        "skills": candidate["skills"].split("; "),
+        "similarity": sim
+    }
+
+def match_candidates_batch(requirements, top_k: int = 5, filters=None):
+    """
+    批量匹配候选人（每条输入是 (技能要求, 教育要求)）：一次编码、一次 nq>1 的 FAISS 搜索、一次补全详情。
+    返回与输入顺序一致的候选人列表；filters 对所有查询生效
+    """
+    _ensure_indexes()
+    snapshot = resume_index.get()
+    if snapshot is None:
+        raise ValueError("❌ 简历FAISS索引未找到，请先运行 `python -m service.matching` 生成索引")
+    if not requirements:
+        return []
+
+    embeddings = encode_queries(requirements)
+    run_search, searchable = filtered_search(snapshot.index, resume_reranker, resume_attributes, filters, embeddings)
+    if run_search is None:
+        return [[] for _ in requirements]
+
+    def search(k, rows):
+        # 搜索期间持有读锁，写线程不会同时往索引里加向量
+        with resume_index.reading():
+            return run_search(k, rows)
+
+    hits = collect_batch(search, hydrate_resumes, len(requirements), top_k, searchable,
+                         SEARCH_OVERFETCH, SEARCH_MAX_K)
+    print(f"批量匹配完成：{len(requirements)} 个职位要求")
+    return [[_candidate_result(resume_id, sim, candidate) for resume_id, sim, candidate in row] for row in hits]
+
 def get_resume_details(resume_id: int):
     """从resumes.db获取简历详情"""
-    conn = sqlite3.connect(RESUMES_DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-        SELECT name, email, phone, education, skills
-        FROM resumes
-        WHERE id = ?
-        """, (resume_id,))
-        row = cursor.fetchone()
-        if row:
-            return {
-                "name": row[0],
-                "email": row[1],
-                "phone": row[2],
-                "education": row[3],
-                "skills": row[4]
-            }
-        return None
-    finally:
-        conn.close()
-
-def build_job_index():
-    """构建职位的FAISS索引"""
-    conn = sqlite3.connect(JOBS_DB_PATH)
-    cursor = conn.cursor()
-    try:
-        # 获取所有职位数据
-        cursor.execute("SELECT id, job_title, job_description FROM jobs")
-        jobs = cursor.fetchall()
-        
-        if not jobs:
-            print("❌ 没有找到职位数据")
-            return
-            
-        # 准备文本数据
-        texts = []
-        job_ids = []
-        for job_id, title, description in jobs:
-            text = f"{title} {description}"
-            texts.append(text)
-            job_ids.append(job_id)
-            
-        # 计算嵌入向量
-        embeddings = model.encode(texts, convert_to_numpy=True)
-        
-        # 创建FAISS索引
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(embeddings)
-        
-        # 保存索引和ID
-        faiss.write_index(index, JOB_FAISS_INDEX_PATH)
-        np.save(JOB_IDS_PATH, job_ids)
-        print(f"✅ 已为{len(jobs)}个职位创建FAISS索引")
-        
-    finally:
-        conn.close()
+    return hydrate_resumes([resume_id])[0]
+
+def load_indexes():
+    """启动时加载职位和简历索引（预热用）"""
+    _ensure_indexes()
+    job_index.get()
+    resume_index.get()
+
+def close_indexes():
+    """应用关闭时把职位和简历索引落盘"""
+    if resume_index is None:
+        return
+    job_index.close()
+    resume_index.close()
+
+def _save_rerank_vectors(index_path, storage, ids, embeddings):
+    """压缩存储需要原始向量做精确重排；fp32 存储本身就是精确的"""
+    if storage == "fp32":
+        remove_rerank_vectors(index_path)
+    else:
+        write_rerank_vectors(index_path, ids, embeddings)
+
+def build_job_index(chunk_size: int = BUILD_CHUNK_SIZE, workers: int = BUILD_WORKERS, resume: bool = True):
+    """构建职位的FAISS索引（分块流式读取、多进程编码、可断点续建）"""
+    _ensure_indexes()
+    # 重建期间持有重建锁：写入进程不截断日志，换上新索引时用日志补上重建期间的写入
+    with job_index.rebuilding():
+        _build_job_index(chunk_size, workers, resume)
+
+def _build_job_index(chunk_size: int, workers: int, resume: bool):
+    checkpoint_dir = os.path.join(BUILD_CHECKPOINT_DIR, "jobs")
+    job_ids, embeddings = stream_embeddings(
+        get_sentence_model(), sentence_model_id(), JOBS_DB_PATH,
+        "SELECT id, job_title, job_description FROM jobs WHERE id > ? ORDER BY id",
+        lambda row: f"{row[1]} {row[2]}",
+        checkpoint_dir, chunk_size, workers, BUILD_ENCODE_BATCH_SIZE, resume,
+        store_table=JOB_EMBEDDINGS_TABLE,
+    )
+    if not len(job_ids):
+        print("❌ 没有找到职位数据")
+        return
+
+    # 创建以职位ID为键的FAISS索引（类型和存储格式由 JOB_INDEX_TYPE / JOB_INDEX_STORAGE 决定）
+    index = build_id_index(embeddings, job_ids, JOB_INDEX_TYPE, JOB_INDEX_STORAGE)
 
-def build_resume_index():
-    """构建简历的FAISS索引"""
+    # 标题 + 公司相同且向量几乎一致的职位（转发、重复抓取）归为一组
+    keys = ((job_id, normalize_key(title, company)) for job_id, title, company in
+            get_connection(JOBS_DB_PATH).execute("SELECT id, job_title, company_name FROM jobs"))
+    members, groups = group_duplicates(job_ids, keys, embeddings, JOB_DUPLICATE_SIMILARITY)
+
+    # 保存索引（压缩存储时同时保存重排用的原始向量），成功后再删除检查点
+    _save_rerank_vectors(JOB_FAISS_INDEX_PATH, JOB_INDEX_STORAGE, job_ids, embeddings)
+    write_groups(JOB_FAISS_INDEX_PATH, members, groups)
+    job_index.replace(index)
+    clear_checkpoints(checkpoint_dir)
+    print(f"✅ 已为{len(job_ids)}个职位创建 {JOB_INDEX_TYPE}/{JOB_INDEX_STORAGE} FAISS索引，"
+          f"{len(members)} 个职位归入 {len(set(groups.tolist()))} 个重复组")
+
+def replace_job_index(index):
+    """换上在别处构建好的 fp32 职位索引（不需要重排向量）：重建锁内替换，写入进程在别的进程时交给它"""
+    _ensure_indexes()
+    with job_index.rebuilding():
+        remove_rerank_vectors(JOB_FAISS_INDEX_PATH)
+        job_index.replace(index)
+
+def build_resume_index(chunk_size: int = BUILD_CHUNK_SIZE, workers: int = BUILD_WORKERS, resume: bool = True):
+    """构建简历的FAISS索引（分块流式读取、多进程编码、可断点续建）"""
+    _ensure_indexes()
     print("开始构建简历索引...")
-    conn = sqlite3.connect(RESUMES_DB_PATH)
-    cursor = conn.cursor()
+    # 简历需要原地替换，不能用 HNSW
+    if RESUME_INDEX_TYPE == "hnsw":
+        raise ValueError("❌ 简历索引需要支持替换和删除，RESUME_INDEX_TYPE 只能是 flat 或 ivf")
+
+    # 重建期间持有重建锁：写入进程不截断日志，换上新索引时用日志补上重建期间的写入
+    with resume_index.rebuilding():
+        _build_resume_index(chunk_size, workers, resume)
+
+def _build_resume_index(chunk_size: int, workers: int, resume: bool):
+    checkpoint_dir = os.path.join(BUILD_CHECKPOINT_DIR, "resumes")
+    resume_ids, embeddings = stream_embeddings(
+        get_sentence_model(), sentence_model_id(), RESUMES_DB_PATH,
+        "SELECT id, education, skills FROM resumes WHERE id > ? ORDER BY id",
+        lambda row: f"{row[1]} {row[2]}",
+        checkpoint_dir, chunk_size, workers, BUILD_ENCODE_BATCH_SIZE, resume,
+        store_table=RESUME_EMBEDDINGS_TABLE,
+    )
+    if not len(resume_ids):
+        print("❌ 没有找到简历数据")
+        return
+    print(f"嵌入向量维度: {embeddings.shape}")
+
+    # 创建以简历ID为键的FAISS索引
+    index = build_id_index(embeddings, resume_ids, RESUME_INDEX_TYPE, RESUME_INDEX_STORAGE)
+
+    # 保存索引
+    print("正在保存索引...")
+    _save_rerank_vectors(RESUME_FAISS_INDEX_PATH, RESUME_INDEX_STORAGE, resume_ids, embeddings)
+    resume_index.replace(index)
+    clear_checkpoints(checkpoint_dir)
+    print(f"✅ 已为{len(resume_ids)}份简历创建FAISS索引")
+
+def top_candidates_for_job(job_id: int, top_k: int = 5):
+    """读预计算的候选人榜单（python -m service.materialize 全量刷新，之后增量更新）：一次查询 + 一次补全详情"""
+    rows = read_top("job_top_candidates", job_id, top_k)
+    details = hydrate_resumes([resume_id for resume_id, _ in rows])
+    return [_candidate_result(resume_id, score, candidate)
+            for (resume_id, score), candidate in zip(rows, details) if candidate]
+
+def top_jobs_for_resume(resume_id: int, top_k: int = 5):
+    """读预计算的职位榜单"""
+    rows = read_top("resume_top_jobs", resume_id, top_k)
+    details = hydrate_jobs([job_id for job_id, _ in rows])
+    return [_job_result(job_id, score, job) for (job_id, score), job in zip(rows, details) if job]
+
+def _store_vectors(db_path, table, ids, texts, embeddings):
+    """在线写入的向量同时存入向量表，文本哈希与构建时的文本拼接方式一致"""
+    save_vectors(db_path, table, sentence_model_id(), ids, [text_hash(text) for text in texts], embeddings)
+
+def resume_in_index(resume_id: int) -> bool:
+    """简历向量是否已在索引中（用 reconstruct 判断，IDMap2 和带哈希直接映射的 IVF 都支持）"""
+    _ensure_indexes()
+    snapshot = resume_index.get()
+    if snapshot is None:
+        return False
+    with resume_index.reading():
+        try:
+            snapshot.index.reconstruct(int(resume_id))
+            return True
+        except RuntimeError:
+            return False
+
+def upsert_resume_in_index(resume_id: int, education: str, skills: str, changed: bool = True):
+    """插入或替换简历在FAISS索引中的向量（同一候选人重新上传时原地替换）"""
+    _ensure_indexes()
     try:
-        # 获取所有简历数据
-        cursor.execute("SELECT id, education, skills FROM resumes")
-        resumes = cursor.fetchall()
-        
-        if not resumes:
-            print("❌ 没有找到简历数据")
+        # 文本没有变化且索引中已有向量：直接复用，不再编码
+        if not changed and resume_in_index(resume_id):
+            print(f"✅ 简历 ID {resume_id} 内容未变，复用已有向量")
             return
-            
-        print(f"找到 {len(resumes)} 份简历")
-            
-        # 准备文本数据
-        texts = []
-        resume_ids = []
-        for resume_id, education, skills in resumes:
-            text = f"{education} {skills}"
-            texts.append(text)
-            resume_ids.append(resume_id)
-            
-        print("正在计算嵌入向量...")
-        # 计算嵌入向量
-        embeddings = model.encode(texts, convert_to_numpy=True)
-        print(f"嵌入向量维度: {embeddings.shape}")
-        
-        # 创建FAISS索引
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dimension)
-        index.add(embeddings)
-        
-        # 保存索引和ID
-        print("正在保存索引...")
-        faiss.write_index(index, RESUME_FAISS_INDEX_PATH)
-        np.save(RESUME_IDS_PATH, resume_ids)
-        print(f"✅ 已为{len(resumes)}份简历创建FAISS索引")
-        
-    finally:
-        conn.close()
 
-def add_resume_to_index(resume_id: int, education: str, skills: str):
-    """将单个简历添加到现有的FAISS索引中"""
-    try:
         # 准备文本数据
         text = f"{education} {skills}"
         
-        # 计算嵌入向量
-        embedding = model.encode(text, convert_to_numpy=True)
-        embedding = embedding.reshape(1, -1)
+        # 计算嵌入向量，同时存入向量表（下次重建索引时不再编码）
+        embedding = encoder.encode(text)
+        _store_vectors(RESUMES_DB_PATH, RESUME_EMBEDDINGS_TABLE, [resume_id], [text], embedding.reshape(1, -1))
         
-        # 加载现有索引和ID
-        if os.path.exists(RESUME_FAISS_INDEX_PATH) and os.path.exists(RESUME_IDS_PATH):
-            index = faiss.read_index(RESUME_FAISS_INDEX_PATH)
-            resume_ids = np.load(RESUME_IDS_PATH)
-            
-            # 添加新向量到索引
-            index.add(embedding)
-            
-            # 更新ID列表
-            resume_ids = np.append(resume_ids, resume_id)
-            
-            # 保存更新后的索引和ID
-            faiss.write_index(index, RESUME_FAISS_INDEX_PATH)
-            np.save(RESUME_IDS_PATH, resume_ids)
-            print(f"✅ 已将简历 ID {resume_id} 添加到FAISS索引中")
+        # 交给写线程：写入日志并组提交到内存索引（过滤位图、榜单等由提交回调更新）；
+        # 本进程不是写入进程时交给写入进程
+        if resume_index.upsert(resume_id, embedding):
+            print(f"✅ 已更新简历 ID {resume_id} 的FAISS向量")
         else:
-            # 如果索引不存在，创建新索引
-            dimension = embedding.shape[1]
-            index = faiss.IndexFlatIP(dimension)
-            index.add(embedding)
-            
-            # 保存索引和ID
-            faiss.write_index(index, RESUME_FAISS_INDEX_PATH)
-            np.save(RESUME_IDS_PATH, np.array([resume_id]))
-            print(f"✅ 已为简历 ID {resume_id} 创建新的FAISS索引")
+            print(f"✅ 简历 ID {resume_id} 的FAISS向量已交给索引写入进程")
             
     except Exception as e:
-        print(f"❌ 添加简历到索引失败: {str(e)}")
+        print(f"❌ 更新简历索引失败: {str(e)}")
         raise e
 
+def upsert_resumes_in_index(resume_ids, educations, skills):
+    """批量写入简历向量（批量导入用）：按批编码，整批一次提交到索引"""
+    _ensure_indexes()
+    if not len(resume_ids):
+        return
+    texts = [f"{education} {skill_text}" for education, skill_text in zip(educations, skills)]
+    embeddings = get_sentence_model().encode(texts, batch_size=BUILD_ENCODE_BATCH_SIZE, convert_to_numpy=True)
+    _store_vectors(RESUMES_DB_PATH, RESUME_EMBEDDINGS_TABLE, resume_ids, texts, embeddings)
+    if resume_index.upsert_many(resume_ids, embeddings):
+        print(f"✅ 已批量更新 {len(resume_ids)} 份简历的FAISS向量")
+    else:
+        print(f"✅ {len(resume_ids)} 份简历的FAISS向量已交给索引写入进程")
+
+def delete_resume_from_index(resume_id: int):
+    """从FAISS索引中删除简历向量"""
+    _ensure_indexes()
+    # 先删向量表：索引删除可能交给写入进程异步完成，不能让重建再读到这条向量
+    delete_vectors(RESUMES_DB_PATH, RESUME_EMBEDDINGS_TABLE, [resume_id])
+    resume_index.delete(resume_id)
+    print(f"✅ 已从FAISS索引删除简历 ID {resume_id}")
+
+def upsert_job_in_index(job_id: int, title: str, description: str):
+    """插入或替换职位在FAISS索引中的向量"""
+    _ensure_indexes()
+    text = f"{title} {description}"
+    embedding = encoder.encode(text)
+    _store_vectors(JOBS_DB_PATH, JOB_EMBEDDINGS_TABLE, [job_id], [text], embedding.reshape(1, -1))
+    # 和简历一样交给写线程（过滤位图、榜单、重排向量由提交回调更新）；本进程不是写入进程时交给写入进程
+    if job_index.upsert(job_id, embedding):
+        print(f"✅ 已更新职位 ID {job_id} 的FAISS向量")
+    else:
+        print(f"✅ 职位 ID {job_id} 的FAISS向量已交给索引写入进程")
+
+def delete_job_from_index(job_id: int):
+    """从FAISS索引中删除职位向量"""
+    _ensure_indexes()
+    # 先删向量表：索引删除可能交给写入进程异步完成，不能让重建再读到这条向量
+    delete_vectors(JOBS_DB_PATH, JOB_EMBEDDINGS_TABLE, [job_id])
+    job_index.delete(job_id)
+    print(f"✅ 已从FAISS索引删除职位 ID {job_id}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='构建职位或简历的FAISS索引')
     parser.add_argument('--type', choices=['jobs', 'resumes', 'all'], default='all',
                       help='要构建的索引类型：jobs（职位）, resumes（简历）, all（两者都构建）')
+    parser.add_argument('--chunk-size', type=int, default=BUILD_CHUNK_SIZE, help='每块读取并编码的行数')
+    parser.add_argument('--workers', type=int, default=BUILD_WORKERS, help='并行编码的进程数')
+    parser.add_argument('--no-resume', action='store_true', help='忽略检查点，从头构建')
     args = parser.parse_args()
     
     if args.type in ['jobs', 'all']:
         print("开始构建职位索引...")
-        build_job_index()
+        build_job_index(args.chunk_size, args.workers, not args.no_resume)
     
     if args.type in ['resumes', 'all']:
         print("开始构建简历索引...")
-        build_resume_index()
+        build_resume_index(args.chunk_size, args.workers, not args.no_resume)
     print("索引构建完成")
 
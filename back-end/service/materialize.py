@@ -0,0 +1,452 @@
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from database.db_utils import (
+    JOBS_DB_PATH, MATCH_TABLES, MATCHES_DB_PATH, RESUMES_DB_PATH,
+    create_match_table, get_connection, index_match_table, transaction,
+)
+from .config import MATERIALIZE_BLOCK_SIZE, MATERIALIZE_INTERVAL, MATERIALIZE_TOP_N
+from .embedding_store import JOB_EMBEDDINGS_TABLE, RESUME_EMBEDDINGS_TABLE, iter_vectors, load_vectors
+from .metrics import observe
+from .model_registry import sentence_model_id
+
+# **预计算匹配结果：每个职位的前 N 个候选人、每份简历的前 N 个职位**
+# 全量刷新用持久化的向量做分块矩阵乘法；之后新增或修改的简历、职位只更新受影响的行。
+# 所有写入都在同一个后台线程里串行执行，查询只读 matches.db
+MAX_SQL_VARIABLES = 900
+
+# 职位向量常驻内存（新简历要和全部职位算分），以及每个职位第 N 名的分数（低于它的简历进不了榜单）
+_state = {"job_ids": None, "job_vectors": None, "job_thresholds": None}
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="materialize")
+
+
+def _top_n(scores, n: int):
+    """每行分数最高的 n 个列号，按分数降序"""
+    n = min(n, scores.shape[1])
+    if n == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _merge(best_scores, best_ids, scores, ids):
+    """把新一块的候选（scores / ids 形状相同）合并进每行当前的前 N"""
+    all_scores = np.hstack([best_scores, scores])
+    all_ids = np.hstack([best_ids, ids])
+    top = _top_n(all_scores, best_scores.shape[1])
+    return np.take_along_axis(all_scores, top, axis=1), np.take_along_axis(all_ids, top, axis=1)
+
+
+def _block_top(scores, ids, n: int):
+    """分数块每行的前 n 个 (分数, 列对应的 ID)"""
+    top = _top_n(scores, n)
+    return np.take_along_axis(scores, top, axis=1), ids[top]
+
+
+def _empty_best(rows: int, n: int):
+    return np.full((rows, n), -np.inf, dtype=np.float32), np.full((rows, n), -1, dtype=np.int64)
+
+
+def _rows(owner_ids, best_scores, best_ids):
+    """(所属方 ID, 对方 ID, 分数) 行，跳过不足 N 个时的空位"""
+    for owner_id, scores, ids in zip(owner_ids.tolist(), best_scores, best_ids):
+        for score, other_id in zip(scores.tolist(), ids.tolist()):
+            if other_id >= 0:
+                yield owner_id, other_id, score
+
+
+def _load_jobs(model_id: str, block_size: int):
+    blocks = list(iter_vectors(JOBS_DB_PATH, JOB_EMBEDDINGS_TABLE, model_id, block_size))
+    if not blocks:
+        return np.zeros(0, dtype=np.int64), None
+    return np.concatenate([ids for ids, _ in blocks]), np.vstack([vectors for _, vectors in blocks])
+
+
+def _read_meta():
+    return dict(get_connection(MATCHES_DB_PATH).execute("SELECT key, value FROM materialized_meta"))
+
+
+def _ready() -> bool:
+    """已经用当前模型全量刷新过才做增量更新；换模型后等下一次全量刷新"""
+    return _read_meta().get("model") == sentence_model_id()
+
+
+def refresh_all(top_n: int = MATERIALIZE_TOP_N, block_size: int = MATERIALIZE_BLOCK_SIZE):
+    """全量刷新：简历按块读出，和职位矩阵分块相乘，同时得到两个方向的前 N；写完新表后整体替换"""
+    started = time.perf_counter()
+    model_id = sentence_model_id()
+    job_ids, job_vectors = _load_jobs(model_id, block_size)
+    if not len(job_ids):
+        print("❌ 没有已存储的职位向量，请先运行 `python -m service.matching --type jobs`")
+        return
+
+    conn = get_connection(MATCHES_DB_PATH)
+    for table in MATCH_TABLES:
+        conn.execute(f"DROP TABLE IF EXISTS {table}_new")
+        create_match_table(conn, table, "_new")
+
+    job_best_scores, job_best_ids = _empty_best(len(job_ids), top_n)
+    n_resumes = 0
+    for resume_ids, resume_vectors in iter_vectors(RESUMES_DB_PATH, RESUME_EMBEDDINGS_TABLE, model_id, block_size):
+        resume_best_scores, resume_best_ids = _empty_best(len(resume_ids), top_n)
+        for start in range(0, len(job_ids), block_size):
+            end = start + block_size
+            scores = resume_vectors @ job_vectors[start:end].T  # 简历块 x 职位块
+            resume_best_scores, resume_best_ids = _merge(
+                resume_best_scores, resume_best_ids, *_block_top(scores, job_ids[start:end], top_n))
+            job_best_scores[start:end], job_best_ids[start:end] = _merge(
+                job_best_scores[start:end], job_best_ids[start:end], *_block_top(scores.T, resume_ids, top_n))
+
+        with transaction(MATCHES_DB_PATH) as cursor:
+            cursor.executemany("INSERT INTO resume_top_jobs_new (resume_id, job_id, score) VALUES (?, ?, ?)",
+                               _rows(resume_ids, resume_best_scores, resume_best_ids))
+        n_resumes += len(resume_ids)
+        print(f"已计算 {n_resumes} 份简历 x {len(job_ids)} 个职位")
+
+    with transaction(MATCHES_DB_PATH) as cursor:
+        cursor.executemany("INSERT INTO job_top_candidates_new (job_id, resume_id, score) VALUES (?, ?, ?)",
+                           _rows(job_ids, job_best_scores, job_best_ids))
+        # ✅ 同一个事务里换表：读请求要么看到旧结果，要么看到新结果
+        for table in MATCH_TABLES:
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+            index_match_table(cursor, table)
+        cursor.executemany("INSERT OR REPLACE INTO materialized_meta (key, value) VALUES (?, ?)", [
+            ("model", model_id), ("top_n", str(top_n)), ("refreshed_at", str(time.time())),
+            ("jobs", str(len(job_ids))), ("resumes", str(n_resumes)),
+        ])
+
+    full = job_best_ids[:, -1] >= 0
+    _state.update(job_ids=job_ids, job_vectors=job_vectors,
+                  job_thresholds=np.where(full, job_best_scores[:, -1], -np.inf).astype(np.float32))
+    elapsed = time.perf_counter() - started
+    observe("materialize.refresh_ms", elapsed * 1000)
+    print(f"✅ 已预计算 {len(job_ids)} 个职位和 {n_resumes} 份简历的前 {top_n} 个匹配，耗时 {elapsed:.1f} s")
+
+
+def _top_n_setting() -> int:
+    return int(_read_meta().get("top_n", MATERIALIZE_TOP_N))
+
+
+def _in_chunks(cursor, sql: str, ids):
+    """执行带 {placeholders} 的 SQL，ID 超过参数上限时分批"""
+    ids = [int(i) for i in ids]
+    for start in range(0, len(ids), MAX_SQL_VARIABLES):
+        chunk = ids[start:start + MAX_SQL_VARIABLES]
+        yield from cursor.execute(sql.format(placeholders=",".join("?" * len(chunk))), chunk).fetchall()
+
+
+def _trim(cursor, table: str, owner_ids, top_n: int):
+    """每个所属方只保留分数最高的 top_n 行，返回 {所属方ID: 第 N 名的分数（不足 N 个为 -inf）}"""
+    owner, other = MATCH_TABLES[table]
+    thresholds = {}
+    for owner_id in owner_ids:
+        cursor.execute(f"""
+            DELETE FROM {table} WHERE {owner} = ? AND {other} NOT IN (
+                SELECT {other} FROM {table} WHERE {owner} = ? ORDER BY score DESC LIMIT ?
+            )
+        """, (owner_id, owner_id, top_n))
+        count, lowest = cursor.execute(f"SELECT COUNT(*), MIN(score) FROM {table} WHERE {owner} = ?",
+                                       (owner_id,)).fetchone()
+        thresholds[owner_id] = lowest if count >= top_n else -np.inf
+    return thresholds
+
+
+def _job_matrix():
+    """内存中的职位矩阵；进程重启后第一次用到时从向量表和结果表恢复"""
+    if _state["job_ids"] is None:
+        _load_job_state()
+    return _state["job_ids"], _state["job_vectors"], _state["job_thresholds"]
+
+
+def _set_thresholds(updated: dict):
+    job_ids, thresholds = _state["job_ids"], _state["job_thresholds"]
+    if job_ids is None:
+        return
+    for job_id, threshold in updated.items():
+        row = np.searchsorted(job_ids, job_id)
+        if row < len(job_ids) and job_ids[row] == job_id:
+            thresholds[row] = threshold
+
+
+def _lowest(owner_ids, best_scores, best_ids) -> dict:
+    """{所属方ID: 第 N 名的分数（不足 N 个为 -inf）}"""
+    full = best_ids[:, -1] >= 0
+    return dict(zip(owner_ids.tolist(), np.where(full, best_scores[:, -1], -np.inf).tolist()))
+
+
+def _write_lists(cursor, table: str, owner_ids, best_scores, best_ids):
+    """整体重写这些所属方的榜单"""
+    owner, other = MATCH_TABLES[table]
+    list(_in_chunks(cursor, f"DELETE FROM {table} WHERE {owner} IN ({{placeholders}})", owner_ids))
+    cursor.executemany(f"INSERT INTO {table} ({owner}, {other}, score) VALUES (?, ?, ?)",
+                       _rows(owner_ids, best_scores, best_ids))
+
+
+def _rank_jobs(vectors, top_n: int, block_size: int, on_block=None):
+    """这些简历向量和内存中的全部职位分块相乘，返回每份简历的前 N；on_block(起始行, 分数块) 供调用方顺带处理"""
+    job_ids, job_vectors = _state["job_ids"], _state["job_vectors"]
+    best_scores, best_ids = _empty_best(len(vectors), top_n)
+    for start in range(0, len(job_ids), block_size):
+        scores = vectors @ job_vectors[start:start + block_size].T
+        best_scores, best_ids = _merge(best_scores, best_ids, *_block_top(scores, job_ids[start:start + block_size], top_n))
+        if on_block is not None:
+            on_block(start, scores)
+    return best_scores, best_ids
+
+
+def _rank_resumes(vectors, top_n: int, block_size: int, on_block=None):
+    """扫描一遍持久化的简历向量，返回这些职位向量各自的前 N；on_block(简历ID, 分数块) 供调用方顺带处理"""
+    best_scores, best_ids = _empty_best(len(vectors), top_n)
+    for resume_ids, resume_vectors in iter_vectors(RESUMES_DB_PATH, RESUME_EMBEDDINGS_TABLE,
+                                                   sentence_model_id(), block_size):
+        scores = resume_vectors @ vectors.T  # 简历块 x 职位
+        best_scores, best_ids = _merge(best_scores, best_ids, *_block_top(scores.T, resume_ids, top_n))
+        if on_block is not None:
+            on_block(resume_ids, scores)
+    return best_scores, best_ids
+
+
+def _stored(db_path: str, table: str, ids):
+    stored = load_vectors(db_path, table, sentence_model_id(), ids)
+    found = np.asarray(sorted(stored), dtype=np.int64)
+    if not len(found):
+        return found, None
+    return found, np.stack([stored[item_id][1] for item_id in found.tolist()])
+
+
+def _repair_jobs(job_ids, top_n: int, block_size: int):
+    """
+    榜单里有简历被修改或删除的职位：少了一名，原来的第 N+1 名需要补上，
+    所以对这些职位重新扫描一遍简历向量（新简历只追加，不会触发这里）
+    """
+    job_ids, vectors = _stored(JOBS_DB_PATH, JOB_EMBEDDINGS_TABLE, job_ids)
+    if vectors is None:
+        return
+    best_scores, best_ids = _rank_resumes(vectors, top_n, block_size)
+    with transaction(MATCHES_DB_PATH) as cursor:
+        _write_lists(cursor, "job_top_candidates", job_ids, best_scores, best_ids)
+    _set_thresholds(_lowest(job_ids, best_scores, best_ids))
+
+
+def _repair_resumes(resume_ids, top_n: int, block_size: int):
+    """榜单里有职位被修改或删除的简历：和内存中的职位矩阵重新算一遍"""
+    if _job_matrix()[0] is None:
+        return
+    resume_ids, vectors = _stored(RESUMES_DB_PATH, RESUME_EMBEDDINGS_TABLE, resume_ids)
+    if vectors is None:
+        return
+    best_scores, best_ids = _rank_jobs(vectors, top_n, block_size)
+    with transaction(MATCHES_DB_PATH) as cursor:
+        _write_lists(cursor, "resume_top_jobs", resume_ids, best_scores, best_ids)
+
+
+def _owners_of(table: str, other_ids):
+    """榜单中含有这些 ID 的所属方"""
+    owner, other = MATCH_TABLES[table]
+    return sorted({row[0] for row in _in_chunks(
+        get_connection(MATCHES_DB_PATH).cursor(),
+        f"SELECT DISTINCT {owner} FROM {table} WHERE {other} IN ({{placeholders}})", other_ids)})
+
+
+def _update_resumes(resume_ids, vectors, block_size: int = MATERIALIZE_BLOCK_SIZE):
+    """
+    新增或修改的简历：和内存中的全部职位分块算分，重写这些简历的前 N 个职位；
+    分数超过某个职位当前第 N 名的，插入该职位的榜单。修改前就在榜单里的职位整体重算
+    """
+    if not _ready() or _job_matrix()[0] is None:
+        return
+    top_n = _top_n_setting()
+    resume_ids = np.asarray(resume_ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(resume_ids), -1)
+    job_ids, thresholds = _state["job_ids"], _state["job_thresholds"]
+    stale = _owners_of("job_top_candidates", resume_ids)
+    entries = []
+
+    def collect(start, scores):
+        # 每个职位只看这批里的前 N 名，再和它当前的第 N 名比较
+        column_scores, column_resumes = _block_top(scores.T, resume_ids, top_n)
+        rows, cols = np.nonzero(column_scores > thresholds[start:start + len(column_scores), None])
+        entries.extend(zip(job_ids[start + rows].tolist(), column_resumes[rows, cols].tolist(),
+                           column_scores[rows, cols].tolist()))
+
+    best_scores, best_ids = _rank_jobs(vectors, top_n, block_size, collect)
+    with transaction(MATCHES_DB_PATH) as cursor:
+        _write_lists(cursor, "resume_top_jobs", resume_ids, best_scores, best_ids)
+        cursor.executemany("INSERT OR REPLACE INTO job_top_candidates (job_id, resume_id, score) VALUES (?, ?, ?)",
+                           entries)
+        updated = _trim(cursor, "job_top_candidates", sorted({job_id for job_id, _, _ in entries}), top_n)
+    _set_thresholds(updated)
+    if stale:
+        _repair_jobs(stale, top_n, block_size)
+    print(f"✅ 已更新 {len(resume_ids)} 份简历的预计算匹配，影响 {len(updated) + len(stale)} 个职位")
+
+
+def _update_jobs(job_ids, vectors, block_size: int = MATERIALIZE_BLOCK_SIZE):
+    """
+    新增或修改的职位：扫描一遍持久化的简历向量，重写这些职位的前 N 个候选人；
+    分数超过某份简历当前第 N 名的，插入该简历的榜单。修改前就在榜单里的简历整体重算
+    """
+    if not _ready():
+        return
+    top_n = _top_n_setting()
+    job_ids = np.asarray(job_ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(job_ids), -1)
+    stale = _remove_jobs(job_ids)
+    cursor = get_connection(MATCHES_DB_PATH).cursor()
+    entries = []
+
+    def collect(resume_ids, scores):
+        # 这块简历各自的第 N 名分数（ID 有序，用范围查询）
+        counts = dict.fromkeys(resume_ids.tolist(), (0, None))
+        counts.update((resume_id, (count, lowest)) for resume_id, count, lowest in cursor.execute(
+            "SELECT resume_id, COUNT(*), MIN(score) FROM resume_top_jobs WHERE resume_id BETWEEN ? AND ? "
+            "GROUP BY resume_id", (int(resume_ids[0]), int(resume_ids[-1]))))
+        thresholds = np.asarray([lowest if count >= top_n else -np.inf
+                                 for count, lowest in (counts[i] for i in resume_ids.tolist())], dtype=np.float32)
+        rows, cols = np.nonzero(scores > thresholds[:, None])
+        entries.extend(zip(resume_ids[rows].tolist(), job_ids[cols].tolist(), scores[rows, cols].tolist()))
+
+    best_scores, best_ids = _rank_resumes(vectors, top_n, block_size, collect)
+    with transaction(MATCHES_DB_PATH) as cursor:
+        _write_lists(cursor, "job_top_candidates", job_ids, best_scores, best_ids)
+        cursor.executemany("INSERT OR REPLACE INTO resume_top_jobs (resume_id, job_id, score) VALUES (?, ?, ?)",
+                           entries)
+        _trim(cursor, "resume_top_jobs", sorted({resume_id for resume_id, _, _ in entries}), top_n)
+
+    # 内存中的职位矩阵：替换已有的行，追加新职位
+    if _state["job_ids"] is not None:
+        new_thresholds = np.asarray(list(_lowest(job_ids, best_scores, best_ids).values()), dtype=np.float32)
+        ids = np.concatenate([_state["job_ids"], job_ids])
+        order = np.argsort(ids, kind="stable")
+        _state.update(job_ids=ids[order],
+                      job_vectors=np.vstack([_state["job_vectors"], vectors])[order],
+                      job_thresholds=np.concatenate([_state["job_thresholds"], new_thresholds])[order])
+    if stale:
+        _repair_resumes(stale, top_n, block_size)
+    print(f"✅ 已更新 {len(job_ids)} 个职位的预计算匹配，影响 {len(entries) + len(stale)} 份简历")
+
+
+def _remove_jobs(job_ids):
+    """从两张表和内存矩阵中去掉这些职位，返回榜单里原本有它们的简历"""
+    stale = _owners_of("resume_top_jobs", job_ids)
+    with transaction(MATCHES_DB_PATH) as cursor:
+        for sql in ("DELETE FROM job_top_candidates WHERE job_id IN ({placeholders})",
+                    "DELETE FROM resume_top_jobs WHERE job_id IN ({placeholders})"):
+            list(_in_chunks(cursor, sql, job_ids))
+    if _state["job_ids"] is not None:
+        keep = ~np.isin(_state["job_ids"], np.asarray(job_ids, dtype=np.int64))
+        _state.update(job_ids=_state["job_ids"][keep], job_vectors=_state["job_vectors"][keep],
+                      job_thresholds=_state["job_thresholds"][keep])
+    return stale
+
+
+def _delete_jobs(job_ids, block_size: int = MATERIALIZE_BLOCK_SIZE):
+    if not _ready():
+        return
+    stale = _remove_jobs(job_ids)
+    if stale:
+        _repair_resumes(stale, _top_n_setting(), block_size)
+
+
+def _delete_resumes(resume_ids, block_size: int = MATERIALIZE_BLOCK_SIZE):
+    """删除的简历：从两张表中去掉，榜单里原本有它们的职位重新算"""
+    if not _ready():
+        return
+    stale = _owners_of("job_top_candidates", resume_ids)
+    with transaction(MATCHES_DB_PATH) as cursor:
+        for sql in ("DELETE FROM job_top_candidates WHERE resume_id IN ({placeholders})",
+                    "DELETE FROM resume_top_jobs WHERE resume_id IN ({placeholders})"):
+            list(_in_chunks(cursor, sql, resume_ids))
+    if stale:
+        _repair_jobs(stale, _top_n_setting(), block_size)
+
+
+def _load_job_state():
+    """进程重启后第一次增量更新时，从持久化向量和结果表恢复职位矩阵和各职位第 N 名的分数"""
+    job_ids, job_vectors = _load_jobs(sentence_model_id(), MATERIALIZE_BLOCK_SIZE)
+    if not len(job_ids):
+        return
+    top_n = _top_n_setting()
+    thresholds = np.full(len(job_ids), -np.inf, dtype=np.float32)
+    for job_id, count, lowest in get_connection(MATCHES_DB_PATH).execute(
+            "SELECT job_id, COUNT(*), MIN(score) FROM job_top_candidates GROUP BY job_id"):
+        row = np.searchsorted(job_ids, job_id)
+        if row < len(job_ids) and job_ids[row] == job_id and count >= top_n:
+            thresholds[row] = lowest
+    _state.update(job_ids=job_ids, job_vectors=job_vectors, job_thresholds=thresholds)
+
+
+def _submit(fn, *args):
+    """放进后台写线程执行，出错只打印，不影响调用方"""
+    def run():
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"❌ 预计算匹配更新失败: {str(e)}")
+    return _worker.submit(run)
+
+
+def on_resumes_changed(resume_ids, vectors):
+    if len(resume_ids):
+        _submit(_update_resumes, list(resume_ids), np.array(vectors, dtype=np.float32))
+
+
+def on_jobs_changed(job_ids, vectors):
+    if len(job_ids):
+        _submit(_update_jobs, list(job_ids), np.array(vectors, dtype=np.float32))
+
+
+def on_resumes_deleted(resume_ids):
+    _submit(_delete_resumes, list(resume_ids))
+
+
+def on_jobs_deleted(job_ids):
+    _submit(_delete_jobs, list(job_ids))
+
+
+def schedule_refresh():
+    """在后台写线程中排队一次全量刷新（与增量更新串行，不会交错写入）"""
+    return _submit(refresh_all)
+
+
+def start_periodic_refresh(interval: float = MATERIALIZE_INTERVAL):
+    """每 interval 秒全量刷新一次；还没有用当前模型刷新过时立即刷新一次"""
+    if interval <= 0:
+        return None
+
+    def loop():
+        if not _ready():
+            schedule_refresh().result()
+        while True:
+            time.sleep(interval)
+            schedule_refresh().result()
+
+    thread = threading.Thread(target=loop, name="materialize-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def refresh_status() -> dict:
+    return _read_meta()
+
+
+def read_top(table: str, owner_id: int, top_k: int):
+    """读预计算的榜单：一次按主键的范围查询，返回 [(对方ID, 分数)]"""
+    owner, other = MATCH_TABLES[table]
+    return get_connection(MATCHES_DB_PATH).execute(
+        f"SELECT {other}, score FROM {table} WHERE {owner} = ? ORDER BY score DESC LIMIT ?",
+        (int(owner_id), top_k)).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全量预计算职位 <-> 候选人的前 N 个匹配")
+    parser.add_argument("--top-n", type=int, default=MATERIALIZE_TOP_N, help="每个职位 / 每份简历保存的结果数")
+    parser.add_argument("--block-size", type=int, default=MATERIALIZE_BLOCK_SIZE, help="分块矩阵乘法的块大小")
+    args = parser.parse_args()
+    refresh_all(args.top_n, args.block_size)
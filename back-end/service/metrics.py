@@ -0,0 +1,39 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# **进程内的简单性能统计：每个指标记录次数、总和、最小/最大值和最近一次的值**
+_lock = threading.Lock()
+_stats = {}
+
+
+def observe(name: str, value: float):
+    """记录一次观测值（耗时统一用毫秒）"""
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = {"count": 0, "total": 0.0, "min": value, "max": value, "last": value}
+        stat["count"] += 1
+        stat["total"] += value
+        stat["min"] = min(stat["min"], value)
+        stat["max"] = max(stat["max"], value)
+        stat["last"] = value
+
+
+@contextmanager
+def timed(name: str):
+    """统计代码块耗时（毫秒）"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - started) * 1000)
+
+
+def get_metrics() -> dict:
+    """返回所有指标的快照（附带平均值）"""
+    with _lock:
+        return {
+            name: {**stat, "avg": stat["total"] / stat["count"]}
+            for name, stat in sorted(_stats.items())
+        }
@@ -0,0 +1,131 @@
+import threading
+import time
+
+from .config import (
+    ENCODER_BACKEND, ENCODER_DIM, ONNX_QUANTIZE, SENTENCE_MODEL_NAME, SKILL_TAXONOMY_PATH, SPACY_EXCLUDE,
+    SPACY_MODEL_NAME,
+)
+from .encoders import create_encoder, encoder_namespace, expected_dimension
+
+# **模型注册表：每个模型第一次用到时才加载，同一进程内只加载一次并共享**
+_registry_lock = threading.Lock()
+_loaders = {}
+_models = {}
+_model_locks = {}
+_load_ms = {}
+_warmup = {"done": False, "ms": None}
+
+
+def register_model(name: str, loader):
+    """注册模型加载函数（loader 无参数，返回模型对象）"""
+    with _registry_lock:
+        _loaders[name] = loader
+        _model_locks.setdefault(name, threading.Lock())
+
+
+def get_model(name: str):
+    """返回已加载的模型；第一次调用时加载（并发调用只会加载一次）"""
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _model_locks[name]:
+        model = _models.get(name)
+        if model is None:
+            print(f"正在加载模型 {name} ...")
+            started = time.perf_counter()
+            model = _loaders[name]()
+            _load_ms[name] = (time.perf_counter() - started) * 1000
+            _models[name] = model
+            print(f"✅ 模型 {name} 加载完成，耗时 {_load_ms[name]:.0f} ms")
+    return model
+
+
+def _load_sentence_model():
+    """按 ENCODER_BACKEND 创建编码器（torch / onnx / hashing），接口一致"""
+    return create_encoder(ENCODER_BACKEND, SENTENCE_MODEL_NAME, ENCODER_DIM)
+
+
+def load_spacy_pipeline(model_name: str = SPACY_MODEL_NAME, exclude: str = SPACY_EXCLUDE):
+    """加载 spaCy 模型并去掉姓名提取用不到的组件（exclude 为空时加载完整流水线）"""
+    import spacy
+    nlp = spacy.load(model_name, exclude=[name for name in exclude.split(",") if name.strip()])
+    # 没有组件再监听共享的 tok2vec 时（例如 sm 模型的 NER 自带 tok2vec），它也可以跳过
+    if "tok2vec" in nlp.pipe_names and not nlp.get_pipe("tok2vec").listening_components:
+        nlp.disable_pipe("tok2vec")
+    return nlp
+
+
+def _load_spacy_model():
+    return load_spacy_pipeline()
+
+
+def _load_skill_matcher():
+    from .skill_matcher import load_skill_matcher
+    return load_skill_matcher(SKILL_TAXONOMY_PATH)
+
+
+register_model("sentence", _load_sentence_model)
+register_model("spacy", _load_spacy_model)
+register_model("skills", _load_skill_matcher)
+
+
+def get_sentence_model():
+    """句向量编码器（见 encoders.SentenceEncoder）"""
+    return get_model("sentence")
+
+
+def sentence_dimension() -> int:
+    """编码器输出维度；常用模型不需要加载就能确定"""
+    dimension = expected_dimension(ENCODER_BACKEND, SENTENCE_MODEL_NAME, ENCODER_DIM)
+    return dimension if dimension is not None else get_sentence_model().dimension
+
+
+def index_namespace() -> str:
+    """当前编码器对应的索引命名空间（模型 + 维度），不同模型的索引互不覆盖"""
+    return encoder_namespace(ENCODER_BACKEND, SENTENCE_MODEL_NAME, sentence_dimension())
+
+
+def sentence_model_id() -> str:
+    """模型 + 维度 + 推理后端的标识：不同后端的向量有细微差别，构建检查点不能混用"""
+    if ENCODER_BACKEND == "onnx":
+        return f"{index_namespace()}@onnx-{'int8' if ONNX_QUANTIZE else 'fp32'}"
+    return f"{index_namespace()}@{ENCODER_BACKEND}"
+
+
+def get_nlp():
+    """只保留 NER 的 spaCy 流水线（用于姓名实体识别）"""
+    return get_model("spacy")
+
+
+def get_skill_matcher():
+    """由技能词典编译的匹配自动机（见 skill_matcher.SkillMatcher）"""
+    return get_model("skills")
+
+
+def warmup_parser():
+    """加载 spaCy 和技能匹配器并跑一次解析（解析进程池的每个子进程启动时调用）"""
+    get_nlp()("John Smith is a software engineer in Toronto.")
+    get_skill_matcher().find("Python and SQL")
+
+
+def warmup():
+    """加载所有模型并各跑一次推理，让第一个真实请求不用承担初始化开销"""
+    started = time.perf_counter()
+    get_sentence_model().encode(["warmup python sql"], convert_to_numpy=True)
+    warmup_parser()
+    _warmup["ms"] = (time.perf_counter() - started) * 1000
+    _warmup["done"] = True
+    print(f"✅ 模型预热完成，耗时 {_warmup['ms']:.0f} ms")
+
+
+def readiness() -> dict:
+    """就绪状态：是否完成预热，以及每个模型的加载耗时"""
+    return {
+        "ready": _warmup["done"],
+        "warmup_ms": _warmup["ms"],
+        "models": {
+            name: {"loaded": name in _models, "load_ms": _load_ms.get(name)}
+            for name in _loaders
+        },
+    }
@@ -0,0 +1,127 @@
+import json
+import os
+
+import numpy as np
+
+# **ONNX Runtime 推理后端：把 SentenceTransformer（Transformer + 平均池化 + 归一化）导出成一个 ONNX 图**
+# 导出只需做一次（需要 torch）；之后推理只依赖 onnxruntime 和 tokenizer
+
+
+def _model_dir(model_name: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, model_name.replace("/", "__"))
+
+
+def export_onnx_model(model_name: str, cache_dir: str, quantize: bool = True) -> str:
+    """导出 ONNX 模型（可选再做动态 int8 量化），返回模型目录"""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = st_model[0], st_model[1]
+    if not isinstance(pooling, models.Pooling) or not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"❌ {model_name} 不是平均池化模型，暂不支持导出为 ONNX")
+    normalize = any(isinstance(module, models.Normalize) for module in st_model)
+
+    class PooledModel(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer.auto_model
+
+        def forward(self, input_ids, attention_mask):
+            token_embeddings = self.transformer(input_ids=input_ids, attention_mask=attention_mask)[0]
+            mask = attention_mask.unsqueeze(-1).to(token_embeddings.dtype)
+            embeddings = (token_embeddings * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            if normalize:
+                embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+            return embeddings
+
+    model_dir = _model_dir(model_name, cache_dir)
+    os.makedirs(model_dir, exist_ok=True)
+    onnx_path = os.path.join(model_dir, "model.onnx")
+
+    print(f"正在导出 {model_name} 到 ONNX ...")
+    dummy = transformer.tokenizer(["hello world"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            PooledModel().eval(),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            onnx_path + ".tmp",
+            input_names=["input_ids", "attention_mask"],
+            output_names=["sentence_embedding"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "sentence_embedding": {0: "batch"},
+            },
+            opset_version=14,
+        )
+    os.replace(onnx_path + ".tmp", onnx_path)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantized_path = os.path.join(model_dir, "model.int8.onnx")
+        quantize_dynamic(onnx_path, quantized_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(quantized_path + ".tmp", quantized_path)
+
+    transformer.tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "max_seq_length": st_model.max_seq_length,
+                   "dimension": st_model.get_sentence_embedding_dimension()}, f)
+    print(f"✅ ONNX 模型已导出到 {model_dir}")
+    return model_dir
+
+
+class OnnxSentenceEncoder:
+    """与 SentenceTransformer.encode 接口一致的 ONNX Runtime 编码器"""
+
+    def __init__(self, model_dir: str, quantize: bool = True, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "encoder.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.model_name = meta["model"]
+        self.max_seq_length = meta["max_seq_length"]
+        self.dimension = meta["dimension"]
+        self.quantized = quantize
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        model_file = "model.int8.onnx" if quantize else "model.onnx"
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs):
+        """编码一批文本，返回 (n, d) float32；传入单个字符串时返回 (d,)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        # ✅ 按长度排序后分批，同一批的 padding 更少
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            batch_rows = order[start:start + batch_size]
+            tokens = self.tokenizer([texts[i] for i in batch_rows], padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors="np")
+            outputs = self.session.run(None, {
+                "input_ids": tokens["input_ids"].astype(np.int64),
+                "attention_mask": tokens["attention_mask"].astype(np.int64),
+            })
+            embeddings[batch_rows] = outputs[0]
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_encoder(model_name: str, cache_dir: str, quantize: bool = True, threads: int = 0):
+    """读取已导出的 ONNX 模型；还没有导出（或缺少量化版本）时先导出"""
+    model_dir = _model_dir(model_name, cache_dir)
+    model_file = "model.int8.onnx" if quantize else "model.onnx"
+    if not os.path.exists(os.path.join(model_dir, model_file)) or \
+            not os.path.exists(os.path.join(model_dir, "encoder.json")):
+        export_onnx_model(model_name, cache_dir, quantize=quantize)
+    return OnnxSentenceEncoder(model_dir, quantize=quantize, threads=threads)
@@ -0,0 +1,62 @@
+import uuid
+
+from .query_cache import SingleFlight, TTLCache
+
+# **匹配结果分页：服务端短期保存查询向量和去重后的排名，游标 = 会话ID + 下一页起点**
+# 翻页直接读已有排名，不够时用保存的查询向量继续向深处搜索，不再调用编码器
+
+
+class MatchSession:
+    """一次匹配查询的服务端状态：查询向量已经固定在 results 的搜索函数里"""
+
+    def __init__(self, kind: str, results):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.results = results
+        self.issued = 0  # 已发出的游标中最大的起点：伪造的更大起点会逼着向深处搜索，直接拒绝
+
+
+class CursorStore:
+    def __init__(self, maxsize: int, ttl: float):
+        self._sessions = TTLCache("cursor", maxsize, ttl)  # 会话ID -> 会话
+        self._by_query = TTLCache("match_session", maxsize, ttl)  # 查询 key -> 会话ID
+        self._flight = SingleFlight()
+
+    def open(self, key, create):
+        """相同查询（同一索引版本）共用一个会话；不存在或已过期时调用 create() 新建"""
+        session_id = self._by_query.get(key)
+        session = self._sessions.get(session_id) if session_id else None
+        if session is not None:
+            return session
+
+        def build():
+            session = create()
+            self._sessions.set(session.id, session)
+            self._by_query.set(key, session.id)
+            return session
+
+        return self._flight.do(key, build)
+
+    def resume(self, cursor: str, kind: str):
+        """游标 -> (会话, 起点)；无效或已过期抛出 ValueError"""
+        session_id, _, position = (cursor or "").partition(".")
+        session = self._sessions.get(session_id)
+        if session is None or session.kind != kind or not position.isdigit() or int(position) > session.issued:
+            raise ValueError("❌ 游标无效或已过期，请重新发起查询")
+        # 继续翻页的会话重新计时
+        self._sessions.set(session_id, session)
+        return session, int(position)
+
+    def cursor(self, session, position: int) -> str:
+        """发出从 position 继续的游标，并记下该会话发出过的最大起点"""
+        session.issued = max(session.issued, position)
+        return f"{session.id}.{position}"
+
+    def alive(self, cursor: str) -> bool:
+        """游标对应的会话是否还在（缓存的第一页带着游标，会话过期后游标就不能再用了）"""
+        session_id, _, _ = (cursor or "").partition(".")
+        return self._sessions.get(session_id) is not None
+
+    def clear(self):
+        self._sessions.clear()
+        self._by_query.clear()
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import observe
+
+_MISSING = object()
+
+
+class TTLCache:
+    """线程安全的 LRU 缓存，条目超过 ttl 秒后失效"""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] < time.monotonic():
+                del self._data[key]
+                item = _MISSING
+            if item is not _MISSING:
+                self._data.move_to_end(key)
+        # ✅ 命中记 1、未命中记 0，指标的平均值就是命中率
+        observe(f"cache.{self.name}.hit", 0.0 if item is _MISSING else 1.0)
+        return default if item is _MISSING else item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """相同 key 的并发调用只执行一次，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def cached_call(cache: TTLCache, flight: SingleFlight, key, fn):
+    """先查缓存；未命中时通过 single-flight 计算并写回缓存"""
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    def compute():
+        # 等待期间可能已有别的请求写入了缓存
+        value = cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = fn()
+            cache.set(key, value)
+        return value
+
+    return flight.do(key, compute)
+
+
+def normalize_terms(terms) -> tuple:
+    """把技能列表/字符串规范化为去重、小写、排序后的元组，作为缓存 key"""
+    if isinstance(terms, str):
+        terms = terms.split()
+    normalized = {" ".join(str(term).lower().split()) for term in terms}
+    normalized.discard("")
+    return tuple(sorted(normalized))
@@ -0,0 +1,201 @@
+import fcntl
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# **压缩索引的精确重排：原始 float32 向量存放在磁盘上（内存映射），只读取候选向量所在的页**
+# 构建之后 upsert 的向量追加写入 <索引>.rerank_updates（ID(int64) + 维度(uint32) + float32 向量），
+# 重启后和其他进程都从这个文件读回，不会把近似分数和精确分数混在一起排序
+_UPDATE_HEADER = struct.Struct("<qI")
+
+
+def rerank_paths(index_path: str):
+    """索引文件对应的重排向量文件：按 ID 排序的 ids 和与之对齐的 float32 向量"""
+    base, _ = os.path.splitext(index_path)
+    return base + ".rerank_ids.npy", base + ".rerank_vectors.npy"
+
+
+def write_rerank_vectors(index_path: str, ids, vectors):
+    """构建压缩索引时保存原始向量，供查询时精确重排"""
+    ids_path, vectors_path = rerank_paths(index_path)
+    ids = np.asarray(ids, dtype=np.int64)
+    order = np.argsort(ids)
+    for path, data in ((ids_path, ids[order]), (vectors_path, np.asarray(vectors, dtype=np.float32)[order])):
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, data)
+        os.replace(path + ".tmp", path)
+
+
+def rerank_updates_path(index_path: str) -> str:
+    """构建之后写入的原始向量（追加写），重建后只保留与新的重排向量不同的记录"""
+    base, _ = os.path.splitext(index_path)
+    return base + ".rerank_updates"
+
+
+def remove_rerank_vectors(index_path: str):
+    """改回 fp32 存储时删除不再需要的重排向量"""
+    updates_path = rerank_updates_path(index_path)
+    with _locked(updates_path):
+        for path in rerank_paths(index_path) + (updates_path,):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@contextmanager
+def _locked(updates_path: str):
+    """追加、压缩、删除更新文件时持有 <更新文件>.lock 上的排他 flock（跨进程）"""
+    with open(updates_path + ".lock", "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _decode_updates(data: bytes):
+    """解析更新记录，返回 ({id: 向量}（同一 ID 以最后一条为准）, 完整记录的字节数)"""
+    offset = 0
+    updates = {}
+    while offset + _UPDATE_HEADER.size <= len(data):
+        item_id, dim = _UPDATE_HEADER.unpack_from(data, offset)
+        end = offset + _UPDATE_HEADER.size + dim * 4
+        if end > len(data):
+            break
+        updates[item_id] = np.frombuffer(data, dtype=np.float32, count=dim, offset=offset + _UPDATE_HEADER.size)
+        offset = end
+    return updates, offset
+
+
+def _encode_updates(ids, vectors) -> bytes:
+    return b"".join(_UPDATE_HEADER.pack(int(item_id), vector.shape[0]) + vector.tobytes()
+                    for item_id, vector in zip(ids, vectors))
+
+
+class ExactReranker:
+    """用原始向量对压缩索引返回的候选重新计算内积并排序"""
+
+    def __init__(self, index_path: str):
+        self.ids_path, self.vectors_path = rerank_paths(index_path)
+        self.updates_path = rerank_updates_path(index_path)
+        self._ids = None
+        self._vectors = None
+        self._stamp = None
+        self._overrides = {}  # 从更新文件读出的 id -> 向量
+        self._updates_file = None  # 已读的更新文件 (st_dev, st_ino)：压缩后换了文件，从头重读
+        self._updates_offset = 0
+        self._lock = threading.Lock()
+
+    def reload_if_changed(self):
+        """重排向量文件更新后重新映射（索引重建后调用），并压缩更新文件"""
+        try:
+            stamp = (os.stat(self.ids_path).st_mtime_ns, os.stat(self.vectors_path).st_mtime_ns)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp is None:
+                self._ids = self._vectors = None
+            else:
+                self._ids = np.load(self.ids_path)
+                self._vectors = np.load(self.vectors_path, mmap_mode="r")
+            self._stamp = stamp
+        if stamp is not None:
+            self._compact()
+
+    def update(self, item_id: int, vector):
+        """记录构建之后 upsert 的向量（例如新上传的简历）"""
+        self.update_many([item_id], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def update_many(self, ids, vectors):
+        """一批 upsert 的向量追加到更新文件（一次 fsync），再记入本进程"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        with self._lock, _locked(self.updates_path):
+            with open(self.updates_path, "ab") as f:
+                f.write(_encode_updates(ids, vectors))
+                f.flush()
+                os.fsync(f.fileno())
+            for item_id, vector in zip(ids, vectors):
+                self._overrides[int(item_id)] = vector
+
+    @property
+    def available(self) -> bool:
+        return self._ids is not None
+
+    def _read_updates(self):
+        """读更新文件新追加的记录（调用方持有 _lock）；文件被压缩替换或删除后从头读"""
+        try:
+            st = os.stat(self.updates_path)
+        except FileNotFoundError:
+            st = None
+        identity = (st.st_dev, st.st_ino) if st else None
+        if identity != self._updates_file:
+            self._updates_file, self._updates_offset, self._overrides = identity, 0, {}
+        if st is None or st.st_size <= self._updates_offset:
+            return
+        with open(self.updates_path, "rb") as f:
+            f.seek(self._updates_offset)
+            updates, consumed = _decode_updates(f.read())
+        self._overrides.update(updates)
+        self._updates_offset += consumed
+
+    def _compact(self):
+        """
+        重建之后丢掉与新重排向量相同（在 float16 存储的精度内）的更新；
+        重建期间写入的向量和新文件里的不同，继续保留
+        """
+        with self._lock, _locked(self.updates_path):
+            if self._ids is None or not os.path.exists(self.updates_path):
+                return
+            with open(self.updates_path, "rb") as f:
+                updates, _ = _decode_updates(f.read())
+            kept = {}
+            for item_id, vector in updates.items():
+                row = np.searchsorted(self._ids, item_id)
+                built = self._vectors[row] if row < len(self._ids) and self._ids[row] == item_id else None
+                if built is None or built.shape != vector.shape or not np.allclose(built, vector, atol=1e-3):
+                    kept[item_id] = vector
+            if len(kept) == len(updates):
+                return
+            tmp_path = self.updates_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_encode_updates(list(kept), list(kept.values())))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.updates_path)
+        print(f"✅ 重排向量已更新，保留 {len(kept)} 条重建之后写入的向量")
+
+    def lookup(self, ids):
+        """返回 ids 对应的原始向量；找不到的行为 None"""
+        with self._lock:
+            self._read_updates()
+            overrides = self._overrides
+        vectors = [None] * len(ids)
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.searchsorted(self._ids, ids)
+        for i, (item_id, row) in enumerate(zip(ids, rows)):
+            override = overrides.get(int(item_id))
+            if override is not None:
+                vectors[i] = override
+            elif row < len(self._ids) and self._ids[row] == item_id:
+                vectors[i] = self._vectors[row]
+        return vectors
+
+    def rerank(self, query, ids, approx_scores, k: int):
+        """对一条查询的候选 (ids, 近似分数) 精确重排，返回前 k 个 (scores, ids)"""
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        valid = [(int(item_id), float(score)) for item_id, score in zip(ids, approx_scores) if item_id >= 0]
+        if not valid:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        # ✅ 没有原始向量的 ID（没有经过 update 写入的）保留近似分数
+        vectors = self.lookup([item_id for item_id, _ in valid])
+        scores = np.asarray([
+            float(np.dot(vector, query)) if vector is not None else score
+            for (_, score), vector in zip(valid, vectors)
+        ], dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return scores[order], np.asarray([valid[i][0] for i in order], dtype=np.int64)
@@ -1,12 +1,11 @@
+import hashlib
+import json
 import re
-import sqlite3
-import os
+import time
 import fitz  # ✅ PyMuPDF 用于解析 PDF
-import spacy
-from .matching import add_resume_to_index
-
-# ✅ 加载 spaCy 预训练 NLP 模型（支持实体识别）
-nlp = spacy.load("en_core_web_sm")
+from .config import DUPLICATE_POLICY, MAX_PDF_PAGES, SPACY_BATCH_SIZE, SPACY_N_PROCESS
+from .model_registry import get_nlp, get_skill_matcher
+from database.db_utils import RESUMES_DB_PATH, get_connection, transaction
 
 
 def extract_text_from_txt(content: bytes):
@@ -16,27 +15,22 @@ def extract_text_from_txt(content: bytes):
 
 
 
-def extract_text_from_pdf(content: bytes):
+def extract_text_from_pdf(content: bytes, max_pages: int = MAX_PDF_PAGES):
     """解析 PDF 简历，去除换行，确保 `Name:` 关键字后内容连贯"""
-    temp_path = "temp_resume.pdf"
-
-    # ✅ **写入临时 PDF**
-    with open(temp_path, "wb") as f:
-        f.write(content)
-
     text = []
-    with fitz.open(temp_path) as doc:
+    # ✅ **直接从内存打开 PDF，不写临时文件（并发上传互不影响）**
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        if doc.page_count > max_pages:
+            raise ValueError(f"PDF has {doc.page_count} pages, the limit is {max_pages}")
         for page in doc:
             text.append(page.get_text("text").strip())  # ✅ 去掉前后空格
 
-    os.remove(temp_path)  # ✅ 解析后删除 PDF
-
     clean_text = " ".join(text)  # ✅ **合并所有页文本，确保 `Name:` 关键字后内容不换行**
     return clean_text
 
 
-def extract_name(text, file_type="pdf"):
-    """提取姓名"""
+def _name_from_prefix(text, file_type):
+    """PDF 中以 `Name:` 为前缀的姓名；没有返回 None"""
     try:
         if file_type == "pdf":
             # ✅ **尝试匹配以 `Name:` 为前缀的姓名**
@@ -45,10 +39,11 @@ def extract_name(text, file_type="pdf"):
                 return match.group(1).strip()
     except Exception as e:
         print(f"Error extracting name: {e}")
-    
-    # ✅ 如果没找到或出错，使用 spaCy 提取人名
-    doc = nlp(text[:1000])  # ✅ 仅处理开头部分
-    
+    return None
+
+
+def _name_from_doc(doc, text):
+    """NER 结果中的第一个 PERSON 实体；没有则取首行或默认名称"""
     # ✅ **寻找 PERSON 实体**
     for ent in doc.ents:
         if ent.label_ == "PERSON":
@@ -62,6 +57,31 @@ def extract_name(text, file_type="pdf"):
     return "Candidate"  # 默认名称
 
 
+def extract_name(text, file_type="pdf", timings=None):
+    """提取姓名（timings 不为 None 时记录 NER 耗时 ms）"""
+    name = _name_from_prefix(text, file_type)
+    if name is not None:
+        return name
+
+    # ✅ 如果没找到或出错，使用 spaCy NER 提取人名（仅处理开头部分）
+    started = time.perf_counter()
+    doc = get_nlp()(text[:1000])
+    if timings is not None:
+        timings["ner"] = (time.perf_counter() - started) * 1000
+    return _name_from_doc(doc, text)
+
+
+def extract_names(texts, file_types, n_process: int = SPACY_N_PROCESS, batch_size: int = SPACY_BATCH_SIZE):
+    """批量提取姓名：需要 NER 的文档一起走 nlp.pipe（批处理，可多进程）"""
+    names = [_name_from_prefix(text, file_type) for text, file_type in zip(texts, file_types)]
+    pending = [i for i, name in enumerate(names) if name is None]
+    if pending:
+        docs = get_nlp().pipe((texts[i][:1000] for i in pending), batch_size=batch_size, n_process=n_process)
+        for i, doc in zip(pending, docs):
+            names[i] = _name_from_doc(doc, texts[i])
+    return names
+
+
 def extract_email(text):
     """提取邮箱"""
     match = re.search(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", text)
@@ -83,138 +103,332 @@ def extract_phone(text):
     return "N/A"
 
 
-def extract_education(text):
+# ✅ **段落标题（与原来各自的正则一致，区分大小写）：一次扫描切出所有段落**
+_SECTION_HEADERS = {
+    "education": ("EDUCATION", "Education", "学历"),
+    "experience": ("EXPERIENCE", "Experience", "工作经验"),
+    "skills": ("SKILLS", "Skills", "技能"),
+    "projects": ("PROJECT", "Project", "项目"),
+}
+_HEADER_KIND = {header: kind for kind, headers in _SECTION_HEADERS.items() for header in headers}
+_HEADER_ALTERNATION = "(" + "|".join(re.escape(header) for header in _HEADER_KIND) + ")"
+# ✅ 标题必须在行首，正文里的 "Skills" "project" 之类不会切断段落；
+# 英文标题可以是复数（PROJECTS），后面不能紧跟字母，中文标题后面可以直接接字（技能清单）。
+# 前面带一两个英文词或几个汉字修饰的（Technical Skills / Professional Experience / 专业技能）
+# 只有整行就是标题、或标题后紧跟冒号时才算
+_SECTION_PATTERN = re.compile(
+    r"(?m)^\s*("
+    + _HEADER_ALTERNATION + r"[sS]?(?![A-Za-z])"
+    + r"|(?:[A-Za-z]+[ \t]+){1,2}" + _HEADER_ALTERNATION + r"[sS]?[ \t]*(?=[:：]|$)"
+    + r"|[\u4e00-\u9fff]{1,4}" + _HEADER_ALTERNATION + r"[ \t]*(?=[:：]|$)"
+    + r")"
+)
+# 每类段落在哪些标题处结束（与旧版本逐段正则一致：教育段只在工作经验、技能处结束）；未列出的遇到任意标题结束
+_SECTION_ENDS = {
+    "education": ("experience", "skills"),
+    "skills": ("experience", "education", "projects"),
+}
+
+_EDUCATION_KEYWORDS = ("university", "college", "bachelor", "master", "phd", "degree", "diploma")
+
+
+def segment_sections(text):
+    """返回 {段落类型: 文本}：一次扫描找出所有行首标题，每类取第一次出现的标题，到它的结束标题为止"""
+    sections = {}
+    matches = [(match.start(1), _HEADER_KIND[match.group(2) or match.group(3) or match.group(4)])
+               for match in _SECTION_PATTERN.finditer(text)]
+    for i, (start, kind) in enumerate(matches):
+        if kind in sections:
+            continue
+        ends = _SECTION_ENDS.get(kind)
+        end = next((other_start for other_start, other_kind in matches[i + 1:]
+                    if ends is None or other_kind in ends), len(text))
+        sections[kind] = text[start:end]
+    return sections
+
+
+def extract_education(text, sections=None):
     """提取教育信息"""
     education = []
+    if sections is None:
+        sections = segment_sections(text)
     
-    # ✅ **搜索教育相关段落**
-    education_section = re.search(r"(?:EDUCATION|Education|学历)(?:.*?)(?=EXPERIENCE|Experience|工作经验|SKILLS|Skills|技能|\Z)", text, re.DOTALL)
-    if education_section:
-        edu_text = education_section.group(0)
-        
+    # ✅ **教育相关段落**
+    edu_text = sections.get("education")
+    if edu_text:
         # ✅ **分割为条目**
         items = re.split(r"\n\s*\n|\n(?=[A-Z])", edu_text)
         
         for item in items:
-            if len(item.strip()) > 10 and ("university" in item.lower() or "college" in item.lower() or "bachelor" in item.lower() or "master" in item.lower() or "phd" in item.lower() or "degree" in item.lower() or "diploma" in item.lower()):
+            lowered = item.lower()
+            if len(item.strip()) > 10 and any(keyword in lowered for keyword in _EDUCATION_KEYWORDS):
                 education.append(item.strip())
     
-    # ✅ **如果没有找到教育信息，使用关键词匹配**
+    # ✅ **如果没有找到教育信息，使用关键词匹配（每行只转一次小写）**
     if not education:
-        keywords = ["Bachelor", "Master", "PhD", "University", "College", "Degree", "Diploma"]
-        lines = text.split("\n")
-        
-        for line in lines:
-            if any(keyword.lower() in line.lower() for keyword in keywords) and len(line.strip()) > 10:
+        for line in text.split("\n"):
+            lowered = line.lower()
+            if any(keyword in lowered for keyword in _EDUCATION_KEYWORDS) and len(line.strip()) > 10:
                 education.append(line.strip())
     
     return education if education else ["Not specified"]
 
 
-def extract_skills(text):
-    """提取技能信息"""
-    skills = []
-    
-    # ✅ **搜索技能相关段落**
-    skills_section = re.search(r"(?:SKILLS|Skills|技能)(?:.*?)(?=EXPERIENCE|Experience|工作经验|EDUCATION|Education|PROJECT|Project|项目|\Z)", text, re.DOTALL)
-    
-    if skills_section:
-        skill_text = skills_section.group(0)
-        
-        # ✅ **匹配技能（含编程语言、工具、框架）**
-        common_skills = [
-            "Python", "Java", "JavaScript", "React", "Vue", "Angular", "Node.js", "Express", 
-            "Django", "Flask", "SQL", "MySQL", "PostgreSQL", "MongoDB", "Redis", "Docker", 
-            "Kubernetes", "AWS", "Azure", "GCP", "Linux", "Git", "HTML", "CSS", "PHP", "Ruby",
-            "C\\+\\+", "C#", "Swift", "Kotlin", "Go", "Rust", "TypeScript", "TensorFlow", 
-            "PyTorch", "Pandas", "NumPy", "SciPy", "Scikit-learn", "MATLAB", "R"
-        ]
-        
-        pattern = r"\b(" + "|".join(common_skills) + r")\b"
-        found_skills = re.findall(pattern, skill_text, re.IGNORECASE)
-        
-        # ✅ **添加找到的技能**
-        for skill in found_skills:
-            if skill not in skills:
-                skills.append(skill)
-    
-    # ✅ **如果在技能段落中没找到，在整个文本中搜索**
+def extract_skills(text, sections=None):
+    """提取技能信息：技能词典编译成的自动机一次扫描，先看技能段落，没有再看全文"""
+    matcher = get_skill_matcher()
+    if sections is None:
+        sections = segment_sections(text)
+
+    skills = matcher.find(sections["skills"]) if sections.get("skills") else []
     if not skills:
-        common_skills = [
-            "Python", "Java", "JavaScript", "React", "Vue", "Angular", "Node.js", "Express", 
-            "Django", "Flask", "SQL", "MySQL", "PostgreSQL", "MongoDB", "Redis", "Docker", 
-            "Kubernetes", "AWS", "Azure", "GCP", "Linux", "Git", "HTML", "CSS", "PHP", "Ruby",
-            "C\\+\\+", "C#", "Swift", "Kotlin", "Go", "Rust", "TypeScript", "TensorFlow", 
-            "PyTorch", "Pandas", "NumPy", "SciPy", "Scikit-learn", "MATLAB", "R", "Machine Learning", 
-            "Deep Learning", "AI", "Data Science", "Data Analysis", "Big Data", "Hadoop", "Spark"
-        ]
-        
-        pattern = r"\b(" + "|".join(common_skills) + r")\b"
-        found_skills = re.findall(pattern, text, re.IGNORECASE)
-        
-        for skill in found_skills:
-            if skill not in skills:
-                skills.append(skill)
+        skills = matcher.find(text)
     
     return skills if skills else ["General"]
 
 
 # ✅ **数据库路径**
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "database"))
-DB_PATH = os.path.join(BASE_DIR, "resumes.db")
+DB_PATH = RESUMES_DB_PATH
 
+DUPLICATE_POLICIES = ("replace", "merge")
 
-def save_to_db(parsed_resume):
-    """存储解析后的简历数据到 SQLite"""
-    try:
-        print(f"开始保存简历到数据库，解析结果：{parsed_resume}")
-        
-        if not os.path.exists(BASE_DIR):
-            os.makedirs(BASE_DIR)
-            print(f"创建数据库目录：{BASE_DIR}")
 
-        print(f"连接数据库：{DB_PATH}")
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+def hash_content(content: bytes) -> str:
+    """上传文件原始字节的哈希：同一份文件再次上传时直接复用已保存的解析结果"""
+    return hashlib.sha256(content).hexdigest()
 
-        # 创建 resumes 表（如果不存在）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS resumes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                email TEXT,
-                phone TEXT,
-                education TEXT,
-                skills TEXT
-            )
-        ''')
-        print("确保数据库表已创建")
 
-        # 插入数据
+def hash_fields(data) -> str:
+    """规范化后的解析字段哈希：内容相同的简历（即使文件不同）视为同一候选人"""
+    normalized = {
+        "name": " ".join((data["name"] or "").casefold().split()),
+        "email": (data["email"] or "").strip().casefold(),
+        "phone": re.sub(r"\D", "", data["phone"] or ""),
+        "education": sorted(" ".join(item.casefold().split()) for item in data["education"]),
+        "skills": sorted({skill.casefold() for skill in data["skills"]}),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _email_key(data):
+    email = (data["email"] or "").strip()
+    return email if email and email != "N/A" else None
+
+
+def _merge_lists(existing: str, new_items):
+    """保留已有条目顺序，追加新条目（不区分大小写去重）"""
+    items = [item for item in (existing or "").split("; ") if item]
+    seen = {item.casefold() for item in items}
+    for item in new_items:
+        if item.casefold() not in seen:
+            seen.add(item.casefold())
+            items.append(item)
+    return items
+
+
+def _resolve_duplicate(existing, data, policy: str = DUPLICATE_POLICY):
+    """
+    已有候选人行 existing = (id, name, email, phone, education, skills) 与新解析结果合并。
+    replace：新结果覆盖旧行；merge：联系方式缺失时沿用旧值，教育和技能取并集
+    """
+    if policy == "replace":
+        return data
+    if policy != "merge":
+        raise ValueError(f"❌ 不支持的重复简历策略：{policy}，可选：{', '.join(DUPLICATE_POLICIES)}")
+    _, name, email, phone, education, skills = existing
+    return {
+        "name": data["name"] if data["name"] not in (None, "", "Candidate") else name,
+        "email": data["email"] if _email_key(data) else email,
+        "phone": data["phone"] if data["phone"] not in (None, "", "N/A") else phone,
+        "education": _merge_lists(education, data["education"]),
+        "skills": _merge_lists(skills, data["skills"]),
+    }
+
+
+def _row_values(data):
+    return (data["name"], data["email"], data["phone"],
+            "; ".join(data["education"]), "; ".join(data["skills"]), hash_fields(data))
+
+
+def _upsert_resume_row(cursor, data, content_hash: str = None):
+    """
+    按邮箱或字段哈希查找已有候选人：存在则按 DUPLICATE_POLICY 更新该行，否则插入新行。
+    返回 (简历ID, 向量文本是否变化, 最终保存的字段)；文本没变时可以复用索引中已有的向量，
+    合并策略下索引要用最终保存的字段，而不是这次上传的
+    """
+    existing = None
+    email = _email_key(data)
+    if email:
+        cursor.execute("SELECT id, name, email, phone, education, skills FROM resumes "
+                       "WHERE email = ? ORDER BY id LIMIT 1", (email,))
+        existing = cursor.fetchone()
+    if existing is None:
+        cursor.execute("SELECT id, name, email, phone, education, skills FROM resumes "
+                       "WHERE fields_hash = ? ORDER BY id LIMIT 1", (hash_fields(data),))
+        existing = cursor.fetchone()
+
+    if existing:
+        resume_id = existing[0]
+        final = _resolve_duplicate(existing, data)
+        values = _row_values(final)
+        text_changed = (values[3], values[4]) != (existing[4], existing[5])
+        if values[:5] != tuple(existing[1:]):
+            cursor.execute('''
+                UPDATE resumes SET name = ?, email = ?, phone = ?, education = ?, skills = ?, fields_hash = ?
+                WHERE id = ?
+            ''', values + (resume_id,))
+            print(f"候选人已存在，已更新简历 ID：{resume_id}")
+        else:
+            print(f"候选人已存在且内容相同，复用简历 ID：{resume_id}")
+    else:
+        final = data
         cursor.execute('''
-            INSERT INTO resumes (name, email, phone, education, skills)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            parsed_resume["name"],
-            parsed_resume["email"],
-            parsed_resume["phone"],
-            "; ".join(parsed_resume["education"]),
-            "; ".join(parsed_resume["skills"])
-        ))
-        
-        # 获取新插入的简历ID
+            INSERT INTO resumes (name, email, phone, education, skills, fields_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', _row_values(data))
         resume_id = cursor.lastrowid
+        text_changed = True
         print(f"简历已插入数据库，ID：{resume_id}")
+
+    if content_hash:
+        _remember_upload(cursor, content_hash, resume_id, final)
+    return resume_id, text_changed, final
+
+
+def _remember_upload(cursor, content_hash: str, resume_id: int, parsed):
+    cursor.execute('''
+        INSERT OR REPLACE INTO resume_uploads (content_hash, resume_id, parsed) VALUES (?, ?, ?)
+    ''', (content_hash, resume_id, json.dumps(parsed, ensure_ascii=False)))
+
+
+def lookup_parsed_uploads(content_hashes):
+    """按原始文件哈希查找已保存的解析结果，返回 {哈希: (简历ID, 解析结果)}（候选人已删除的不算）"""
+    hashes = list(dict.fromkeys(content_hashes))
+    found = {}
+    cursor = get_connection(DB_PATH).cursor()
+    for start in range(0, len(hashes), 900):
+        chunk = hashes[start:start + 900]
+        cursor.execute(f'''
+            SELECT u.content_hash, u.resume_id, u.parsed
+            FROM resume_uploads u JOIN resumes r ON r.id = u.resume_id
+            WHERE u.content_hash IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        for content_hash, resume_id, parsed in cursor.fetchall():
+            found[content_hash] = (resume_id, json.loads(parsed))
+    return found
+
+
+def lookup_parsed_upload(content_hash: str):
+    """单个文件的解析缓存，没有返回 None"""
+    hit = lookup_parsed_uploads([content_hash]).get(content_hash)
+    return hit[1] if hit else None
+
+
+def save_resumes_batch(parsed_resumes, content_hashes=None):
+    """
+    批量保存解析后的简历：一个事务内按邮箱 / 字段哈希找出已有候选人（批内同一邮箱以最后一份为准），
+    已有候选人按 DUPLICATE_POLICY executemany UPDATE，新候选人 executemany INSERT。
+    返回 (与输入对齐的简历ID列表, 向量文本有变化的简历ID集合, 与输入对齐的最终保存字段列表)
+    """
+    content_hashes = content_hashes or [None] * len(parsed_resumes)
+    fields_hashes = [hash_fields(data) for data in parsed_resumes]
+
+    # 批内同一邮箱（或内容完全相同）只保留最后一份
+    last_by_key = {}
+    for i, data in enumerate(parsed_resumes):
+        last_by_key[_email_key(data) or fields_hashes[i]] = i
+
+    with transaction(DB_PATH) as cursor:
+        def fetch(column, keys):
+            """{列值: 该值对应的最早一行}"""
+            rows = {}
+            keys = list(keys)
+            for start in range(0, len(keys), 900):
+                chunk = keys[start:start + 900]
+                cursor.execute(f'''
+                    SELECT id, name, email, phone, education, skills, {column} FROM resumes
+                    WHERE id IN (SELECT MIN(id) FROM resumes WHERE {column} IN ({', '.join('?' * len(chunk))})
+                                 GROUP BY {column})
+                ''', chunk)
+                for row in cursor.fetchall():
+                    rows[row[6]] = row[:6]
+            return rows
+
+        by_email = fetch("email", {_email_key(data) for data in parsed_resumes if _email_key(data)})
+        by_fields = fetch("fields_hash", set(fields_hashes))
+
+        updates, inserts, insert_rows, changed = [], [], [], set()
+        final_by_row, existing_id = {}, {}
+        for i, data in enumerate(parsed_resumes):
+            key = _email_key(data) or fields_hashes[i]
+            if last_by_key[key] != i:
+                continue
+            existing = by_email.get(_email_key(data)) or by_fields.get(fields_hashes[i])
+            if existing:
+                final = _resolve_duplicate(existing, data)
+                values = _row_values(final)
+                if (values[3], values[4]) != (existing[4], existing[5]):
+                    changed.add(existing[0])
+                if values[:5] != tuple(existing[1:]):
+                    updates.append(values + (existing[0],))
+                existing_id[i] = existing[0]
+            else:
+                final = data
+                inserts.append(_row_values(data))
+                insert_rows.append(i)
+            final_by_row[i] = final
+
+        cursor.executemany('''
+            UPDATE resumes SET name = ?, email = ?, phone = ?, education = ?, skills = ?, fields_hash = ?
+            WHERE id = ?
+        ''', updates)
+
+        # 写事务内没有其他写入者：新插入的行就是 id 大于插入前最大 id 的那些（按插入顺序递增）
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM resumes")
+        max_id = cursor.fetchone()[0]
+        cursor.executemany('''
+            INSERT INTO resumes (name, email, phone, education, skills, fields_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', inserts)
+        cursor.execute("SELECT id FROM resumes WHERE id > ? ORDER BY id", (max_id,))
+        new_ids = [row[0] for row in cursor.fetchall()]
+        for i, resume_id in zip(insert_rows, new_ids):
+            existing_id[i] = resume_id
+            changed.add(resume_id)
+
+        # 批内被合并的重复简历返回同一候选人最终保存的ID和字段
+        rows = [last_by_key[_email_key(data) or fields_hashes[i]] for i, data in enumerate(parsed_resumes)]
+        ids = [existing_id[row] for row in rows]
+        finals = [final_by_row[row] for row in rows]
+        cursor.executemany(
+            "INSERT OR REPLACE INTO resume_uploads (content_hash, resume_id, parsed) VALUES (?, ?, ?)",
+            [(content_hash, resume_id, json.dumps(final, ensure_ascii=False))
+             for content_hash, resume_id, final in zip(content_hashes, ids, finals) if content_hash],
+        )
+
+    print(f"批量保存简历：新增 {len(inserts)} 份，更新 {len(updates)} 份")
+    return ids, changed, finals
+
+
+def save_to_db(parsed_resume, content_hash: str = None):
+    """存储解析后的简历数据到 SQLite（content_hash 为原始文件哈希，记录下来供再次上传时复用）"""
+    # ✅ 延迟导入：解析进程池里的子进程只做解析，不需要加载向量模型
+    from .matching import upsert_resume_in_index
+
+    try:
+        print(f"开始保存简历到数据库，解析结果：{parsed_resume}")
+
+        # 插入数据（同一邮箱的候选人原地更新）；表结构由启动时的迁移创建
+        with transaction(DB_PATH) as cursor:
+            resume_id, text_changed, final = _upsert_resume_row(cursor, parsed_resume, content_hash)
         
-        conn.commit()
-        conn.close()
-        
-        # 更新FAISS索引
+        # 更新FAISS索引（文本没变且索引里已有向量时直接复用）；用数据库里最终保存的字段
         try:
-            add_resume_to_index(
+            upsert_resume_in_index(
                 resume_id=resume_id,
-                education="; ".join(parsed_resume["education"]),
-                skills="; ".join(parsed_resume["skills"])
+                education="; ".join(final["education"]),
+                skills="; ".join(final["skills"]),
+                changed=text_changed,
             )
             print(f"✅ 简历已保存到数据库并更新FAISS索引")
             return resume_id
@@ -224,62 +438,27 @@ def save_to_db(parsed_resume):
             
     except Exception as e:
         print(f"❌ 保存简历到数据库失败: {str(e)}")
-        if 'conn' in locals():
-            conn.close()
         raise e
 
 
 def save_parsed_resume(parsed_data):
     """保存前端解析的简历数据到数据库"""
+    from .matching import upsert_resume_in_index
+
     try:
         print(f"准备保存前端解析的简历数据：{parsed_data['name']}")
-        
-        # 确保数据库目录存在
-        if not os.path.exists(BASE_DIR):
-            os.makedirs(BASE_DIR)
-            print(f"创建数据库目录：{BASE_DIR}")
 
-        # 连接数据库
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # 创建 resumes 表（如果不存在）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS resumes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT,
-                email TEXT,
-                phone TEXT,
-                education TEXT,
-                skills TEXT
-            )
-        ''')
-
-        # 插入数据
-        cursor.execute('''
-            INSERT INTO resumes (name, email, phone, education, skills)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            parsed_data["name"],
-            parsed_data["email"],
-            parsed_data["phone"],
-            "; ".join(parsed_data["education"]),
-            "; ".join(parsed_data["skills"])
-        ))
-        
-        # 获取新插入的简历ID
-        resume_id = cursor.lastrowid
-        print(f"简历已插入数据库，ID：{resume_id}")
+        # 插入数据（同一邮箱的候选人原地更新）
+        with transaction(DB_PATH) as cursor:
+            resume_id, text_changed, final = _upsert_resume_row(cursor, parsed_data)
         
-        conn.commit()
-        conn.close()
-        
-        # 更新FAISS索引
+        # 更新FAISS索引（内容与已保存的候选人相同时复用已有向量）；用数据库里最终保存的字段
         try:
-            add_resume_to_index(
+            upsert_resume_in_index(
                 resume_id=resume_id,
-                education="; ".join(parsed_data["education"]),
-                skills="; ".join(parsed_data["skills"])
+                education="; ".join(final["education"]),
+                skills="; ".join(final["skills"]),
+                changed=text_changed,
             )
             print(f"✅ 前端解析的简历已保存到数据库并更新FAISS索引")
             return resume_id
@@ -289,29 +468,96 @@ def save_parsed_resume(parsed_data):
             
     except Exception as e:
         print(f"❌ 保存前端解析的简历到数据库失败: {str(e)}")
-        if 'conn' in locals():
-            conn.close()
         raise e
 
 
-def parse_resume(content: bytes, filename: str):
-    """解析 TXT 和 PDF 简历"""
+def delete_resume(resume_id: int) -> bool:
+    """删除候选人、它的上传记录（同一文件再次上传时重新解析）和索引中的向量；不存在返回 False"""
+    from .matching import delete_resume_from_index
+
+    with transaction(DB_PATH) as cursor:
+        cursor.execute("DELETE FROM resumes WHERE id = ?", (resume_id,))
+        if cursor.rowcount == 0:
+            return False
+        cursor.execute("DELETE FROM resume_uploads WHERE resume_id = ?", (resume_id,))
+    delete_resume_from_index(resume_id)
+    print(f"✅ 已删除简历 ID {resume_id}")
+    return True
+
+
+def extract_resume_fields(content: bytes, filename: str):
+    """只解析 TXT 和 PDF 简历、不写数据库（纯 CPU 计算，可在进程池中执行）"""
+    return extract_resume_fields_timed(content, filename)[0]
+
+
+def _extract_text(content: bytes, filename: str):
+    """按扩展名提取文本，返回 (text, file_type)；不支持或超出限制时抛出 ValueError"""
     if filename.endswith(".txt"):
-        text = extract_text_from_txt(content)
-        file_type = "txt"
-    elif filename.endswith(".pdf"):
-        text = extract_text_from_pdf(content)
-        file_type = "pdf"
-    else:
-        return {"error": "Only .txt and .pdf files are supported"}
+        return extract_text_from_txt(content), "txt"
+    if filename.endswith(".pdf"):
+        return extract_text_from_pdf(content), "pdf"
+    raise ValueError("Only .txt and .pdf files are supported")
+
 
+def extract_resume_fields_timed(content: bytes, filename: str):
+    """同 extract_resume_fields，另外返回各阶段耗时（ms）：text_extract / field_extract / ner（需要时）"""
+    timings = {}
+    started = time.perf_counter()
+    try:
+        text, file_type = _extract_text(content, filename)
+    except ValueError as e:
+        return {"error": str(e)}, timings
+    timings["text_extract"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    sections = segment_sections(text)  # ✅ 教育和技能共用一次段落切分
     parsed_resume = {
-        "name": extract_name(text, file_type),  # ✅ **按不同文件类型解析姓名**
+        "name": extract_name(text, file_type, timings),  # ✅ **按不同文件类型解析姓名**
         "email": extract_email(text),
         "phone": extract_phone(text),
-        "education": extract_education(text),
-        "skills": extract_skills(text),
+        "education": extract_education(text, sections),
+        "skills": extract_skills(text, sections),
     }
+    timings["field_extract"] = (time.perf_counter() - started) * 1000
+    return parsed_resume, timings
+
+
+def extract_resume_fields_batch(items):
+    """批量解析 [(filename, content)]，返回对齐的解析结果列表（失败的文件为 {"error": ...}）"""
+    results = [None] * len(items)
+    texts, file_types, rows = [], [], []
+    for row, (filename, content) in enumerate(items):
+        try:
+            text, file_type = _extract_text(content, filename)
+        except Exception as e:
+            results[row] = {"error": str(e)}
+            continue
+        texts.append(text)
+        file_types.append(file_type)
+        rows.append(row)
+
+    # ✅ 需要 NER 的文档一起走 nlp.pipe（已在进程池子进程中，不再另开进程）
+    names = extract_names(texts, file_types, n_process=1)
+    for row, text, name in zip(rows, texts, names):
+        sections = segment_sections(text)
+        results[row] = {
+            "name": name,
+            "email": extract_email(text),
+            "phone": extract_phone(text),
+            "education": extract_education(text, sections),
+            "skills": extract_skills(text, sections),
+        }
+    return results
 
-    save_to_db(parsed_resume)  # ✅ 存入 `database/resumes.db`
+
+def parse_resume(content: bytes, filename: str):
+    """解析 TXT 和 PDF 简历（同一份文件再次上传时跳过 PDF 解析和 spaCy）"""
+    content_hash = hash_content(content)
+    parsed_resume = lookup_parsed_upload(content_hash)
+    if parsed_resume is None:
+        parsed_resume = extract_resume_fields(content, filename)
+        if "error" in parsed_resume:
+            return parsed_resume
+
+    save_to_db(parsed_resume, content_hash)  # ✅ 存入 `database/resumes.db`
     return parsed_resume
@@ -0,0 +1,114 @@
+from collections import deque
+
+# **技能词典匹配：把技能及其同义词编译成 Aho-Corasick 自动机，一次扫描找出全部技能**
+# 词典文件每行一个技能：`标准名 | 同义词1 | 同义词2`，# 开头为注释；
+# 用双引号括起来的写法区分大小写（"R"、"Go"），用于和普通单词同形的技能名
+
+
+def load_taxonomy(path: str):
+    """读取技能词典，返回 [(标准名, [写法...])]（区分大小写的写法保留双引号）"""
+    taxonomy = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            names = [name.strip() for name in line.split("|") if name.strip()]
+            taxonomy.append((_unquote(names[0])[0], names))
+    return taxonomy
+
+
+def _unquote(name: str):
+    """返回 (写法, 是否区分大小写)"""
+    if len(name) > 2 and name[0] == name[-1] == '"':
+        return name[1:-1], True
+    return name, False
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class SkillMatcher:
+    """按词边界匹配的多模式匹配器，默认不区分大小写（构建一次，线程安全只读）"""
+
+    def __init__(self, taxonomy):
+        # 状态 0 为根；goto[state] 是 {字符: 下一状态}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # 每个状态结束的 (模式长度, 标准名, 区分大小写时的原写法)
+        self.skills = []
+        for canonical, names in taxonomy:
+            self.skills.append(canonical)
+            for name in names:
+                name, case_sensitive = _unquote(name)
+                self._add(name.lower(), canonical, name if case_sensitive else None)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, canonical: str, exact: str = None):
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), canonical, exact))
+
+    def _build_failure_links(self):
+        # 广度优先：根的子节点失败指针指向根，其余节点沿父节点的失败链查找
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                # 失败链上结束的模式也在这里结束
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _iter_matches(self, text: str, original: str = None):
+        """
+        产出全部按词边界成立的匹配 (起点, 终点, 标准名)。text 是小写后的文本，
+        original 是与它逐字符对齐的原文（区分大小写的写法用它核对，为 None 时这些写法不匹配）
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, canonical, exact in output[state]:
+                start = end + 1 - length
+                if exact is not None and (original is None or original[start:end + 1] != exact):
+                    continue
+                if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                    continue
+                if end + 1 < len(text) and _is_word_char(text[end + 1]) and _is_word_char(text[end]):
+                    continue
+                yield start, end + 1, canonical
+
+    def find(self, text: str):
+        """返回文本中出现的技能标准名（按出现顺序去重）；重叠时取最左、最长的匹配"""
+        lowered = text.lower()
+        # 个别字符小写后长度会变（İ），这时位置对不上原文，区分大小写的写法不参与匹配
+        original = text if len(lowered) == len(text) else None
+        matches = sorted(self._iter_matches(lowered, original), key=lambda m: (m[0], -(m[1] - m[0])))
+        found, seen, last_end = [], set(), 0
+        for start, end, canonical in matches:
+            if start < last_end:
+                continue
+            last_end = end
+            if canonical not in seen:
+                seen.add(canonical)
+                found.append(canonical)
+        return found
+
+
+def load_skill_matcher(path: str) -> SkillMatcher:
+    return SkillMatcher(load_taxonomy(path))
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 测试用特征哈希编码器：确定性、不下载模型
+os.environ.setdefault("ENCODER_BACKEND", "hashing")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,38 @@
+import io
+import os
+import tempfile
+import time
+
+import pytest
+
+from service import bulk_ingest
+
+
+def test_spooled_archive_is_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    path = bulk_ingest.spool_archive(io.BytesIO(b"x" * 100), max_bytes=100)
+    with open(path, "rb") as f:
+        assert f.read() == b"x" * 100
+    os.remove(path)
+
+    # 超过上限：报错并删除临时文件，也不会把整个上传读完
+    source = io.BytesIO(b"x" * 10_000)
+    with pytest.raises(ValueError):
+        bulk_ingest.spool_archive(source, max_bytes=100)
+    assert os.listdir(tmp_path) == []
+    assert source.tell() == 101
+
+
+def test_finished_jobs_expire(monkeypatch):
+    monkeypatch.setattr(bulk_ingest, "INGEST_JOB_TTL", 60)
+    now = time.time()
+    jobs = {
+        "old": {"id": "old", "status": "done", "finished_at": now - 120},
+        "recent": {"id": "recent", "status": "failed", "finished_at": now - 10},
+        "running": {"id": "running", "status": "running", "finished_at": None},
+    }
+    monkeypatch.setattr(bulk_ingest, "_jobs", dict(jobs))
+    assert bulk_ingest.get_job("old") is None
+    assert bulk_ingest.get_job("recent") == jobs["recent"]
+    assert bulk_ingest.get_job("running") == jobs["running"]
+    assert set(bulk_ingest._jobs) == {"recent", "running"}
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+import database.db_utils as db
+from service import hydration
+
+
+@pytest.fixture
+def resumes_db(tmp_path, monkeypatch):
+    path = str(tmp_path / os.path.basename(db.RESUMES_DB_PATH))
+    monkeypatch.setattr(db, "MIGRATIONS", {path: db.MIGRATIONS[db.RESUMES_DB_PATH]})
+    monkeypatch.setattr(hydration, "RESUMES_DB_PATH", path)
+    return path
+
+
+def test_hydration_keeps_hit_order_and_marks_missing_ids(resumes_db, monkeypatch):
+    with db.transaction(resumes_db) as cursor:
+        cursor.executemany("INSERT INTO resumes (id, name, email, phone, education, skills) VALUES (?, ?, '', '', '', '')",
+                           [(i, f"候选人{i}") for i in range(1, 21)])
+    # 分批查询（每批 3 个绑定参数）也要按 FAISS 排名顺序返回，重复的 ID 各自补全
+    monkeypatch.setattr(hydration, "MAX_SQL_VARIABLES", 3)
+    ids = [17, 3, 99, 8, 3, 20, 1]
+    resumes = hydration.hydrate_resumes(ids)
+    assert [resume and resume["name"] for resume in resumes] == [
+        "候选人17", "候选人3", None, "候选人8", "候选人3", "候选人20", "候选人1",
+    ]
+    assert hydration.hydrate_resumes([]) == []
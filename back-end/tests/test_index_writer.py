@@ -0,0 +1,218 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import numpy as np
+import pytest
+
+from service import index_writer
+from service.index_manager import load_id_index
+from service.index_writer import MutableIndex, _RECORD_HEADER
+
+BACK_END = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DIM = 8
+
+
+def _open(tmp_path, **kwargs):
+    return MutableIndex(
+        "测试", str(tmp_path / "r.faiss"), str(tmp_path / "ids.npy"), str(tmp_path / "r.wal"),
+        commit_batch_size=16, commit_max_wait_ms=1, snapshot_every=10_000, snapshot_interval=3600,
+        check_interval=kwargs.pop("check_interval", 0.05), **kwargs,
+    )
+
+
+def _vector(seed):
+    return np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+
+
+def _run(tmp_path, body):
+    """在子进程里打开同一份索引执行 body，然后不落盘快照直接退出（模拟崩溃）"""
+    script = textwrap.dedent(f"""
+        import os, sys
+        import numpy as np
+        sys.path.insert(0, {BACK_END!r})
+        from service.index_writer import MutableIndex
+        index = MutableIndex("测试", {str(tmp_path / "r.faiss")!r}, {str(tmp_path / "ids.npy")!r},
+                             {str(tmp_path / "r.wal")!r}, 16, 1, 10_000, 3600, check_interval=0.05)
+        vector = lambda seed: np.random.default_rng(seed).standard_normal({DIM}).astype(np.float32)
+    """) + textwrap.dedent(body) + "\nsys.stdout.flush()\nos._exit(0)\n"
+    return subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_log_is_replayed_after_crash(tmp_path):
+    _run(tmp_path, """
+        for i in range(1, 6):
+            index.upsert(i, vector(i))
+        index.delete(3)
+    """)
+    assert not os.path.exists(tmp_path / "r.faiss")  # 没有快照，只有日志
+
+    index = _open(tmp_path)
+    snapshot = index.get()
+    assert snapshot.index.ntotal == 4
+    np.testing.assert_allclose(snapshot.index.reconstruct(2), _vector(2))
+    with pytest.raises(RuntimeError):
+        snapshot.index.reconstruct(3)
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    _run(tmp_path, """
+        index.upsert(1, vector(1))
+        index.upsert(2, vector(2))
+    """)
+    log_path = tmp_path / "r.wal"
+    complete = os.path.getsize(log_path)
+    with open(log_path, "ab") as f:
+        f.write(_RECORD_HEADER.pack(b"U", 3, DIM) + _vector(3).tobytes()[:10])
+
+    index = _open(tmp_path)
+    assert index.get().index.ntotal == 2
+    assert os.path.getsize(log_path) == complete
+    # 截断后继续追加的记录能正常重放
+    index.upsert(4, _vector(4))
+    assert index.get().index.ntotal == 3
+
+
+def test_invalid_vectors_never_reach_the_log(tmp_path):
+    index = _open(tmp_path)
+    index.upsert(1, _vector(1))
+    size = os.path.getsize(tmp_path / "r.wal")
+    with pytest.raises(ValueError):
+        index.upsert(2, np.ones(DIM + 1, dtype=np.float32))
+    with pytest.raises(ValueError):
+        index.upsert(3, np.full(DIM, np.nan, dtype=np.float32))
+    assert os.path.getsize(tmp_path / "r.wal") == size
+
+
+def test_snapshot_is_written_before_log_is_truncated(tmp_path, monkeypatch):
+    index = _open(tmp_path)
+    for i in range(1, 4):
+        index.upsert(i, _vector(i))
+    log_size = os.path.getsize(tmp_path / "r.wal")
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    # 快照写失败：日志必须原样保留
+    monkeypatch.setattr(index_writer, "write_index_file", fail)
+    with pytest.raises(OSError):
+        index._snapshot()
+    assert os.path.getsize(tmp_path / "r.wal") == log_size
+    monkeypatch.undo()
+
+    index._snapshot()
+    assert os.path.getsize(tmp_path / "r.wal") == 0
+    assert load_id_index(str(tmp_path / "r.faiss")).ntotal == 3
+
+
+def test_log_is_kept_while_a_rebuild_is_running(tmp_path):
+    index = _open(tmp_path)
+    index.upsert(1, _vector(1))
+    with index.rebuilding():
+        index._snapshot()
+        assert os.path.getsize(tmp_path / "r.wal") > 0
+        assert not os.path.exists(tmp_path / "r.faiss")
+
+
+def test_other_process_hands_writes_to_the_owner(tmp_path):
+    index = _open(tmp_path)
+    index.upsert(1, _vector(1))
+    assert index.owner
+
+    out = _run(tmp_path, """
+        print(index.owner, index.upsert(2, vector(2)), index.get().index.ntotal)
+    """)
+    # 交出去的写入在本进程立即可见
+    assert out.split()[-3:] == ["False", "False", "2"]
+    # 提交成功后才删除收件箱里的文件
+    assert _wait_for(lambda: os.listdir(tmp_path / "r.wal.inbox") == [])
+    assert index.get().index.ntotal == 2
+
+
+def test_rebuild_from_other_process_keeps_concurrent_writes(tmp_path):
+    index = _open(tmp_path)
+    index.upsert(1, _vector(1))
+
+    _run(tmp_path, """
+        from service.index_manager import new_id_index, apply_changes
+        with index.rebuilding():
+            rebuilt = new_id_index({DIM})
+            apply_changes(rebuilt, [10, 11], np.stack([vector(10), vector(11)]), [])
+            index.replace(rebuilt)
+    """.replace("{DIM}", str(DIM)))
+    # 重建结果换上后，日志里重建期间的写入（ID 1）也在；换上之后才落盘快照、删除 .rebuilt、截断日志
+    assert _wait_for(lambda: not os.path.exists(tmp_path / "r.faiss.rebuilt")
+                     and os.path.getsize(tmp_path / "r.wal") == 0)
+    assert index.get().index.ntotal == 3
+    assert load_id_index(str(tmp_path / "r.faiss")).ntotal == 3
+
+
+def test_reader_replays_only_the_new_log_tail(tmp_path):
+    owner = _open(tmp_path)
+    for i in range(1, 4):
+        owner.upsert(i, _vector(i))
+    owner._snapshot()
+    reader = _open(tmp_path)
+    assert not reader.owner and reader.get().index.ntotal == 3
+
+    loads = []
+    full_load = reader._load
+    reader._load = lambda: loads.append(1) or full_load()
+    owner.upsert(4, _vector(4))
+    owner.delete(1)
+    assert _wait_for(lambda: reader.get().index.ntotal == 3 and 4 in _ids(reader))
+    assert loads == []  # 只读了日志新追加的部分
+
+    # 写入进程换了快照、截断日志之后重新加载一次
+    owner._snapshot()
+    owner.upsert(5, _vector(5))
+    assert _wait_for(lambda: _ids(reader) == {2, 3, 4, 5})
+    assert len(loads) == 1
+
+
+def test_reader_listeners_see_replayed_changes_but_not_owner_callbacks(tmp_path):
+    owner = _open(tmp_path)
+    owner.upsert(1, _vector(1))
+    reader = _open(tmp_path)
+    assert not reader.owner and reader.get().index.ntotal == 1
+
+    upserted, deleted, owner_only, reloads = set(), set(), [], []
+    reader.add_change_listener(lambda ids, vectors, removed: upserted.update(ids) or deleted.update(removed),
+                               every_process=True)
+    reader.add_change_listener(lambda *args: owner_only.append(args))
+    reader.add_listener(lambda snapshot: reloads.append(snapshot.version), reloads_only=True)
+
+    owner.upsert(2, _vector(2))
+    owner.delete(1)
+    assert _wait_for(lambda: reader.get() is not None and upserted == {2} and deleted == {1})
+    assert owner_only == [] and reloads == []
+
+    # 快照换了之后整体重新加载：只通知 reloads_only 的回调
+    owner._snapshot()
+    owner.upsert(3, _vector(3))
+    assert _wait_for(lambda: reader.get() is not None and reloads)
+    assert owner_only == []
+
+
+def _ids(index):
+    snapshot = index.get()
+    return {item_id for item_id in range(1, 10) if _has(snapshot.index, item_id)}
+
+
+def _has(index, item_id):
+    try:
+        index.reconstruct(item_id)
+        return True
+    except RuntimeError:
+        return False
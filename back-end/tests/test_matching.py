@@ -0,0 +1,196 @@
+import os
+
+import numpy as np
+import pytest
+
+import database.db_utils as db
+from service import hydration, job_store, materialize, matching, resume_parser
+from service.attribute_filters import AttributeIndex, exact_scan
+from service.index_manager import build_id_index, load_id_index
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """数据库和索引目录都指向临时目录，索引在第一次使用时重新创建"""
+    paths = {name: str(tmp_path / os.path.basename(getattr(db, name)))
+             for name in ("JOBS_DB_PATH", "RESUMES_DB_PATH", "MATCHES_DB_PATH")}
+    monkeypatch.setattr(db, "MIGRATIONS", {paths[name]: db.MIGRATIONS[getattr(db, name)] for name in paths})
+    for module in (matching, hydration, materialize, job_store):
+        for name, path in paths.items():
+            if hasattr(module, name):
+                monkeypatch.setattr(module, name, path)
+    monkeypatch.setattr(resume_parser, "DB_PATH", paths["RESUMES_DB_PATH"])
+    # 职位表来自外部导入，没有迁移
+    with db.transaction(paths["JOBS_DB_PATH"]) as cursor:
+        cursor.execute("CREATE TABLE jobs (id INTEGER, job_title TEXT, company_name TEXT, location TEXT, "
+                       "job_description TEXT, job_type TEXT, categories TEXT, industry TEXT)")
+    for name in ("job_attributes", "resume_attributes"):
+        attributes = getattr(matching, name)
+        monkeypatch.setattr(matching, name, AttributeIndex(
+            attributes.name, paths["JOBS_DB_PATH" if name == "job_attributes" else "RESUMES_DB_PATH"],
+            attributes.sql, attributes.extract, attributes.attributes, attributes.override_limit))
+    monkeypatch.setattr(matching, "BASE_DIR", str(tmp_path))
+    for name in ("job_index", "resume_index", "job_reranker", "resume_reranker", "job_groups"):
+        monkeypatch.setattr(matching, name, None)
+    matching.result_cache.clear()
+    matching.embedding_cache.clear()
+    yield paths
+    matching.close_indexes()
+    # 提交回调排进预计算写线程的任务在恢复路径之前跑完
+    materialize._worker.submit(lambda: None).result()
+
+
+def _add_resume(paths, resume_id, education, skills):
+    with db.transaction(paths["RESUMES_DB_PATH"]) as cursor:
+        cursor.execute("INSERT OR REPLACE INTO resumes (id, name, email, phone, education, skills) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", (resume_id, f"候选人{resume_id}", "", "", education, skills))
+    matching.upsert_resume_in_index(resume_id, education, skills)
+
+
+def _add_job(job_id, title, description, **columns):
+    return job_store.save_job(job_id, dict(columns, job_title=title, job_description=description))
+
+
+def _ids(results):
+    return [result["id"] for result in results]
+
+
+def test_result_cache_keys_follow_the_index_version(env):
+    _add_resume(env, 1, "本科", "java; spring")
+    _add_resume(env, 2, "硕士", "excel; finance")
+    _add_resume(env, 3, "本科", "react; css")
+
+    first, _ = matching.match_candidates_page(["python", "sql"], "本科", top_k=2)
+    assert matching.match_candidates_page(["sql", "python"], "本科", top_k=2)[0] is first  # 规范化后同一个 key
+    cached = len(matching.result_cache)
+
+    # 新写入让索引换了版本：同一查询重新计算，旧版本的条目留在缓存里而不是被整体清空
+    _add_resume(env, 4, "本科", "python; sql")
+    second, _ = matching.match_candidates_page(["python", "sql"], "本科", top_k=2)
+    assert 4 not in _ids(first)
+    assert _ids(second)[0] == 4
+    assert len(matching.result_cache) == cached + 1
+
+
+def test_job_writes_go_through_the_index_log(env):
+    _add_job(1, "python", "sql django")
+    _add_job(2, "accountant", "excel finance")
+    # 单条写入只追加日志，不复制、重写整个索引文件
+    assert os.path.getsize(matching.JOB_INDEX_LOG_PATH) > 0
+    assert not os.path.exists(matching.JOB_FAISS_INDEX_PATH)
+    assert _ids(matching.match_jobs_page(["python", "sql", "django"], top_k=1)[0]) == [1]
+
+    matching.delete_job_from_index(1)
+    assert _ids(matching.match_jobs_page(["python", "sql", "django"], top_k=2)[0]) == [2]
+    matching.job_index.close()
+    assert os.path.getsize(matching.JOB_INDEX_LOG_PATH) == 0
+    assert load_id_index(matching.JOB_FAISS_INDEX_PATH).ntotal == 1
+
+
+def test_job_and_resume_endpoints_update_the_index(env):
+    assert _add_job(1, "python", "sql django")
+    assert not _add_job(1, "accountant", "excel finance", location="Remote")  # 同一 ID 原地替换
+    assert db.get_connection(env["JOBS_DB_PATH"]).execute("SELECT COUNT(*), MAX(location) FROM jobs").fetchone() \
+        == (1, "Remote")
+    assert _ids(matching.match_jobs_page(["excel", "finance"], top_k=1)[0]) == [1]
+
+    assert job_store.delete_job(1)
+    assert not job_store.delete_job(1)
+    assert matching.job_index.get().index.ntotal == 0
+
+    with db.transaction(env["RESUMES_DB_PATH"]) as cursor:
+        resume_id, _, _ = resume_parser._upsert_resume_row(
+            cursor, {"name": "张三", "email": "a@example.com", "phone": "", "education": ["本科"], "skills": ["python"]},
+            content_hash="abc")
+    matching.upsert_resume_in_index(resume_id, "本科", "python")
+    assert resume_parser.delete_resume(resume_id)
+    assert not resume_parser.delete_resume(resume_id)
+    assert not matching.resume_in_index(resume_id)
+    assert resume_parser.lookup_parsed_upload("abc") is None
+    assert db.get_connection(env["RESUMES_DB_PATH"]).execute("SELECT COUNT(*) FROM resume_uploads").fetchone() == (0,)
+
+
+def test_replaced_job_index_is_written_atomically(env):
+    _add_job(1, "python", "sql django")
+    with db.transaction(env["JOBS_DB_PATH"]) as cursor:
+        cursor.execute("INSERT INTO jobs (id, job_title, job_description) VALUES (7, 'accountant', 'excel finance')")
+    vector = matching.encoder.encode("accountant excel finance").reshape(1, -1)
+    matching.replace_job_index(build_id_index(vector, [7]))
+    # 替换时落盘快照（临时文件 fsync 后 rename），日志里替换前的写入也补上
+    assert not any(name.endswith(".tmp") for name in os.listdir(matching.INDEX_DIR))
+    assert load_id_index(matching.JOB_FAISS_INDEX_PATH).ntotal == 2
+    assert os.path.getsize(matching.JOB_INDEX_LOG_PATH) == 0
+    assert _ids(matching.match_jobs_page(["accountant", "excel", "finance"], top_k=1)[0]) == [7]
+
+
+def test_duplicate_jobs_collapse_and_still_fill_top_k(env, tmp_path, monkeypatch):
+    monkeypatch.setattr(matching, "BUILD_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    # 每个查询只预取 top_k 个候选：排在前面的转发职位占满第一轮，去重后要继续向深处搜索补足
+    monkeypatch.setattr(matching, "SEARCH_OVERFETCH", 1)
+    rows = [(job_id, "Python Developer", "Acme", "python sql django") for job_id in range(1, 6)]
+    rows += [(6, "python developer!", "ACME", "python sql django"),  # 规范化后同一个键
+             (7, "Python Developer", "Initech", "python sql django"),
+             (8, "Data Engineer", "Acme", "python sql spark"),
+             (9, "Accountant", "Acme", "excel finance")]
+    with db.transaction(env["JOBS_DB_PATH"]) as cursor:
+        cursor.executemany("INSERT INTO jobs (id, job_title, company_name, job_description) VALUES (?, ?, ?, ?)", rows)
+    matching.build_job_index(workers=1, resume=False)
+
+    def groups(results):
+        # 同组职位向量相同、分数相同，返回哪一个都可以
+        return sorted(1 if job_id <= 6 else job_id for job_id in _ids(results))
+
+    query = ["python", "sql", "django"]
+    page, _ = matching.match_jobs_page(query, top_k=3)
+    assert groups(page) == [1, 7, 8]
+    assert [_ids(row) for row in matching.match_jobs_batch([query], top_k=3)] == [_ids(page)]
+
+    # 翻页也不会再返回同组的其他职位
+    first, cursor = matching.match_jobs_page(query, top_k=2)
+    rest, _ = matching.match_jobs_page(query, top_k=5, cursor=cursor)
+    assert groups(first + rest) == [1, 7, 8, 9]
+
+
+def test_filtered_results_match_an_exact_scan(env, monkeypatch):
+    words = ["python", "sql", "django", "excel", "finance", "react", "css", "java", "spring", "docker"]
+    for job_id in range(1, 41):
+        # 描述长度各不相同，分数不会并列
+        _add_job(job_id, words[job_id % 10], f"{words[job_id % 7]} {words[job_id % 3]} {'team ' * job_id}",
+                 location="Remote; Toronto" if job_id % 4 == 0 else "Toronto", job_type="Full-time")
+    _add_job(41, "python", "sql django", location="Toronto", job_type="Contract")
+    _add_job(41, "python", "sql django", location="Remote", job_type="Contract")  # 修改后过滤位图随之更新
+    remote = [job_id for job_id in range(1, 42) if job_id % 4 == 0 or job_id == 41]
+
+    query = ["python", "sql", "django"]
+    filters = {"location": ["remote"], "job_type": ["Full-time", "Contract"]}
+    expected_scores, expected_ids = exact_scan(matching.job_index.get().index, matching.job_reranker,
+                                               matching.encode_query(query), np.asarray(remote), 5)
+    # 位图传给 FAISS（IDSelector）和过滤后直接精确扫描两条路径，都与对过滤后的 ID 逐个打分一致
+    for exact_scan_max in (0, 1000):
+        monkeypatch.setattr(matching, "FILTER_EXACT_SCAN_MAX", exact_scan_max)
+        matching.result_cache.clear()
+        page, _ = matching.match_jobs_page(query, top_k=5, filters=filters)
+        assert _ids(page) == expected_ids[0].tolist()
+        np.testing.assert_allclose([job["similarity"] for job in page], expected_scores[0], rtol=1e-5)
+    assert expected_ids[0][0] == 41
+
+
+def test_batch_results_equal_single_query_results(env):
+    words = ["python", "sql", "django", "excel", "finance", "react", "css", "java", "spring", "docker"]
+    for item_id in range(1, 31):
+        text = f"{words[item_id % 10]}; {words[item_id % 7]}; {'team ' * item_id}"
+        _add_job(item_id, words[item_id % 3], text, location="Remote" if item_id % 2 else "Toronto")
+        _add_resume(env, item_id, "MSc Computer Science" if item_id % 3 else "BSc Mathematics", text)
+
+    # 批量查询一次编码、一次 nq>1 搜索、一次补全，结果（包括重复的查询）与逐条查询完全一致
+    queries = [["python", "sql"], ["excel", "finance"], ["react"], ["python", "sql"], ["nothing", "matches"]]
+    for filters in (None, {"location": ["Remote"]}):
+        batch = matching.match_jobs_batch(queries, top_k=4, filters=filters)
+        assert batch == [matching.match_jobs_page(skills, top_k=4, filters=filters)[0] for skills in queries]
+
+    requirements = list(zip(queries, ["bachelor", "master", "", "master", "bachelor"]))
+    for filters in (None, {"degree": ["master"]}):
+        batch = matching.match_candidates_batch(requirements, top_k=4, filters=filters)
+        assert batch == [matching.match_candidates_page(skills, education, top_k=4, filters=filters)[0]
+                         for skills, education in requirements]
+        assert all(len(results) == 4 for results in batch)
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+import database.db_utils as db
+from service import embedding_store, materialize
+
+TOP_N, DIM = 5, 16
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """三个库都指向临时目录；向量以 float16 存储，增量更新时传入同样精度的向量"""
+    paths = {name: str(tmp_path / os.path.basename(getattr(db, name)))
+             for name in ("JOBS_DB_PATH", "RESUMES_DB_PATH", "MATCHES_DB_PATH")}
+    monkeypatch.setattr(db, "MIGRATIONS", {paths[name]: db.MIGRATIONS[getattr(db, name)] for name in paths})
+    for name, path in paths.items():
+        monkeypatch.setattr(materialize, name, path)
+    monkeypatch.setattr(materialize, "sentence_model_id", lambda: "test")
+    monkeypatch.setattr(materialize, "_state", {"job_ids": None, "job_vectors": None, "job_thresholds": None})
+    return paths
+
+
+def _unit(rng, n):
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.asarray(vectors, dtype=np.float16).astype(np.float32)
+
+
+def _save(path, table, ids, vectors):
+    embedding_store.save_vectors(path, table, "test", ids, ["h"] * len(ids), vectors)
+
+
+def _lists():
+    conn = db.get_connection(materialize.MATCHES_DB_PATH)
+    return {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall()) for table in db.MATCH_TABLES}
+
+
+def _drain():
+    materialize._worker.submit(lambda: None).result()
+
+
+def test_incremental_updates_match_a_full_refresh(stores):
+    rng = np.random.default_rng(0)
+    job_ids, resume_ids = list(range(1, 81)), list(range(1, 121))
+    _save(stores["JOBS_DB_PATH"], embedding_store.JOB_EMBEDDINGS_TABLE, job_ids, _unit(rng, len(job_ids)))
+    _save(stores["RESUMES_DB_PATH"], embedding_store.RESUME_EMBEDDINGS_TABLE, resume_ids, _unit(rng, len(resume_ids)))
+    materialize.refresh_all(TOP_N, 32)
+
+    # 新简历、修改的简历、新职位、修改的职位、删除
+    changed_resumes, vectors = [121, 122, 5, 6], _unit(rng, 4)
+    _save(stores["RESUMES_DB_PATH"], embedding_store.RESUME_EMBEDDINGS_TABLE, changed_resumes, vectors)
+    materialize.on_resumes_changed(changed_resumes, vectors)
+    changed_jobs, vectors = [81, 7], _unit(rng, 2)
+    _save(stores["JOBS_DB_PATH"], embedding_store.JOB_EMBEDDINGS_TABLE, changed_jobs, vectors)
+    materialize.on_jobs_changed(changed_jobs, vectors)
+    embedding_store.delete_vectors(stores["RESUMES_DB_PATH"], embedding_store.RESUME_EMBEDDINGS_TABLE, [10])
+    materialize.on_resumes_deleted([10])
+    embedding_store.delete_vectors(stores["JOBS_DB_PATH"], embedding_store.JOB_EMBEDDINGS_TABLE, [20])
+    materialize.on_jobs_deleted([20])
+    _drain()
+    incremental = _lists()
+    assert {row[0] for row in incremental["resume_top_jobs"]} == set(range(1, 123)) - {10}
+
+    materialize.refresh_all(TOP_N, 32)
+    full = _lists()
+    for table in db.MATCH_TABLES:
+        assert [row[:2] for row in incremental[table]] == [row[:2] for row in full[table]], table
+        np.testing.assert_allclose([row[2] for row in incremental[table]], [row[2] for row in full[table]],
+                                   rtol=1e-5, atol=1e-5)
+
+
+def test_read_top_is_ordered_by_score(stores):
+    rng = np.random.default_rng(1)
+    jobs, resumes = _unit(rng, 10), _unit(rng, 30)
+    _save(stores["JOBS_DB_PATH"], embedding_store.JOB_EMBEDDINGS_TABLE, list(range(1, 11)), jobs)
+    _save(stores["RESUMES_DB_PATH"], embedding_store.RESUME_EMBEDDINGS_TABLE, list(range(1, 31)), resumes)
+    materialize.refresh_all(TOP_N, 8)
+
+    expected = (np.argsort(-(resumes @ jobs[0]), kind="stable")[:TOP_N] + 1).tolist()
+    rows = materialize.read_top("job_top_candidates", 1, TOP_N)
+    assert [resume_id for resume_id, _ in rows] == expected
+    assert [score for _, score in rows] == sorted((score for _, score in rows), reverse=True)
@@ -0,0 +1,78 @@
+import faiss
+import numpy as np
+import pytest
+
+from service.dedup import RankedResults
+from service.pagination import CursorStore, MatchSession
+
+N, DIM = 60, 16
+
+
+@pytest.fixture
+def corpus():
+    vectors = np.random.default_rng(0).standard_normal((N, DIM)).astype(np.float32)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(DIM))
+    index.add_with_ids(vectors, np.arange(1, N + 1, dtype=np.int64))
+    query = np.random.default_rng(1).standard_normal((1, DIM)).astype(np.float32)
+    expected = (np.argsort(-(vectors @ query[0]), kind="stable") + 1).tolist()
+    return index, query, expected
+
+
+def _open_session(store, index, query, searched):
+    def make_search():
+        def search(k):
+            searched.append(k)
+            return index.search(query, k)
+        return search, index.ntotal
+
+    return store.open("query", lambda: MatchSession("jobs", RankedResults(make_search, 2, 16)))
+
+
+def _hydrate(ids):
+    return [{"id": item_id} for item_id in ids]
+
+
+def test_cursor_pages_resume_where_the_last_page_stopped(corpus):
+    index, query, expected = corpus
+    store, searched = CursorStore(16, 60), []
+    session, position = _open_session(store, index, query, searched), 0
+    seen = []
+    while True:
+        hits, position, more = session.results.page(position, 7, _hydrate)
+        seen += [item_id for item_id, _, _ in hits]
+        if not more:
+            break
+        session, position = store.resume(store.cursor(session, position), "jobs")
+    assert seen == expected
+
+
+def test_cursor_beyond_issued_pages_is_rejected(corpus):
+    index, query, _ = corpus
+    store, searched = CursorStore(16, 60), []
+    session = _open_session(store, index, query, searched)
+    _, position, _ = session.results.page(0, 5, _hydrate)
+    cursor = store.cursor(session, position)
+
+    assert store.resume(cursor, "jobs") == (session, position)
+    for forged in (f"{session.id}.{position + 1}", f"{session.id}.99999999"):
+        with pytest.raises(ValueError):
+            store.resume(forged, "jobs")
+    # 伪造的游标不会触发向深处搜索
+    assert max(searched) < index.ntotal
+
+
+def test_cursor_of_other_kind_or_expired_session_is_rejected(corpus):
+    index, query, _ = corpus
+    store = CursorStore(16, 60)
+    session = _open_session(store, index, query, [])
+    cursor = store.cursor(session, 0)
+    with pytest.raises(ValueError):
+        store.resume(cursor, "candidates")
+    for bad in ("", "nope.0", f"{session.id}.x"):
+        with pytest.raises(ValueError):
+            store.resume(bad, "jobs")
+
+    store.clear()
+    assert not store.alive(cursor)
+    with pytest.raises(ValueError):
+        store.resume(cursor, "jobs")
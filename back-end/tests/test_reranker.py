@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+
+from service.reranker import ExactReranker, _decode_updates, rerank_updates_path, write_rerank_vectors
+
+DIM = 8
+
+
+def _unit(seed):
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _open(index_path):
+    reranker = ExactReranker(index_path)
+    reranker.reload_if_changed()
+    return reranker
+
+
+def test_updates_survive_a_restart_and_reach_other_processes(tmp_path):
+    index_path = str(tmp_path / "r.faiss")
+    write_rerank_vectors(index_path, [2, 1], np.stack([_unit(2), _unit(1)]))
+    writer, reader = _open(index_path), _open(index_path)
+
+    writer.update_many([2, 3], np.stack([_unit(20), _unit(3)]))
+    # 另一个进程不用重新加载就能读到；重启后的进程也能读到
+    for reranker in (reader, _open(index_path)):
+        vectors = reranker.lookup([1, 2, 3, 4])
+        np.testing.assert_array_equal(vectors[0], _unit(1))
+        np.testing.assert_array_equal(vectors[1], _unit(20))
+        np.testing.assert_array_equal(vectors[2], _unit(3))
+        assert vectors[3] is None
+
+    # 更新过的 ID 按新向量精确重排，而不是沿用构建时的向量
+    scores, ids = _open(index_path).rerank(_unit(20), [1, 2], [0.9, 0.1], 2)
+    assert ids.tolist() == [2, 1]
+    assert abs(scores[0] - 1.0) < 1e-5
+
+
+def test_rebuild_keeps_only_updates_newer_than_the_build(tmp_path):
+    index_path = str(tmp_path / "r.faiss")
+    write_rerank_vectors(index_path, [1, 2], np.stack([_unit(1), _unit(2)]))
+    reranker = _open(index_path)
+    reranker.update_many([2], _unit(20).reshape(1, -1))
+
+    # 重建读到了 ID 2 的新向量；重建期间 ID 1 又被更新
+    reranker.update_many([1], _unit(10).reshape(1, -1))
+    write_rerank_vectors(index_path, [1, 2], np.stack([_unit(1), _unit(20)]))
+    os.utime(index_path.replace(".faiss", ".rerank_ids.npy"), ns=(1, 1))  # 保证文件戳变化
+    reranker.reload_if_changed()
+
+    with open(rerank_updates_path(index_path), "rb") as f:
+        updates, _ = _decode_updates(f.read())
+    assert list(updates) == [1]
+    vectors = reranker.lookup([1, 2])
+    np.testing.assert_array_equal(vectors[0], _unit(10))
+    np.testing.assert_array_equal(vectors[1], _unit(20))
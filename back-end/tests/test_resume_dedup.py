@@ -0,0 +1,61 @@
+import functools
+import os
+
+import pytest
+
+import database.db_utils as db
+from service import resume_parser
+
+
+@pytest.fixture
+def resumes_db(tmp_path, monkeypatch):
+    path = str(tmp_path / os.path.basename(db.RESUMES_DB_PATH))
+    monkeypatch.setattr(db, "MIGRATIONS", {path: db.MIGRATIONS[db.RESUMES_DB_PATH]})
+    monkeypatch.setattr(resume_parser, "DB_PATH", path)
+    return path
+
+
+def _resume(email, skills, phone="N/A", name="Jane Doe"):
+    return {"name": name, "email": email, "phone": phone, "education": ["BSc, University of Toronto"],
+            "skills": skills}
+
+
+def _row(path, resume_id):
+    return db.get_connection(path).execute(
+        "SELECT name, phone, skills FROM resumes WHERE id = ?", (resume_id,)).fetchone()
+
+
+def test_replace_policy_overwrites_the_same_candidate(resumes_db):
+    (first,), changed, _ = resume_parser.save_resumes_batch([_resume("jane@example.com", ["Python"], "555-0100")])
+    assert changed == {first}
+
+    # 同一邮箱：原地覆盖；批内同一邮箱以最后一份为准
+    ids, changed, finals = resume_parser.save_resumes_batch([
+        _resume("jane@example.com", ["Java"]),
+        _resume("jane@example.com", ["SQL"]),
+    ])
+    assert ids == [first, first]
+    assert changed == {first}
+    assert finals[0]["skills"] == ["SQL"]
+    assert _row(resumes_db, first) == ("Jane Doe", "N/A", "SQL")
+
+    # 没有邮箱时按解析字段哈希判断：内容相同的简历（即使文件不同）复用同一行，向量文本没变
+    (other,), _, _ = resume_parser.save_resumes_batch([_resume("N/A", ["Go"], name="John Roe")])
+    assert resume_parser.save_resumes_batch([_resume("N/A", ["Go"], name="John Roe")])[:2] == ([other], set())
+    assert db.get_connection(resumes_db).execute("SELECT COUNT(*) FROM resumes").fetchone() == (2,)
+
+
+def test_merge_policy_keeps_contact_details_and_unions_lists(resumes_db, monkeypatch):
+    monkeypatch.setattr(resume_parser, "_resolve_duplicate",
+                        functools.partial(resume_parser._resolve_duplicate, policy="merge"))
+    (resume_id,), _, _ = resume_parser.save_resumes_batch([_resume("jane@example.com", ["Python"], "555-0100")])
+
+    ids, changed, finals = resume_parser.save_resumes_batch([_resume("jane@example.com", ["python", "SQL"])])
+    assert ids == [resume_id] and changed == {resume_id}
+    # 索引用的是最终保存的字段，不是这次上传的
+    assert finals[0]["skills"] == ["Python", "SQL"]
+    assert _row(resumes_db, resume_id) == ("Jane Doe", "555-0100", "Python; SQL")
+
+    with db.transaction(resumes_db) as cursor:
+        single_id, text_changed, final = resume_parser._upsert_resume_row(cursor, _resume("jane@example.com", ["SQL"]))
+    assert (single_id, text_changed, final["skills"]) == (resume_id, False, ["Python", "SQL"])
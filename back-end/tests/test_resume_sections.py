@@ -0,0 +1,75 @@
+from service.resume_parser import extract_education, segment_sections
+
+RESUME = (
+    "John Smith\n"
+    "EDUCATION\n"
+    "Bachelor of Science in Computer Science, University of Toronto\n"
+    "Project: built a compiler\n"
+    "Master of Engineering, McGill University\n"
+    "Diploma in Data Analytics, Seneca College\n"
+    "EXPERIENCE\n"
+    "Software Engineer at Shopify, worked on Skills matching\n"
+    "SKILLS\n"
+    "Python, SQL, Docker\n"
+    "PROJECTS\n"
+    "Compiler for a toy language\n"
+)
+
+
+def test_education_continues_past_inline_project_line():
+    education = extract_education(RESUME)
+    assert education == [
+        "Bachelor of Science in Computer Science, University of Toronto",
+        "Master of Engineering, McGill University",
+        "Diploma in Data Analytics, Seneca College",
+    ]
+
+
+def test_headers_only_count_at_line_start():
+    sections = segment_sections(RESUME)
+    # 正文里的 "Skills" 不会切断工作经验段
+    assert "Shopify, worked on Skills matching" in sections["experience"]
+    assert sections["skills"].startswith("SKILLS")
+    assert "Python, SQL, Docker" in sections["skills"]
+    assert "Compiler for a toy language" not in sections["skills"]
+
+
+def test_education_ends_at_experience_or_skills():
+    sections = segment_sections("学历\n北京大学 计算机 学士\n技能\nPython\n")
+    assert sections["education"] == "学历\n北京大学 计算机 学士\n"
+    assert sections["skills"] == "技能\nPython\n"
+
+
+def test_falls_back_to_keyword_lines_without_education_header():
+    assert extract_education("Worked at Google\nPhD in Physics, MIT University\n") == [
+        "PhD in Physics, MIT University",
+    ]
+
+
+def test_plural_and_chinese_headers_still_split_sections():
+    sections = segment_sections("技能清单\nPython\n项目经历\n编译器\n")
+    assert sections["skills"] == "技能清单\nPython\n"
+    assert sections["projects"].startswith("项目经历")
+
+
+def test_qualified_headers_split_sections():
+    sections = segment_sections(
+        "Jane Doe\n"
+        "Professional Experience\n"
+        "Data Engineer at Acme, built Skills dashboards\n"
+        "Strong Skills in communication\n"
+        "Technical Skills: Python, SQL\n"
+        "Education\n"
+        "Bachelor of Science, University of Waterloo\n"
+    )
+    # 修饰词后面不是冒号或行尾的（正文句子）不算标题
+    assert sections["experience"].startswith("Professional Experience\n")
+    assert "Strong Skills in communication" in sections["experience"]
+    assert sections["skills"] == "Technical Skills: Python, SQL\n"
+    assert sections["education"].startswith("Education\nBachelor of Science")
+
+
+def test_qualified_chinese_header():
+    sections = segment_sections("张三\n专业技能：Python、SQL\n工作经验\n某公司 数据工程师\n")
+    assert sections["skills"] == "专业技能：Python、SQL\n"
+    assert sections["experience"].startswith("工作经验")
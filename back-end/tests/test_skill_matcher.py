@@ -0,0 +1,18 @@
+from service.config import SKILL_TAXONOMY_PATH
+from service.skill_matcher import SkillMatcher, load_skill_matcher
+
+
+def test_ambiguous_names_only_match_in_their_exact_case():
+    matcher = load_skill_matcher(SKILL_TAXONOMY_PATH)
+    # 普通单词不算技能
+    assert matcher.find("I will go to the node, r u ready? ts, ml of water, a swift rust express") == []
+    assert matcher.find("Skills: Go, R, TS, Node, ML, Swift") == [
+        "Go", "R", "TypeScript", "Node.js", "Machine Learning", "Swift",
+    ]
+    # 其余写法仍不区分大小写
+    assert matcher.find("GOLANG and typescript and NodeJS") == ["Go", "TypeScript", "Node.js"]
+
+
+def test_matches_respect_word_boundaries_and_prefer_the_longest():
+    matcher = SkillMatcher([("Java", ["Java"]), ("JavaScript", ["JavaScript", "js"]), ("R", ['"R"'])])
+    assert matcher.find("javascript, Java, JS; Rust and R, not r") == ["JavaScript", "Java", "R"]